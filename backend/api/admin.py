@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import User, UserSession, Category, Account, Transaction, Budget, RecurringTransaction
+from .models import (
+    User, UserSession, Category, CategoryRule, Account, Transaction, Budget, RecurringTransaction, StatementImport
+)
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -20,6 +22,12 @@ class CategoryAdmin(admin.ModelAdmin):
     list_filter = ['category_type', 'is_default', 'created_at']
     search_fields = ['name', 'description']
 
+@admin.register(CategoryRule)
+class CategoryRuleAdmin(admin.ModelAdmin):
+    list_display = ['pattern', 'rule_type', 'category', 'user', 'created_at']
+    list_filter = ['rule_type']
+    search_fields = ['pattern', 'user__email', 'category__name']
+
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
     list_display = ['name', 'user', 'account_type', 'balance', 'currency', 'is_active', 'created_at']
@@ -44,3 +52,9 @@ class RecurringTransactionAdmin(admin.ModelAdmin):
     list_display = ['description', 'user', 'amount', 'frequency', 'next_due_date', 'is_active']
     list_filter = ['frequency', 'transaction_type', 'is_active']
     search_fields = ['description', 'user__email']
+
+@admin.register(StatementImport)
+class StatementImportAdmin(admin.ModelAdmin):
+    list_display = ['user', 'account', 'file_format', 'status', 'rows_imported', 'rows_duplicate', 'created_at']
+    list_filter = ['file_format', 'status', 'created_at']
+    search_fields = ['user__email', 'account__name']
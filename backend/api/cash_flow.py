@@ -0,0 +1,230 @@
+"""
+Cash-flow forecast: projected daily balances per account.
+Each forecast day's change in an account is the sum of two parts:
+- scheduled items: active RecurringTransaction templates and pending
+  RecurringSuggestions (detected series not yet turned into templates),
+  expanded into their occurrences with the vectorized date arithmetic of
+  api.recurring. Occurrences that are already due but not yet materialized
+  land on the first forecast day.
+- the residual: everything not scheduled, predicted per weekday from the
+  account's net flow over the last RESIDUAL_WEEKS weeks (or since its first
+  transaction in them, for accounts with less history). Recurring rows of
+  a series scheduled above are left out; those of dismissed or unmatched
+  series stay in.
+
+The days' changes form an (accounts x days) array. The balances are the
+current balances plus its cumulative sum along the days, computed for all
+accounts at once.
+
+Unless response caching is off (see api.response_cache), forecasts are
+cached per user, day and horizon under the user's data version. They are
+rebuilt only after a transaction, account or template changes (accepting or
+dismissing a suggestion included), or on the next day.
+"""
+import logging
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.db.models import Min, Sum
+from django.db.models.functions import ExtractIsoWeekDay
+from django.utils import timezone
+
+from .ledger import balance_delta
+from .models import Account, RecurringSuggestion, RecurringTransaction, Transaction
+from .recurring import expand_occurrences
+from .recurring_detection import normalize_merchants
+from .response_cache import get_data_version, user_caching_enabled
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HORIZON_DAYS = 90
+MAX_HORIZON_DAYS = 365
+RESIDUAL_WEEKS = 13
+
+FORECAST_KEY = 'cash_flow_forecast:{user_id}:{today}:{horizon}:{version}'
+FORECAST_TIMEOUT = 24 * 60 * 60
+
+
+def _scheduled_items(user_id, account_index, end):
+    """Template rows (see expand_occurrences) of active templates, then of pending suggestions."""
+    fields = ['id', 'account_id', 'amount', 'transaction_type', 'frequency', 'next_due_date']
+    templates = list(
+        RecurringTransaction.objects.filter(
+            user_id=user_id, is_active=True, account_id__in=account_index, next_due_date__lte=end
+        ).values(*fields, 'start_date', 'end_date')
+    )
+    suggestions = [
+        dict(row, start_date=row['last_date'], end_date=None)
+        for row in RecurringSuggestion.objects.filter(
+            user_id=user_id, status='pending', account_id__in=account_index, next_due_date__lte=end
+        ).values(*fields, 'last_date')
+    ]
+    # Separate lists: template and suggestion ids overlap
+    return [templates, suggestions]
+
+
+def scheduled_flows(user_id, account_index, start, end):
+    """(accounts x days) array of scheduled recurring amounts from start through end."""
+    flows = np.zeros((len(account_index), (end - start).days + 1))
+    rows, days, amounts = [], [], []
+    for items in _scheduled_items(user_id, account_index, end):
+        occurrences = expand_occurrences(items, end)
+        for item in items:
+            dates = occurrences.get(item['id'], ((), None))[0]
+            if not len(dates):
+                continue
+            offsets = (np.array(list(dates), dtype='datetime64[D]') - np.datetime64(start, 'D')).astype(np.int64)
+            rows.append(np.full(len(offsets), account_index[item['account_id']]))
+            days.append(np.maximum(offsets, 0))
+            amounts.append(np.full(len(offsets), float(balance_delta(item['transaction_type'], item['amount']))))
+
+    if rows:
+        # add.at accumulates repeated (account, day) pairs
+        np.add.at(flows, (np.concatenate(rows), np.concatenate(days)), np.concatenate(amounts))
+    return flows
+
+
+def _scheduled_series(user_id, account_index):
+    """{(account_id, transaction_type, merchant key)} of active templates and pending suggestions."""
+    templates = list(
+        RecurringTransaction.objects.filter(user_id=user_id, is_active=True, account_id__in=account_index)
+        .values_list('account_id', 'transaction_type', 'description')
+    )
+    merchants = normalize_merchants(
+        pd.Series([None] * len(templates), dtype=object),
+        pd.Series([description for _, _, description in templates], dtype=object),
+    )
+    series = {(account_id, transaction_type, merchant)
+              for (account_id, transaction_type, _), merchant in zip(templates, merchants)}
+    series.update(
+        RecurringSuggestion.objects.filter(user_id=user_id, status='pending', account_id__in=account_index)
+        .values_list('account_id', 'transaction_type', 'merchant_key')
+    )
+    return series
+
+
+def _unscheduled_recurring(window, user_id, account_index):
+    """(account_id, weekday, net flow) of recurring rows whose series is not
+    scheduled (dismissed or unmatched), summed per weekday."""
+    rows = list(
+        window.filter(is_recurring=True)
+        .annotate(weekday=ExtractIsoWeekDay('transaction_date'))
+        .values('account_id', 'transaction_type', 'merchant_name', 'description', 'weekday')
+        .annotate(total=Sum('amount'))
+    )
+    if not rows:
+        return []
+    merchants = normalize_merchants(
+        pd.Series([row['merchant_name'] for row in rows], dtype=object),
+        pd.Series([row['description'] for row in rows], dtype=object),
+    )
+    scheduled = _scheduled_series(user_id, account_index)
+    return [
+        (row['account_id'], row['weekday'] - 1, balance_delta(row['transaction_type'], row['total']))
+        for row, merchant in zip(rows, merchants)
+        if (row['account_id'], row['transaction_type'], merchant) not in scheduled
+    ]
+
+
+def weekday_residual(user_id, accounts, account_index, start, end):
+    """(accounts x days) array of each account's average unscheduled net flow for the weekday."""
+    today = start - timedelta(days=1)
+    history_start = today - timedelta(weeks=RESIDUAL_WEEKS)
+    window = Transaction.objects.filter(
+        user_id=user_id,
+        account_id__in=account_index,
+        transaction_date__gte=history_start,
+        transaction_date__lt=today,
+    ).order_by()
+    rows = (
+        window.filter(is_recurring=False)
+        .values('account_id', 'transaction_date', 'transaction_type')
+        .annotate(total=Sum('amount'))
+    )
+
+    sums = np.zeros((len(account_index), 7))
+    for row in rows:
+        sums[account_index[row['account_id']], row['transaction_date'].weekday()] += float(
+            balance_delta(row['transaction_type'], row['total'])
+        )
+    for account_id, weekday, flow in _unscheduled_recurring(window, user_id, account_index):
+        sums[account_index[account_id], weekday] += float(flow)
+
+    # Accounts with less history (new, or linked/imported with a few weeks of
+    # it) average over the weeks since their first transaction in the window
+    first_dates = dict(
+        window.values('account_id').annotate(first=Min('transaction_date')).values_list('account_id', 'first')
+    )
+    weeks = np.array([
+        min(max((today - first_dates.get(account['id'], today)).days / 7, 1), RESIDUAL_WEEKS)
+        for account in accounts
+    ])
+    averages = sums / weeks[:, None]
+
+    weekdays = (np.arange((end - start).days + 1) + start.weekday()) % 7
+    return averages[:, weekdays]
+
+
+def build_forecast(user_id, horizon_days=DEFAULT_HORIZON_DAYS, today=None, residual=weekday_residual):
+    """Projected end-of-day balances of the user's active accounts for the next horizon_days (>= 1) days."""
+    today = today or timezone.now().date()
+    start = today + timedelta(days=1)
+    end = today + timedelta(days=horizon_days)
+
+    accounts = list(
+        Account.objects.filter(user_id=user_id, is_active=True)
+        .order_by('id')
+        .values('id', 'name', 'account_type', 'currency', 'balance')
+    )
+    account_index = {account['id']: i for i, account in enumerate(accounts)}
+
+    scheduled = scheduled_flows(user_id, account_index, start, end)
+    unscheduled = residual(user_id, accounts, account_index, start, end)
+    current = np.array([float(account['balance']) for account in accounts])
+    balances = current[:, None] + np.cumsum(scheduled + unscheduled, axis=1)
+
+    dates = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1).astype(object)
+    forecast_accounts = []
+    for i, account in enumerate(accounts):
+        lowest = int(np.argmin(balances[i]))
+        forecast_accounts.append({
+            'account_id': account['id'],
+            'name': account['name'],
+            'account_type': account['account_type'],
+            'currency': account['currency'],
+            'current_balance': round(float(current[i]), 2),
+            'balances': np.round(balances[i], 2).tolist(),
+            'scheduled_total': round(float(scheduled[i].sum()), 2),
+            'unscheduled_total': round(float(unscheduled[i].sum()), 2),
+            'lowest_balance': round(float(balances[i][lowest]), 2),
+            'lowest_balance_date': dates[lowest].isoformat(),
+        })
+
+    return {
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+        'horizon_days': horizon_days,
+        'dates': [day.isoformat() for day in dates],
+        'accounts': forecast_accounts,
+        'total_balances': np.round(balances.sum(axis=0), 2).tolist(),
+        'generated_at': timezone.now().isoformat(),
+    }
+
+
+def get_forecast(user_id, horizon_days=DEFAULT_HORIZON_DAYS, refresh=False):
+    """Cached build_forecast; rebuilt after the user's data changes."""
+    if not user_caching_enabled():
+        return build_forecast(user_id, horizon_days)
+    key = FORECAST_KEY.format(
+        user_id=user_id,
+        today=timezone.now().date().isoformat(),
+        horizon=horizon_days,
+        version=get_data_version(user_id),
+    )
+    forecast = None if refresh else cache.get(key)
+    if forecast is None:
+        forecast = build_forecast(user_id, horizon_days)
+        cache.set(key, forecast, FORECAST_TIMEOUT)
+    return forecast
@@ -0,0 +1,232 @@
+"""
+Transaction categorization engine.
+Keywords are compiled into a single regex at import time; user rules and
+merchant exact-match tables are layered on top, and the learned classifier
+in api.ml_models covers rows no rule matches. Used by manual transaction
+creates and bulk Plaid imports.
+"""
+import re
+
+from django.core.cache import cache
+
+from .category_resolver import category_resolver, normalize_category_name
+
+# Built-in keyword buckets; each bucket resolves to an expense category by name
+DEFAULT_CATEGORY_KEYWORDS = {
+    'food': ['restaurant', 'food', 'pizza', 'burger', 'coffee', 'starbucks', 'mcdonalds'],
+    'transport': ['uber', 'lyft', 'gas', 'fuel', 'parking', 'metro', 'bus'],
+    'shopping': ['amazon', 'walmart', 'target', 'store', 'shop', 'market'],
+    'entertainment': ['netflix', 'spotify', 'movie', 'cinema', 'game'],
+    'utilities': ['electric', 'water', 'internet', 'phone', 'utility'],
+    'healthcare': ['pharmacy', 'doctor', 'hospital', 'medical', 'health'],
+    'groceries': ['grocery', 'supermarket', 'whole foods', 'kroger'],
+}
+
+# Merchants that always belong to one bucket (normalized merchant name -> bucket)
+DEFAULT_MERCHANT_CATEGORIES = {
+    'starbucks': 'food',
+    'mcdonalds': 'food',
+    'uber': 'transport',
+    'lyft': 'transport',
+    'amazon': 'shopping',
+    'walmart': 'shopping',
+    'target': 'shopping',
+    'netflix': 'entertainment',
+    'spotify': 'entertainment',
+    'whole foods': 'groceries',
+    'kroger': 'groceries',
+}
+
+# Keyword buckets need at least this share of their keywords to match
+MIN_CONFIDENCE = 0.1
+
+MERCHANT_RULE_CONFIDENCE = 1.0
+KEYWORD_RULE_CONFIDENCE = 0.9
+
+# Learned classifier predictions below this probability are discarded
+MODEL_MIN_CONFIDENCE = 0.5
+
+RULES_VERSION_CACHE_KEY = 'categorization_rules:version:{user_id}'
+
+
+class KeywordMatcher:
+    """Matches text against many keyword groups with one compiled regex."""
+
+    def __init__(self, group_keywords):
+        self.group_sizes = {}
+        self.keyword_groups = {}
+        for group, keywords in group_keywords.items():
+            self.group_sizes[group] = len(keywords)
+            for keyword in keywords:
+                self.keyword_groups.setdefault(keyword.lower(), []).append(group)
+
+        # Lookahead so overlapping keywords ("whole foods" / "food") are all found
+        alternatives = sorted(self.keyword_groups, key=len, reverse=True)
+        if alternatives:
+            self.pattern = re.compile('(?=(' + '|'.join(re.escape(k) for k in alternatives) + '))')
+        else:
+            self.pattern = None
+
+    def find_keywords(self, text):
+        """Return the set of keywords present in text."""
+        if not self.pattern or not text:
+            return set()
+        return {match.group(1) for match in self.pattern.finditer(text)}
+
+    def best_group(self, text):
+        """Return (group, share of the group's keywords found) for the best group."""
+        counts = {}
+        for keyword in self.find_keywords(text):
+            for group in self.keyword_groups[keyword]:
+                counts[group] = counts.get(group, 0) + 1
+
+        best_group, best_confidence = None, 0.0
+        # Iterate in definition order so ties keep the first group
+        for group, size in self.group_sizes.items():
+            if group in counts:
+                confidence = counts[group] / size
+                if confidence > best_confidence:
+                    best_group, best_confidence = group, confidence
+        return best_group, best_confidence
+
+
+DEFAULT_KEYWORD_MATCHER = KeywordMatcher(DEFAULT_CATEGORY_KEYWORDS)
+
+
+class CategorizationEngine:
+    """Categorizes transactions from merchant tables, user rules and keywords.
+
+    Order of precedence: merchant exact match, user keyword rule, default
+    keyword buckets. Results are (category_id, confidence) pairs.
+    """
+
+    def __init__(self, merchant_rules=None, keyword_rules=None):
+        # merchant_rules: {merchant name: category_id}; keyword_rules: {keyword: category_id}
+        self.merchant_rules = {
+            normalize_category_name(merchant): category_id
+            for merchant, category_id in (merchant_rules or {}).items()
+        }
+        self.keyword_rules = {k.lower(): category_id for k, category_id in (keyword_rules or {}).items()}
+        self.rule_matcher = KeywordMatcher({k: [k] for k in self.keyword_rules})
+
+        category_resolver.warm()
+        self.bucket_ids = {
+            bucket: category_resolver.find(bucket, category_type='expense')
+            for bucket in DEFAULT_CATEGORY_KEYWORDS
+        }
+
+    def categorize(self, description, merchant_name=None):
+        """Return (category_id, confidence); category_id is None when nothing matches."""
+        merchant = normalize_category_name(merchant_name)
+        if merchant:
+            if merchant in self.merchant_rules:
+                return self.merchant_rules[merchant], MERCHANT_RULE_CONFIDENCE
+            bucket = DEFAULT_MERCHANT_CATEGORIES.get(merchant)
+            if bucket and self.bucket_ids.get(bucket):
+                return self.bucket_ids[bucket], MERCHANT_RULE_CONFIDENCE
+
+        text = f"{(description or '').lower()} {(merchant_name or '').lower()}"
+
+        found = self.rule_matcher.find_keywords(text)
+        if found:
+            # Longest user keyword is the most specific rule
+            return self.keyword_rules[max(found, key=len)], KEYWORD_RULE_CONFIDENCE
+
+        bucket, confidence = DEFAULT_KEYWORD_MATCHER.best_group(text)
+        if bucket and confidence > MIN_CONFIDENCE and self.bucket_ids.get(bucket):
+            return self.bucket_ids[bucket], confidence
+        return None, 0.0
+
+    def categorize_batch(self, rows, use_model=True):
+        """Categorize (description, merchant_name) pairs; returns a list of results.
+
+        Repeated description/merchant pairs (common in bank feeds) are only
+        matched once per batch. Rows no rule matches go to the learned
+        classifier in a single batch, when one has been trained.
+        """
+        rows = list(rows)
+        seen = {}
+        for row in rows:
+            if row not in seen:
+                seen[row] = self.categorize(*row)
+
+        if use_model:
+            unmatched = [row for row, result in seen.items() if result[0] is None]
+            if unmatched:
+                seen.update(self._predict(unmatched))
+
+        return [seen[row] for row in rows]
+
+    def _predict(self, rows):
+        """Classifier results for rows, keeping only confident predictions."""
+        from .ml_models import get_category_classifier
+
+        classifier = get_category_classifier()
+        if classifier is None:
+            return {}
+        return {
+            row: (category_id, probability)
+            for row, (category_id, probability) in zip(rows, classifier.predict_batch(rows))
+            if probability >= MODEL_MIN_CONFIDENCE
+        }
+
+
+# Per-process engine cache: user_id -> (version, engine)
+_engines = {}
+MAX_CACHED_ENGINES = 1000
+
+
+def invalidate_user_rules(user_id):
+    """Drop cached engines for a user after their rules change."""
+    key = RULES_VERSION_CACHE_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_engine(user_id=None):
+    """Return a cached engine including the user's own rules."""
+    from .models import CategoryRule
+
+    category_resolver.warm()
+    rules_version = cache.get(RULES_VERSION_CACHE_KEY.format(user_id=user_id), 0) if user_id else 0
+    version = (rules_version, category_resolver.version)
+
+    cached = _engines.get(user_id)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    merchant_rules, keyword_rules = {}, {}
+    if user_id:
+        for rule_type, pattern, category_id in CategoryRule.objects.filter(
+            user_id=user_id
+        ).values_list('rule_type', 'pattern', 'category_id'):
+            if rule_type == 'merchant':
+                merchant_rules[pattern] = category_id
+            else:
+                keyword_rules[pattern] = category_id
+
+    engine = CategorizationEngine(merchant_rules, keyword_rules)
+    if len(_engines) >= MAX_CACHED_ENGINES:
+        _engines.clear()
+    _engines[user_id] = (version, engine)
+    return engine
+
+
+def categorize_transactions(transactions, user_id=None):
+    """Fill category/confidence on uncategorized transaction instances in place.
+
+    Returns the transactions that were changed so callers can bulk_update them.
+    """
+    engine = get_engine(user_id)
+    pending = [t for t in transactions if not t.category_id]
+    results = engine.categorize_batch((t.description, t.merchant_name) for t in pending)
+
+    changed = []
+    for transaction, (category_id, confidence) in zip(pending, results):
+        if category_id:
+            transaction.category_id = category_id
+            transaction.categorization_confidence = confidence
+            changed.append(transaction)
+    return changed
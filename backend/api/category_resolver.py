@@ -0,0 +1,168 @@
+"""
+Category resolution for Plaid imports and auto-categorization.
+Keeps an in-process map of normalized category names and Plaid category
+paths to Category ids, so a sync batch resolves categories without a query
+per transaction.
+
+The map is versioned by the category table itself (row count and latest
+updated_at, one aggregate query per warm()), so a category renamed or
+deleted in a web process is seen by Celery workers on their next batch
+whatever cache backend is configured.
+"""
+import logging
+import re
+
+from django.db.models import Count, Max
+
+from .models import Category
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_category_name(name):
+    """Normalize a category name for lookups ("Food & Drink" -> "food and drink")."""
+    if not name:
+        return ''
+    name = name.lower().replace('&', ' and ')
+    return _NON_ALNUM.sub(' ', name).strip()
+
+
+def normalize_category_path(categories):
+    """Normalize a Plaid category hierarchy into a single lookup key."""
+    if isinstance(categories, str):
+        categories = [categories]
+    return ' > '.join(normalize_category_name(c) for c in categories if c)
+
+
+class CategoryResolver:
+    """Resolves category names and Plaid paths to Category ids."""
+
+    def __init__(self):
+        self._by_name = {}  # normalized name -> [(id, category_type, is_default)]
+        self._by_path = {}  # (normalized plaid path, category_type) -> id
+        self._version = None
+
+    def warm(self, force=False):
+        """Load all categories unless the in-process map is still current.
+
+        Call once at the start of a sync batch or categorization run.
+        """
+        version = self._table_version()
+        if not force and self._version == version and self._by_name:
+            return
+
+        by_name = {}
+        for category_id, normalized_name, category_type, is_default in Category.objects.values_list(
+            'id', 'normalized_name', 'category_type', 'is_default'
+        ).order_by('-is_default', 'id'):
+            by_name.setdefault(normalized_name, []).append((category_id, category_type, is_default))
+
+        self._by_name = by_name
+        self._by_path = {}
+        self._version = version
+
+    @property
+    def version(self):
+        """Version of the category table the map was loaded from."""
+        return self._version
+
+    def invalidate(self):
+        """Drop this process's map (called when categories change).
+
+        Other processes notice the change through the table version.
+        """
+        self._version = None
+
+    @staticmethod
+    def _table_version():
+        stats = Category.objects.aggregate(count=Count('id'), changed=Max('updated_at'))
+        return stats['count'], stats['changed']
+
+    def get(self, name, category_type=None):
+        """Return the id of the category with this exact (normalized) name."""
+        normalized = normalize_category_name(name)
+        entries = self._by_name.get(normalized)
+        if entries is None:
+            # Not in the map yet - single indexed lookup
+            entries = [
+                (category_id, ctype, is_default)
+                for category_id, ctype, is_default in Category.objects.filter(
+                    normalized_name=normalized
+                ).order_by('-is_default', 'id').values_list('id', 'category_type', 'is_default')
+            ]
+            if entries:
+                self._by_name[normalized] = entries
+        return self._pick(entries, category_type)
+
+    def find(self, keyword, category_type=None):
+        """Return a category id whose name matches or contains keyword.
+
+        Exact matches win; otherwise the shortest containing name is used,
+        preferring default categories. Matching happens on the warmed map.
+        """
+        category_id = self.get(keyword, category_type)
+        if category_id:
+            return category_id
+
+        normalized = normalize_category_name(keyword)
+        if not normalized:
+            return None
+        candidates = [
+            name for name in self._by_name
+            if normalized in name and self._pick(self._by_name[name], category_type)
+        ]
+        if not candidates:
+            return None
+        candidates.sort(key=lambda name: (not self._by_name[name][0][2], len(name)))
+        return self._pick(self._by_name[candidates[0]], category_type)
+
+    def resolve_plaid(self, plaid_categories, category_type='expense'):
+        """Return the category id for a Plaid category list, creating it if needed.
+
+        The most specific category (last in the list) names the category.
+        """
+        if not plaid_categories:
+            return None
+        if isinstance(plaid_categories, str):
+            plaid_categories = [plaid_categories]
+
+        path_key = (normalize_category_path(plaid_categories), category_type)
+        category_id = self._by_path.get(path_key)
+        if category_id:
+            return category_id
+
+        category_name = plaid_categories[-1]
+        category_id = self.get(category_name, category_type)
+        if not category_id:
+            try:
+                category = Category.objects.create(
+                    name=category_name,
+                    category_type=category_type,
+                    description=f'Auto-created from Plaid: {category_name}',
+                    is_default=False,
+                )
+            except Exception as e:
+                logger.error(f"Error creating category {category_name}: {e}")
+                return None
+            category_id = category.id
+            self._by_name.setdefault(category.normalized_name, []).append(
+                (category.id, category.category_type, category.is_default)
+            )
+
+        self._by_path[path_key] = category_id
+        return category_id
+
+    @staticmethod
+    def _pick(entries, category_type):
+        if not entries:
+            return None
+        for category_id, ctype, _ in entries:
+            if category_type is None or ctype == category_type:
+                return category_id
+        return None
+
+
+# Singleton instance
+category_resolver = CategoryResolver()
@@ -0,0 +1,307 @@
+"""
+Outbound email queue.
+Emails are stored as OutboundEmail rows and delivered by flush_email_queue
+in batches over a single mail connection, so a fan-out of thousands of
+notifications costs one SMTP/TLS handshake per batch instead of one per
+email. Sending is throttled per recipient domain and failed sends are
+retried with exponential backoff. A notification's email marks the
+notification sent once it is delivered, or failed once the queue gives up
+on it.
+
+The per-minute domain budgets are counted in the default cache. With a
+shared cache (Redis) all workers draw on one budget; with the per-process
+LocMem fallback every worker process counts its own, so the effective limit
+is the configured rate times the number of worker processes.
+
+Works with any EMAIL_BACKEND; the locmem backend collects the sent messages
+in django.core.mail.outbox for tests.
+"""
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction as db_transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .notification_bulk import notifications_changed
+from .notification_models import Notification, OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+DOMAIN_QUOTA_KEY = 'email_queue_quota:{domain}:{minute}'
+FLUSH_SCHEDULED_KEY = 'email_queue_flush_scheduled'
+
+NOTIFICATION_EMAIL_FOOTER = "\n\n---\nThis is an automated message from FinMate. Visit your dashboard for more details."
+
+
+def _from_email():
+    return settings.DEFAULT_FROM_EMAIL or 'noreply@finmate.com'
+
+
+def _domain(email_address):
+    return email_address.rsplit('@', 1)[-1].lower()
+
+
+def _outbound_email(to_email, subject, body, user=None, notification_id=None):
+    return OutboundEmail(
+        user=user,
+        to_email=to_email,
+        domain=_domain(to_email),
+        subject=subject[:255],
+        body=body,
+        notification_id=notification_id,
+    )
+
+
+def schedule_flush():
+    """Flush the queue shortly after commit; emails queued meanwhile share the flush."""
+    def schedule():
+        if not cache.add(FLUSH_SCHEDULED_KEY, True, settings.EMAIL_QUEUE_FLUSH_DELAY):
+            return
+        try:
+            from .tasks import flush_email_queue
+            flush_email_queue.apply_async(countdown=settings.EMAIL_QUEUE_FLUSH_DELAY)
+        except Exception as e:
+            # The periodic flush picks the emails up instead
+            logger.error(f"Error scheduling email queue flush: {e}")
+
+    db_transaction.on_commit(schedule)
+
+
+def queue_email(to_email, subject, body, user=None, attachment=None, notification_id=None):
+    """Queue one email; attachment is an optional (filename, content, mimetype)."""
+    email = _outbound_email(to_email, subject, body, user, notification_id)
+    if attachment:
+        filename, content, mimetype = attachment
+        email.attachment_name = filename
+        email.attachment_mimetype = mimetype
+        email.attachment.save(filename, ContentFile(content), save=False)
+    email.save()
+    schedule_flush()
+    return email
+
+
+def queue_emails(messages):
+    """Queue many (to_email, subject, body, user[, notification_id]) emails with one bulk insert."""
+    emails = OutboundEmail.objects.bulk_create(
+        [_outbound_email(*message) for message in messages], batch_size=1000
+    )
+    if emails:
+        schedule_flush()
+    return emails
+
+
+def notification_email(notification):
+    """(to_email, subject, body, user, notification_id) for a saved notification's email."""
+    return (
+        notification.user.email,
+        f"FinMate: {notification.title}",
+        notification.message + NOTIFICATION_EMAIL_FOOTER,
+        notification.user,
+        notification.id,
+    )
+
+
+def queue_notification_email(notification):
+    """Queue the email for a saved notification; delivery marks it sent."""
+    to_email, subject, body, user, notification_id = notification_email(notification)
+    return queue_email(to_email, subject, body, user, notification_id=notification_id)
+
+
+def _update_notifications(emails, **values):
+    """Set values on the still-pending notifications of emails (read ones stay read)."""
+    notifications = Notification.objects.filter(
+        id__in=[email.notification_id for email in emails if email.notification_id],
+        status='pending',
+    )
+    user_ids = list(notifications.values_list('user_id', flat=True).distinct())
+    if user_ids and notifications.update(updated_at=timezone.now(), **values):
+        # update() sends no signals; read state is unchanged
+        notifications_changed(user_ids, unread_changed=False)
+
+
+def _claim_batch(batch_size):
+    """Mark up to batch_size due emails as sending and return them.
+
+    Rows another worker is claiming are skipped (SKIP LOCKED where the
+    database supports it) and rows stuck in 'sending' after a worker died
+    are claimed again once EMAIL_QUEUE_CLAIM_TIMEOUT has passed.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.EMAIL_QUEUE_CLAIM_TIMEOUT)
+    with db_transaction.atomic():
+        ids = list(
+            OutboundEmail.objects.filter(
+                Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', next_attempt_at__lte=stale)
+            )
+            .select_for_update(skip_locked=True)
+            .order_by('next_attempt_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if ids:
+            OutboundEmail.objects.filter(id__in=ids).update(status='sending', next_attempt_at=now, updated_at=now)
+    return list(OutboundEmail.objects.filter(id__in=ids).order_by('next_attempt_at', 'id')) if ids else []
+
+
+def _take_domain_quota(domain, wanted):
+    """How many of wanted emails may go to domain in the current minute.
+
+    The count is only global with a shared default cache (see module docstring).
+    """
+    limit = settings.EMAIL_QUEUE_DOMAIN_RATE_LIMITS.get(domain, settings.EMAIL_QUEUE_DEFAULT_DOMAIN_RATE)
+    key = DOMAIN_QUOTA_KEY.format(domain=domain, minute=int(time.time() // 60))
+    cache.add(key, 0, 120)
+    try:
+        used = cache.incr(key, wanted)
+    except ValueError:
+        # Key expired or was evicted between add() and incr()
+        cache.set(key, wanted, 120)
+        used = wanted
+    return max(0, min(wanted, limit - (used - wanted)))
+
+
+def _defer(emails):
+    """Put throttled emails back in the queue for the next minute (not an attempt)."""
+    if not emails:
+        return
+    now = timezone.now()
+    next_minute = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    OutboundEmail.objects.filter(id__in=[email.id for email in emails]).update(
+        status='pending', next_attempt_at=next_minute, updated_at=now
+    )
+
+
+def _build_message(email, connection):
+    message = EmailMessage(
+        subject=email.subject,
+        body=email.body,
+        from_email=_from_email(),
+        to=[email.to_email],
+        connection=connection,
+    )
+    if email.attachment:
+        with email.attachment.open('rb') as attachment:
+            message.attach(email.attachment_name, attachment.read(), email.attachment_mimetype or None)
+    return message
+
+
+def _record_failures(failures):
+    """Schedule a retry with exponential backoff, or give up after EMAIL_QUEUE_MAX_ATTEMPTS."""
+    if not failures:
+        return Counter()
+    now = timezone.now()
+    counts = Counter()
+    given_up = []
+    for email, error in failures:
+        email.attempts += 1
+        email.last_error = str(error)[:1000]
+        email.updated_at = now
+        if email.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+            email.status = 'failed'
+            given_up.append(email)
+            counts['failed'] += 1
+            logger.error(f"Giving up on email {email.id} to {email.to_email} after {email.attempts} attempts: {error}")
+        else:
+            email.status = 'pending'
+            email.next_attempt_at = now + timedelta(
+                seconds=settings.EMAIL_QUEUE_RETRY_BACKOFF * 2 ** (email.attempts - 1)
+            )
+            counts['retried'] += 1
+    OutboundEmail.objects.bulk_update(
+        [email for email, _ in failures],
+        ['status', 'attempts', 'next_attempt_at', 'last_error', 'updated_at'],
+    )
+    _update_notifications(given_up, status='failed')
+    return counts
+
+
+def _send(emails):
+    """Send emails over one mail connection; returns counts of sent/retried/failed."""
+    if not emails:
+        return Counter()
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Could not open mail connection: {e}")
+        return _record_failures([(email, e) for email in emails])
+
+    sent, failures = [], []
+    try:
+        for email in emails:
+            # One message per call so a rejected recipient fails only its own email;
+            # the connection stays open across calls.
+            try:
+                connection.send_messages([_build_message(email, connection)])
+                sent.append(email)
+            except Exception as e:
+                failures.append((email, e))
+    finally:
+        try:
+            connection.close()
+        except Exception as e:
+            logger.warning(f"Error closing mail connection: {e}")
+
+    now = timezone.now()
+    OutboundEmail.objects.filter(id__in=[email.id for email in sent]).update(
+        status='sent', sent_at=now, attempts=F('attempts') + 1, last_error='', updated_at=now
+    )
+    _update_notifications(sent, status='sent', sent_at=now)
+    for email in sent:
+        # Report attachments are only kept until delivery
+        if email.attachment:
+            email.attachment.delete(save=False)
+
+    counts = _record_failures(failures)
+    counts['sent'] = len(sent)
+    return counts
+
+
+def flush_email_queue(batch_size=None):
+    """Send every due email, batch by batch; returns counts of sent/retried/failed/deferred."""
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    totals = Counter()
+    while True:
+        emails = _claim_batch(batch_size)
+        if not emails:
+            break
+
+        by_domain = defaultdict(list)
+        for email in emails:
+            by_domain[email.domain].append(email)
+
+        sendable, deferred = [], []
+        for domain, domain_emails in by_domain.items():
+            allowed = _take_domain_quota(domain, len(domain_emails))
+            sendable.extend(domain_emails[:allowed])
+            deferred.extend(domain_emails[allowed:])
+
+        _defer(deferred)
+        totals['deferred'] += len(deferred)
+        totals.update(_send(sendable))
+
+    if totals:
+        logger.info(
+            f"Email queue flushed: {totals['sent']} sent, {totals['retried']} to retry, "
+            f"{totals['failed']} failed, {totals['deferred']} throttled"
+        )
+    return totals
+
+
+def purge_sent_emails(retention_days=None):
+    """Delete sent and failed emails older than retention_days."""
+    if retention_days is None:
+        retention_days = settings.EMAIL_QUEUE_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    expired = OutboundEmail.objects.filter(status__in=['sent', 'failed'], updated_at__lt=cutoff)
+    for email in expired.exclude(attachment='').only('id', 'attachment'):
+        email.attachment.delete(save=False)
+    deleted, _ = expired.delete()
+    return deleted
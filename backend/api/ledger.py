@@ -0,0 +1,47 @@
+"""
+Account balance maintenance for transaction writes.
+Balance changes are collected as per-account deltas and applied with a
+single UPDATE ... SET balance = balance + CASE ... statement, so concurrent
+writers never overwrite each other's balance and a batch of N transactions
+costs one write instead of N account saves.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Value, When
+
+from .models import Account
+
+
+def balance_delta(transaction_type, amount):
+    """Effect of a transaction on its account balance."""
+    if transaction_type == 'expense':
+        return -amount
+    if transaction_type == 'income':
+        return amount
+    return Decimal('0.00')
+
+
+class BalanceDeltas:
+    """Accumulates net balance changes per account."""
+
+    def __init__(self):
+        self.deltas = defaultdict(Decimal)
+
+    def add(self, account_id, transaction_type, amount):
+        self.deltas[account_id] += balance_delta(transaction_type, amount)
+
+    def remove(self, account_id, transaction_type, amount):
+        self.deltas[account_id] -= balance_delta(transaction_type, amount)
+
+    def apply(self):
+        """Write all non-zero deltas in one UPDATE; returns the affected account ids."""
+        deltas = {account_id: delta for account_id, delta in self.deltas.items() if delta}
+        if deltas:
+            Account.objects.filter(id__in=deltas).update(balance=F('balance') + Case(
+                *[When(id=account_id, then=Value(delta)) for account_id, delta in deltas.items()],
+                default=Value(Decimal('0.00')),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ))
+        self.deltas.clear()
+        return list(deltas)
@@ -0,0 +1,84 @@
+"""
+Measure query count and latency of the transaction analytics endpoint.
+
+Examples:
+    python manage.py benchmark_analytics
+    python manage.py benchmark_analytics --email user@example.com --granularity week --runs 20
+    python manage.py benchmark_analytics --max-queries 4
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import ANALYTICS_GRANULARITIES, TransactionViewSet
+
+
+class Command(BaseCommand):
+    help = "Report queries and timing for /api/transactions/analytics/"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help="User to run analytics for (default: user with most transactions)")
+        parser.add_argument('--granularity', choices=sorted(ANALYTICS_GRANULARITIES))
+        parser.add_argument('--start-date', help="YYYY-MM-DD")
+        parser.add_argument('--end-date', help="YYYY-MM-DD")
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument('--max-queries', type=int, help="Fail if a request runs more queries than this")
+
+    def handle(self, *args, **options):
+        user = self._get_user(options['email'])
+        params = {
+            key: options[option] for key, option in [
+                ('granularity', 'granularity'), ('start_date', 'start_date'), ('end_date', 'end_date')
+            ] if options[option]
+        }
+        granularities = [options['granularity']] if options['granularity'] else sorted(ANALYTICS_GRANULARITIES)
+
+        view = TransactionViewSet.as_view({'get': 'analytics'})
+        factory = APIRequestFactory()
+        failed = False
+
+        for granularity in granularities:
+            params['granularity'] = granularity
+            timings, query_count = [], 0
+            for _ in range(max(1, options['runs'])):
+                request = factory.get('/api/transactions/analytics/', params)
+                force_authenticate(request, user=user)
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = view(request)
+                    response.render()
+                    timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f"analytics returned {response.status_code}: {response.content[:200]}")
+                query_count = len(queries)
+
+            timings.sort()
+            self.stdout.write(
+                f"{granularity:>5}: {query_count} queries, "
+                f"median {timings[len(timings) // 2]:.1f} ms, max {timings[-1]:.1f} ms "
+                f"({len(timings)} runs, {len(response.data['trends'])} trend buckets)"
+            )
+            if options['max_queries'] is not None and query_count > options['max_queries']:
+                failed = True
+                self.stderr.write(f"{granularity}: {query_count} queries exceeds --max-queries {options['max_queries']}")
+
+        if failed:
+            raise CommandError("Query budget exceeded")
+
+    def _get_user(self, email):
+        User = get_user_model()
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {email}")
+
+        user = User.objects.annotate(n=Count('transactions')).order_by('-n').first()
+        if user is None:
+            raise CommandError("No users to benchmark")
+        return user
@@ -0,0 +1,75 @@
+"""
+Backtest the daily expense model backends in time order and compare
+accuracy with training time.
+
+Examples:
+    python manage.py benchmark_expense_model
+    python manage.py benchmark_expense_model --email user@example.com --folds 6
+    python manage.py benchmark_expense_model --users 50 --horizon 14 --backends linear
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Q
+
+from api.ml_models import ExpensePredictionModel, backtest_expense_model
+
+
+class Command(BaseCommand):
+    help = "Time-ordered backtest of the expense model backends: MAE/RMSE vs. training time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help="Backtest one user (default: the users with most expenses)")
+        parser.add_argument('--users', type=int, default=10, help="Number of users without --email")
+        parser.add_argument('--category', help="Backtest one category's expenses")
+        parser.add_argument(
+            '--backends', nargs='+', choices=ExpensePredictionModel.BACKENDS,
+            default=list(ExpensePredictionModel.BACKENDS),
+        )
+        parser.add_argument('--horizon', type=int, default=28, help="Days forecast per fold")
+        parser.add_argument('--folds', type=int, default=4)
+
+    def handle(self, *args, **options):
+        users = self._get_users(options['email'], options['users'])
+        series = []
+        for user in users:
+            user_series = ExpensePredictionModel.daily_series(user.id, options['category'])
+            if len(user_series) >= ExpensePredictionModel.MIN_HISTORY_DAYS + options['horizon']:
+                series.append(user_series)
+        if not series:
+            raise CommandError(
+                f"No user has {ExpensePredictionModel.MIN_HISTORY_DAYS + options['horizon']} days of expense history"
+            )
+        self.stdout.write(f"{len(series)} users, {options['folds']} folds of {options['horizon']} days")
+
+        for backend in options['backends']:
+            results = [
+                result for result in (
+                    backtest_expense_model(user_series, backend, options['horizon'], options['folds'])
+                    for user_series in series
+                ) if result
+            ]
+            average = {key: sum(result[key] for result in results) / len(results) for key in (
+                'mae', 'rmse', 'baseline_mae', 'train_seconds', 'predict_seconds'
+            )}
+            self.stdout.write(
+                f"{backend:>6}: MAE {average['mae']:.2f} (28-day mean baseline {average['baseline_mae']:.2f}), "
+                f"RMSE {average['rmse']:.2f}, train {average['train_seconds'] * 1000:.1f} ms, "
+                f"predict {average['predict_seconds'] * 1000:.1f} ms per fold"
+            )
+
+    def _get_users(self, email, count):
+        User = get_user_model()
+        if email:
+            try:
+                return [User.objects.get(email=email)]
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {email}")
+
+        users = list(
+            User.objects.annotate(n=Count('transactions', filter=Q(transactions__transaction_type='expense')))
+            .filter(n__gt=0)
+            .order_by('-n')[:count]
+        )
+        if not users:
+            raise CommandError("No users with expenses to benchmark")
+        return users
@@ -0,0 +1,92 @@
+"""
+Check that the notification and insight hot queries are planned on their indexes.
+
+Runs EXPLAIN for each query and fails if the expected index is not in the
+plan. On PostgreSQL sequential scans are disabled for the check (unless
+--natural-plan), so a small development database still shows whether the
+index can serve the query rather than the planner's choice for a tiny table.
+The test suite runs the same check on PostgreSQL (NotificationIndexPlanTests).
+
+Examples:
+    python manage.py explain_notification_indexes
+    python manage.py explain_notification_indexes --email user@example.com --verbose
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction as db_transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from api.notification_models import AIInsight, Notification
+
+
+def hot_queries(user):
+    """(label, queryset, expected index) for the queries the indexes exist for."""
+    now = timezone.now()
+    retention_cutoff = now - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+    notifications = Notification.objects.filter(user=user)
+    insights = AIInsight.objects.filter(user=user)
+    return [
+        ('notification list', notifications.filter(archived_at__isnull=True)[:20], 'notif_user_created_idx'),
+        ('unread count', notifications.filter(read_at__isnull=True).values('id'), 'notif_user_unread_idx'),
+        ('unread list', notifications.filter(read_at__isnull=True)[:20], 'notif_user_unread_idx'),
+        (
+            'retention purge',
+            Notification.objects.filter(read_at__lt=retention_cutoff).order_by().values_list('id', 'user_id')[:1000],
+            'notif_read_at_idx',
+        ),
+        ('insight list', insights[:20], 'insight_user_created_idx'),
+        ('insights by type', insights.filter(insight_type='anomaly')[:20], 'insight_user_type_idx'),
+        ('open insights', insights.filter(is_actionable=True, action_taken=False)[:20], 'insight_user_open_idx'),
+        (
+            'report insights',
+            insights.filter(created_at__range=[now - timedelta(days=30), now])[:5],
+            'insight_user_created_idx',
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN notification/insight hot queries and check they use their indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help="User to plan queries for (default: user with most notifications)")
+        parser.add_argument('--natural-plan', action='store_true', help="Don't disable sequential scans on PostgreSQL")
+        parser.add_argument('--verbose', action='store_true', help="Print every plan")
+
+    def handle(self, *args, **options):
+        user = self._get_user(options['email'])
+        missing = []
+
+        with db_transaction.atomic():
+            if connection.vendor == 'postgresql' and not options['natural_plan']:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for label, queryset, index_name in hot_queries(user):
+                plan = queryset.explain()
+                uses_index = index_name in plan
+                self.stdout.write(f"{'ok' if uses_index else 'MISSING':>7}  {label}: {index_name}")
+                if options['verbose'] or not uses_index:
+                    self.stdout.write(f"         {plan.replace(chr(10), chr(10) + '         ')}")
+                if not uses_index:
+                    missing.append(label)
+
+        if missing:
+            raise CommandError(f"Queries not using their index: {', '.join(missing)}")
+
+    def _get_user(self, email):
+        User = get_user_model()
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {email}")
+
+        user = User.objects.annotate(n=Count('notifications')).order_by('-n').first()
+        if user is None:
+            raise CommandError("No users to plan queries for")
+        return user
@@ -0,0 +1,84 @@
+"""
+Post sample Plaid webhook payloads to the webhook endpoint.
+
+Examples:
+    python manage.py fake_plaid_webhook item-mock-12345
+    python manage.py fake_plaid_webhook item-mock-12345 --code TRANSACTIONS_REMOVED --removed txn_1 txn_2
+    python manage.py fake_plaid_webhook item-mock-12345 --code ERROR --url http://localhost:8000/api/plaid/webhook/
+
+The webhook is authenticated with settings.PLAID_WEBHOOK_SECRET (or --secret).
+"""
+import json
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+WEBHOOK_TYPES = {
+    'SYNC_UPDATES_AVAILABLE': 'TRANSACTIONS',
+    'TRANSACTIONS_REMOVED': 'TRANSACTIONS',
+    'ERROR': 'ITEM',
+    'LOGIN_REPAIRED': 'ITEM',
+}
+
+
+def build_payload(item_id, code, removed=None):
+    """Build a Plaid-shaped webhook body for the given code."""
+    payload = {
+        'webhook_type': WEBHOOK_TYPES[code],
+        'webhook_code': code,
+        'item_id': item_id,
+        'environment': 'sandbox',
+    }
+    if code == 'SYNC_UPDATES_AVAILABLE':
+        payload.update({'initial_update_complete': True, 'historical_update_complete': True})
+    elif code == 'TRANSACTIONS_REMOVED':
+        payload['removed_transactions'] = removed or []
+    elif code == 'ERROR':
+        payload['error'] = {
+            'error_type': 'ITEM_ERROR',
+            'error_code': 'ITEM_LOGIN_REQUIRED',
+            'error_message': "the login details of this item have changed",
+        }
+    return payload
+
+
+class Command(BaseCommand):
+    help = "Post sample Plaid webhook payloads to the local webhook endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('item_id', help="Plaid item id the webhook refers to")
+        parser.add_argument('--code', default='SYNC_UPDATES_AVAILABLE', choices=sorted(WEBHOOK_TYPES))
+        parser.add_argument('--removed', nargs='*', default=[], help="Transaction ids for TRANSACTIONS_REMOVED")
+        parser.add_argument('--count', type=int, default=1, help="Send the same webhook several times (burst)")
+        parser.add_argument('--url', help="Post to a running server instead of the in-process test client")
+        parser.add_argument('--secret', help="Webhook secret to send (default: settings.PLAID_WEBHOOK_SECRET)")
+
+    def handle(self, *args, **options):
+        payload = build_payload(options['item_id'], options['code'], options['removed'])
+        body = json.dumps(payload)
+        secret = options['secret'] or settings.PLAID_WEBHOOK_SECRET
+        query = '?' + urllib.parse.urlencode({'secret': secret}) if secret else ''
+
+        for _ in range(options['count']):
+            if options['url']:
+                status_code, content = self._post_http(options['url'] + query, body)
+            else:
+                response = Client(HTTP_HOST='localhost').post(
+                    reverse('plaid_webhook') + query, body, content_type='application/json'
+                )
+                status_code, content = response.status_code, response.content.decode()
+            self.stdout.write(f"{status_code} {content}")
+
+    def _post_http(self, url, body):
+        request = urllib.request.Request(
+            url, data=body.encode(), headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read().decode()
+        except OSError as e:
+            raise CommandError(f"Could not post webhook to {url}: {e}")
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.19 on 2026-10-19 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_user_avatar_user_bio_user_date_of_birth_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='next_sync_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['auto_sync_enabled', 'is_plaid_account', 'next_sync_at'], name='api_account_auto_sy_2a2cd7_idx'),
+        ),
+    ]
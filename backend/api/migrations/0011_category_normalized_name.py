@@ -0,0 +1,35 @@
+# Generated by Django 4.2.19 on 2026-10-19 09:23
+
+import re
+
+from django.db import migrations, models
+
+
+def backfill_normalized_names(apps, schema_editor):
+    """Fill normalized_name for existing categories (same rule as api.category_resolver)."""
+    Category = apps.get_model('api', 'Category')
+    categories = list(Category.objects.all())
+    for category in categories:
+        name = (category.name or '').lower().replace('&', ' and ')
+        category.normalized_name = re.sub(r'[^a-z0-9]+', ' ', name).strip()
+    Category.objects.bulk_update(categories, ['normalized_name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_account_next_sync_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='normalized_name',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['normalized_name', 'category_type'], name='api_categor_normali_6d8c31_idx'),
+        ),
+        migrations.RunPython(backfill_normalized_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.19 on 2026-10-19 11:02
+
+from django.db import migrations
+
+# The search_vector column is generated by PostgreSQL and not declared on the
+# Transaction model; api.search queries it directly. Other databases skip
+# this migration and search with ILIKE.
+FORWARD_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE api_transaction ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english'::regconfig, COALESCE(merchant_name, '')), 'A') ||
+        setweight(to_tsvector('english'::regconfig, COALESCE(description, '')), 'B') ||
+        setweight(to_tsvector('english'::regconfig, COALESCE(notes, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX api_transaction_search_gin ON api_transaction USING GIN (search_vector)",
+    "CREATE INDEX api_transaction_merchant_trgm ON api_transaction USING GIN (merchant_name gin_trgm_ops)",
+    "CREATE INDEX api_transaction_description_trgm ON api_transaction USING GIN (description gin_trgm_ops)",
+]
+
+REVERSE_SQL = [
+    "DROP INDEX IF EXISTS api_transaction_description_trgm",
+    "DROP INDEX IF EXISTS api_transaction_merchant_trgm",
+    "DROP INDEX IF EXISTS api_transaction_search_gin",
+    "ALTER TABLE api_transaction DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_categoryrule'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run_on_postgres(FORWARD_SQL), _run_on_postgres(REVERSE_SQL)),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-19 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_statementimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.19 on 2026-10-19 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_notification_archived_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aiinsight',
+            index=models.Index(fields=['user', '-created_at'], name='insight_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aiinsight',
+            index=models.Index(fields=['user', 'insight_type', '-created_at'], name='insight_user_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aiinsight',
+            index=models.Index(condition=models.Q(('action_taken', False), ('is_actionable', True)), fields=['user', '-created_at'], name='insight_user_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('read_at__isnull', True)), fields=['user', '-created_at'], name='notif_user_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('read_at__isnull', False)), fields=['read_at'], name='notif_read_at_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-19 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('budget_warning', 'Budget Warning'), ('budget_exceeded', 'Budget Exceeded'), ('weekly_summary', 'Weekly Summary'), ('monthly_report', 'Monthly Report'), ('ai_insight', 'AI Insight'), ('anomaly_alert', 'Anomaly Alert'), ('goal_achievement', 'Goal Achievement'), ('saving_suggestion', 'Saving Suggestion'), ('digest', 'Digest')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.19 on 2026-10-19 09:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_notification_digest_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField(help_text='Monday of the ISO week')),
+                ('total_income', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_expenses', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('transaction_count', models.IntegerField()),
+                ('top_categories', models.JSONField(default=list, help_text='[[category, amount], ...] by amount spent')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-week_start'],
+                'unique_together': {('user', 'week_start')},
+            },
+        ),
+    ]
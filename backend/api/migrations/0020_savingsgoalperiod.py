@@ -0,0 +1,30 @@
+# Generated by Django 4.2.19 on 2026-10-19 09:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_weeklysummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavingsGoalPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(help_text='First day of the month')),
+                ('baseline_spending', models.DecimalField(decimal_places=2, help_text="Average monthly spending in the goal's categories over the 3 months before", max_digits=12)),
+                ('spent_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('saved_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('goal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='periods', to='api.savingsgoal')),
+            ],
+            options={
+                'ordering': ['-period'],
+                'unique_together': {('goal', 'period')},
+            },
+        ),
+    ]
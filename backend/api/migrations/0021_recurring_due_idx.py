@@ -0,0 +1,17 @@
+# Generated by Django 4.2.19 on 2026-10-19 09:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_savingsgoalperiod'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recurringtransaction',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['next_due_date'], name='recurring_due_idx'),
+        ),
+    ]
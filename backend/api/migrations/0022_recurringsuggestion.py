@@ -0,0 +1,40 @@
+# Generated by Django 4.2.19 on 2026-10-19 10:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_recurring_due_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merchant_key', models.CharField(help_text='Normalized merchant name', max_length=200)),
+                ('description', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('transaction_type', models.CharField(choices=[('expense', 'Expense'), ('income', 'Income'), ('transfer', 'Transfer')], max_length=10)),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('yearly', 'Yearly')], max_length=10)),
+                ('occurrences', models.PositiveIntegerField()),
+                ('last_date', models.DateField()),
+                ('next_due_date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('dismissed', 'Dismissed')], default='pending', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.account')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.category')),
+                ('recurring_transaction', models.ForeignKey(blank=True, help_text='Template created when the suggestion was accepted', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='suggestions', to='api.recurringtransaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_suggestions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['next_due_date'],
+                'unique_together': {('user', 'account', 'merchant_key', 'transaction_type', 'frequency')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-19 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_recurringsuggestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='category_set_by_user',
+            field=models.BooleanField(default=False),
+        ),
+    ]
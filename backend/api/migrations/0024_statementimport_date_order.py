@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-19 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_transaction_category_set_by_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statementimport',
+            name='date_order',
+            field=models.CharField(choices=[('auto', 'Detect'), ('mdy', 'Month first (MM/DD/YYYY)'), ('dmy', 'Day first (DD/MM/YYYY)')], default='auto', max_length=4),
+        ),
+    ]
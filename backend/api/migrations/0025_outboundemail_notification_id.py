@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-19 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_statementimport_date_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='notification_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.19 on 2026-10-19 10:36
+
+from django.db import migrations, models
+
+
+def track_accepted_suggestions(apps, schema_editor):
+    """Templates accepted from suggestions track bank-synced payments only."""
+    RecurringTransaction = apps.get_model('api', 'RecurringTransaction')
+    RecurringSuggestion = apps.get_model('api', 'RecurringSuggestion')
+    RecurringTransaction.objects.filter(
+        id__in=RecurringSuggestion.objects.filter(recurring_transaction__isnull=False).values('recurring_transaction')
+    ).update(creates_transactions=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_outboundemail_notification_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurringtransaction',
+            name='creates_transactions',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(track_accepted_suggestions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.19 on 2026-10-19 10:57
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def skip_missed_occurrences(apps, schema_editor):
+    """Templates were never advanced before materialization: start them at the deploy date."""
+    from api.recurring import skip_missed_occurrences
+
+    RecurringTransaction = apps.get_model('api', 'RecurringTransaction')
+    skip_missed_occurrences(RecurringTransaction.objects.all(), timezone.localdate())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_category_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(skip_missed_occurrences, migrations.RunPython.noop),
+    ]
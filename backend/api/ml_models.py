@@ -1,194 +1,224 @@
 """
-Machine Learning models for expense prediction and anomaly detection.
+Machine Learning models for expense prediction, anomaly detection and
+transaction categorization.
 """
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor, IsolationForest
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.model_selection import train_test_split
+from sklearn.ensemble import HistGradientBoostingRegressor, IsolationForest
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import Ridge, SGDClassifier
+from sklearn.compose import make_column_transformer
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 import joblib
 import os
+import re
+import time
 from datetime import datetime, timedelta
 from decimal import Decimal
 from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.text import slugify
 from .models import Transaction, Category
 
 
 class ExpensePredictionModel:
-    """Model for predicting future expenses based on historical data."""
+    """Daily expense forecaster for a user (optionally one category).
     
-    def __init__(self):
-        self.model = RandomForestRegressor(n_estimators=100, random_state=42)
-        self.scaler = StandardScaler()
-        self.category_encoder = LabelEncoder()
+    Expenses are summed per calendar day with pandas resample, so days
+    without spending are zeros rather than missing rows. Every day's
+    features (calendar fields, lags, rolling windows) come from the days
+    before it only, and build_features is the one place they are computed:
+    training applies it to the whole history, prediction to the history
+    extended by one day at a time, feeding each prediction back in as the
+    next day's lag. Training and serving features are therefore identical.
+    """
+    
+    BACKENDS = ('gbm', 'linear')
+    LAGS = (1, 7, 14, 21, 28)
+    WINDOWS = (7, 28)
+    FEATURE_COLUMNS = [
+        'day_of_week', 'day_of_month', 'month', 'is_weekend',
+        'lag_1', 'lag_7', 'lag_14', 'lag_21', 'lag_28', 'same_weekday_mean',
+        'rolling_7_mean', 'rolling_28_mean', 'rolling_28_std',
+    ]
+    # Days of history the features of one day need (largest lag/window)
+    LOOKBACK_DAYS = 28
+    HISTORY_DAYS = 730
+    MIN_HISTORY_DAYS = 84
+    MIN_EXPENSE_DAYS = 10
+    HOLDOUT_DAYS = 28
+    RETRAIN_AFTER_DAYS = 7
+    
+    def __init__(self, backend=None):
+        self.backend = backend or settings.EXPENSE_MODEL_BACKEND
+        if self.backend not in self.BACKENDS:
+            raise ValueError(f"Unknown expense model backend {self.backend}")
+        self.model = self.new_model()
         self.model_path = os.path.join(settings.BASE_DIR, 'ml_models')
         os.makedirs(self.model_path, exist_ok=True)
     
-    def prepare_features(self, transactions_df):
-        """Prepare features for the ML model."""
-        if transactions_df.empty:
-            return pd.DataFrame()
-            
-        # Create time-based features
-        transactions_df['transaction_date'] = pd.to_datetime(transactions_df['transaction_date'])
-        transactions_df['day_of_week'] = transactions_df['transaction_date'].dt.dayofweek
-        transactions_df['day_of_month'] = transactions_df['transaction_date'].dt.day
-        transactions_df['month'] = transactions_df['transaction_date'].dt.month
-        transactions_df['quarter'] = transactions_df['transaction_date'].dt.quarter
-        transactions_df['is_weekend'] = transactions_df['day_of_week'].isin([5, 6]).astype(int)
-        
-        # Category encoding
-        if 'category_name' in transactions_df.columns:
-            transactions_df['category_encoded'] = self.category_encoder.fit_transform(
-                transactions_df['category_name'].fillna('Unknown')
+    def new_model(self):
+        if self.backend == 'linear':
+            # Calendar fields are categories to a linear model (rent on the 1st, busy Saturdays)
+            features = make_column_transformer(
+                (OneHotEncoder(handle_unknown='ignore'), ['day_of_week', 'day_of_month']),
+                remainder=StandardScaler(),
             )
-        else:
-            transactions_df['category_encoded'] = 0
-        
-        # Calculate rolling averages
-        transactions_df = transactions_df.sort_values('transaction_date')
-        transactions_df['rolling_7_avg'] = transactions_df['amount'].rolling(7, min_periods=1).mean()
-        transactions_df['rolling_30_avg'] = transactions_df['amount'].rolling(30, min_periods=1).mean()
+            return make_pipeline(features, Ridge(alpha=1.0))
+        return HistGradientBoostingRegressor(max_iter=200, learning_rate=0.05, random_state=42)
+    
+    def model_file(self, user_id, category_name=None):
+        suffix = f"_{slugify(category_name)}" if category_name else ''
+        return os.path.join(self.model_path, f'expense_model_user_{user_id}{suffix}.joblib')
+    
+    @classmethod
+    def daily_series(cls, user_id, category_name=None, end_date=None, start_date=None):
+        """Expense total per calendar day through end_date (default yesterday, the last full day).
         
-        # Select features for prediction
-        feature_columns = [
-            'day_of_week', 'day_of_month', 'month', 'quarter', 'is_weekend',
-            'category_encoded', 'rolling_7_avg', 'rolling_30_avg'
-        ]
+        Starts at start_date, or at the first expense within HISTORY_DAYS.
+        """
+        end_date = end_date or timezone.now().date() - timedelta(days=1)
+        transactions = Transaction.objects.filter(
+            user_id=user_id,
+            transaction_type='expense',
+            transaction_date__range=[start_date or end_date - timedelta(days=cls.HISTORY_DAYS), end_date],
+        )
+        if category_name:
+            transactions = transactions.filter(category__name=category_name)
+        totals = transactions.order_by().values('transaction_date').annotate(total=Sum('amount'))
         
-        return transactions_df[feature_columns].fillna(0)
+        series = pd.Series(
+            {pd.Timestamp(row['transaction_date']): float(row['total']) for row in totals}, dtype=float
+        ).sort_index()
+        # resample fills the days without expenses inside the range with 0
+        series = series.resample('D').sum() if len(series) else series
+        start = pd.Timestamp(start_date) if start_date else (series.index.min() if len(series) else pd.Timestamp(end_date))
+        return series.reindex(pd.date_range(start, pd.Timestamp(end_date), freq='D'), fill_value=0.0)
     
-    def train(self, user_id):
-        """Train the model using user's transaction history."""
+    @classmethod
+    def build_features(cls, series):
+        """Feature frame for every day of a daily series, from earlier days only."""
+        index = series.index
+        past = series.shift(1)
+        features = pd.DataFrame({
+            'day_of_week': index.dayofweek,
+            'day_of_month': index.day,
+            'month': index.month,
+            'is_weekend': (index.dayofweek >= 5).astype(int),
+        }, index=index)
+        for lag in cls.LAGS:
+            features[f'lag_{lag}'] = series.shift(lag)
+        features['same_weekday_mean'] = features[['lag_7', 'lag_14', 'lag_21', 'lag_28']].mean(axis=1, skipna=False)
+        for window in cls.WINDOWS:
+            features[f'rolling_{window}_mean'] = past.rolling(window, min_periods=window).mean()
+        features['rolling_28_std'] = past.rolling(28, min_periods=28).std()
+        return features[cls.FEATURE_COLUMNS]
+    
+    def forecast(self, history, days):
+        """Predict the `days` days following a daily series, one day at a time."""
+        values = history.iloc[-(self.LOOKBACK_DAYS + 1):].copy()
+        predictions = []
+        for _ in range(days):
+            next_day = values.index[-1] + pd.Timedelta(days=1)
+            values.loc[next_day] = np.nan
+            features = self.build_features(values).iloc[[-1]]
+            prediction = max(float(self.model.predict(features)[0]), 0.0)
+            values.loc[next_day] = prediction
+            values = values.iloc[1:]
+            predictions.append((next_day.date(), prediction))
+        return predictions
+    
+    def fit_series(self, series):
+        """Fit the model on a daily series; returns the number of training days."""
+        features = self.build_features(series)
+        usable = features.notna().all(axis=1)
+        self.model = self.new_model()
+        self.model.fit(features[usable], series[usable])
+        return int(usable.sum())
+    
+    def train(self, user_id, category_name=None):
+        """Train on the user's daily expense history and save the model."""
         try:
-            # Get user's expense transactions
-            transactions = Transaction.objects.filter(
-                user_id=user_id,
-                transaction_type='expense'
-            ).select_related('category').values(
-                'amount', 'transaction_date', 'category__name'
-            )
-            
-            if not transactions:
-                return False, "No transaction data available for training"
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(transactions)
-            df.rename(columns={'category__name': 'category_name'}, inplace=True)
-            df['amount'] = df['amount'].astype(float)
-            
-            if len(df) < 10:
-                return False, "Insufficient transaction data for training (minimum 10 transactions required)"
-            
-            # Prepare features
-            features = self.prepare_features(df.copy())
-            if features.empty:
-                return False, "Could not prepare features from transaction data"
-            
-            # Prepare target variable
-            target = df['amount'].values
-            
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(
-                features, target, test_size=0.2, random_state=42
-            )
-            
-            # Scale features
-            X_train_scaled = self.scaler.fit_transform(X_train)
-            X_test_scaled = self.scaler.transform(X_test)
-            
-            # Train model
-            self.model.fit(X_train_scaled, y_train)
-            
-            # Evaluate model
-            y_pred = self.model.predict(X_test_scaled)
-            mae = mean_absolute_error(y_test, y_pred)
-            rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-            
-            # Save model
-            model_file = os.path.join(self.model_path, f'expense_model_user_{user_id}.joblib')
-            scaler_file = os.path.join(self.model_path, f'scaler_user_{user_id}.joblib')
-            encoder_file = os.path.join(self.model_path, f'encoder_user_{user_id}.joblib')
-            
-            joblib.dump(self.model, model_file)
-            joblib.dump(self.scaler, scaler_file)
-            joblib.dump(self.category_encoder, encoder_file)
+            series = self.daily_series(user_id, category_name)
+            
+            if int((series > 0).sum()) < self.MIN_EXPENSE_DAYS:
+                return False, f"Insufficient transaction data for training (minimum {self.MIN_EXPENSE_DAYS} days with expenses required)"
+            if len(series) < self.MIN_HISTORY_DAYS:
+                return False, f"Insufficient history for training (minimum {self.MIN_HISTORY_DAYS} days required)"
+            
+            # Time-ordered evaluation: forecast the most recent days from the ones before
+            history, holdout = series.iloc[:-self.HOLDOUT_DAYS], series.iloc[-self.HOLDOUT_DAYS:]
+            self.fit_series(history)
+            predicted = np.array([amount for _, amount in self.forecast(history, self.HOLDOUT_DAYS)])
+            mae = mean_absolute_error(holdout, predicted)
+            rmse = float(np.sqrt(mean_squared_error(holdout, predicted)))
+            baseline_mae = mean_absolute_error(holdout, np.full(len(holdout), history.iloc[-28:].mean()))
+            
+            # Serve a model fitted on all days
+            started = time.perf_counter()
+            training_samples = self.fit_series(series)
+            training_seconds = time.perf_counter() - started
+            
+            model_file = self.model_file(user_id, category_name)
+            joblib.dump({
+                'model': self.model,
+                'backend': self.backend,
+                'feature_columns': self.FEATURE_COLUMNS,
+                'trained_through': series.index[-1].date(),
+            }, model_file)
             
             return True, {
+                'backend': self.backend,
                 'mae': round(mae, 2),
                 'rmse': round(rmse, 2),
-                'training_samples': len(df),
+                'baseline_mae': round(baseline_mae, 2),
+                'training_samples': training_samples,
+                'training_seconds': round(training_seconds, 3),
                 'model_saved': model_file
             }
             
         except Exception as e:
             return False, f"Training failed: {str(e)}"
     
-    def predict_next_month_expenses(self, user_id, category_name=None):
-        """Predict expenses for the next month."""
+    def load(self, user_id, category_name=None):
+        """Load the saved model; returns the day it was trained through, or None if untrained."""
+        model_file = self.model_file(user_id, category_name)
+        if not os.path.exists(model_file):
+            return None
+        bundle = joblib.load(model_file)
+        if not isinstance(bundle, dict) or bundle.get('feature_columns') != self.FEATURE_COLUMNS:
+            # Saved by an older version of the model
+            return None
+        self.model = bundle['model']
+        self.backend = bundle['backend']
+        return bundle['trained_through']
+    
+    def ensure_trained(self, user_id, category_name=None):
+        """Load the saved model, training first if there is none or it is RETRAIN_AFTER_DAYS old."""
+        trained_through = self.load(user_id, category_name)
+        if trained_through and trained_through >= timezone.now().date() - timedelta(days=self.RETRAIN_AFTER_DAYS):
+            return True, {'backend': self.backend, 'trained_through': trained_through}
+        return self.train(user_id, category_name)
+    
+    def predict_next_month_expenses(self, user_id, category_name=None, days=30):
+        """Predict daily expenses for the next `days` days, starting today."""
         try:
-            # Load trained model
-            model_file = os.path.join(self.model_path, f'expense_model_user_{user_id}.joblib')
-            scaler_file = os.path.join(self.model_path, f'scaler_user_{user_id}.joblib')
-            encoder_file = os.path.join(self.model_path, f'encoder_user_{user_id}.joblib')
-            
-            if not all(os.path.exists(f) for f in [model_file, scaler_file, encoder_file]):
+            if self.load(user_id, category_name) is None:
                 return None, "Model not trained for this user"
             
-            self.model = joblib.load(model_file)
-            self.scaler = joblib.load(scaler_file)
-            self.category_encoder = joblib.load(encoder_file)
-            
-            # Create prediction features for next 30 days
-            today = datetime.now()
-            predictions = []
-            
-            for i in range(30):
-                future_date = today + timedelta(days=i)
-                
-                # Create feature vector
-                features = {
-                    'day_of_week': future_date.weekday(),
-                    'day_of_month': future_date.day,
-                    'month': future_date.month,
-                    'quarter': (future_date.month - 1) // 3 + 1,
-                    'is_weekend': int(future_date.weekday() >= 5),
-                    'category_encoded': 0,  # Default category
-                    'rolling_7_avg': 0,  # Will be updated based on historical data
-                    'rolling_30_avg': 0
-                }
-                
-                # Encode category if provided
-                if category_name:
-                    try:
-                        features['category_encoded'] = self.category_encoder.transform([category_name])[0]
-                    except ValueError:
-                        features['category_encoded'] = 0
-                
-                # Get recent transaction averages for rolling features
-                recent_transactions = Transaction.objects.filter(
-                    user_id=user_id,
-                    transaction_type='expense',
-                    transaction_date__gte=today - timedelta(days=30)
-                ).aggregate(
-                    avg_amount=models.Avg('amount')
-                )
-                
-                if recent_transactions['avg_amount']:
-                    features['rolling_7_avg'] = float(recent_transactions['avg_amount'])
-                    features['rolling_30_avg'] = float(recent_transactions['avg_amount'])
-                
-                # Make prediction
-                feature_vector = np.array(list(features.values())).reshape(1, -1)
-                feature_vector_scaled = self.scaler.transform(feature_vector)
-                predicted_amount = self.model.predict(feature_vector_scaled)[0]
-                
-                predictions.append({
-                    'date': future_date.strftime('%Y-%m-%d'),
-                    'predicted_amount': round(max(0, predicted_amount), 2)
-                })
+            yesterday = timezone.now().date() - timedelta(days=1)
+            history = self.daily_series(
+                user_id, category_name,
+                end_date=yesterday,
+                start_date=yesterday - timedelta(days=self.LOOKBACK_DAYS),
+            )
+            predictions = [
+                {'date': day.isoformat(), 'predicted_amount': round(amount, 2)}
+                for day, amount in self.forecast(history, days)
+            ]
             
             # Calculate total monthly prediction
             total_predicted = sum(p['predicted_amount'] for p in predictions)
@@ -196,13 +226,53 @@ class ExpensePredictionModel:
             return {
                 'total_monthly_prediction': round(total_predicted, 2),
                 'daily_predictions': predictions,
-                'category': category_name or 'All Categories'
+                'category': category_name or 'All Categories',
+                'backend': self.backend
             }, None
             
         except Exception as e:
             return None, f"Prediction failed: {str(e)}"
 
 
+def backtest_expense_model(series, backend, horizon=28, folds=4):
+    """Time-ordered backtest of one backend on a daily expense series.
+    
+    For each fold the model is trained on every day before a cutoff and
+    forecasts the next `horizon` days; cutoffs step forward by `horizon`,
+    and the last fold ends at the end of the series. Returns average
+    MAE/RMSE, the MAE of a 28-day-mean baseline, and timings.
+    """
+    model = ExpensePredictionModel(backend)
+    results = []
+    for fold in range(folds, 0, -1):
+        cutoff = len(series) - fold * horizon
+        if cutoff < ExpensePredictionModel.MIN_HISTORY_DAYS:
+            continue
+        history, actual = series.iloc[:cutoff], series.iloc[cutoff:cutoff + horizon]
+        
+        started = time.perf_counter()
+        model.fit_series(history)
+        trained = time.perf_counter()
+        predicted = np.array([amount for _, amount in model.forecast(history, horizon)])
+        predicted_at = time.perf_counter()
+        
+        results.append({
+            'mae': mean_absolute_error(actual, predicted),
+            'rmse': float(np.sqrt(mean_squared_error(actual, predicted))),
+            'baseline_mae': mean_absolute_error(actual, np.full(horizon, history.iloc[-28:].mean())),
+            'train_seconds': trained - started,
+            'predict_seconds': predicted_at - trained,
+        })
+    
+    if not results:
+        return None
+    return {
+        'backend': backend,
+        'folds': len(results),
+        **{key: float(np.mean([result[key] for result in results])) for key in results[0]},
+    }
+
+
 class AnomalyDetectionModel:
     """Model for detecting unusual spending patterns."""
     
@@ -343,6 +413,164 @@ class AnomalyDetectionModel:
             return None, f"Anomaly detection failed: {str(e)}"
 
 
+_DIGITS = re.compile(r'\d+')
+
+
+def _normalize_transaction_text(text):
+    """Lowercase and collapse digit runs (store numbers, card suffixes)."""
+    return _DIGITS.sub('0', text.lower())
+
+
+# Stateless, so one shared instance serves training and every prediction
+_category_vectorizer = HashingVectorizer(
+    analyzer='char_wb',
+    ngram_range=(3, 5),
+    n_features=2 ** 18,
+    alternate_sign=False,
+    preprocessor=_normalize_transaction_text,
+)
+
+
+def category_classifier_file():
+    return os.path.join(settings.BASE_DIR, 'ml_models', 'category_classifier.joblib')
+
+
+class CategoryClassifier:
+    """Linear classifier predicting a transaction's category from its text.
+    
+    Features are hashed character n-grams of description + merchant name, so
+    there is no vocabulary to store and training streams over the table in
+    fixed-size chunks.
+    """
+    
+    CHUNK_SIZE = 5000
+    HOLDOUT_EVERY = 10  # every 10th row is kept back for evaluation
+    MAX_HOLDOUT = 20000
+    
+    def __init__(self):
+        self.vectorizer = _category_vectorizer
+        self.model = SGDClassifier(loss='log_loss', alpha=1e-5, random_state=42)
+        self.model_path = os.path.join(settings.BASE_DIR, 'ml_models')
+        self.model_file = category_classifier_file()
+        os.makedirs(self.model_path, exist_ok=True)
+    
+    @staticmethod
+    def build_text(description, merchant_name):
+        return f"{description or ''} {merchant_name or ''}"
+    
+    def training_queryset(self):
+        """Transactions whose category was picked by a user, not auto-assigned."""
+        return Transaction.objects.filter(category__isnull=False, category_set_by_user=True)
+    
+    def train(self):
+        """Train on manually categorized transactions across all users."""
+        try:
+            queryset = self.training_queryset()
+            classes = np.array(sorted(
+                queryset.order_by().values_list('category_id', flat=True).distinct()
+            ))
+            
+            if len(classes) < 2:
+                return False, "Need manually categorized transactions in at least 2 categories"
+            
+            holdout_texts, holdout_labels = [], []
+            chunk_texts, chunk_labels = [], []
+            training_samples = 0
+            
+            rows = queryset.values_list('description', 'merchant_name', 'category_id').iterator(
+                chunk_size=self.CHUNK_SIZE
+            )
+            for i, (description, merchant_name, category_id) in enumerate(rows):
+                text = self.build_text(description, merchant_name)
+                if i % self.HOLDOUT_EVERY == 0 and len(holdout_texts) < self.MAX_HOLDOUT:
+                    holdout_texts.append(text)
+                    holdout_labels.append(category_id)
+                    continue
+                
+                chunk_texts.append(text)
+                chunk_labels.append(category_id)
+                if len(chunk_texts) >= self.CHUNK_SIZE:
+                    self.model.partial_fit(self.vectorizer.transform(chunk_texts), chunk_labels, classes=classes)
+                    training_samples += len(chunk_texts)
+                    chunk_texts, chunk_labels = [], []
+            
+            if chunk_texts:
+                self.model.partial_fit(self.vectorizer.transform(chunk_texts), chunk_labels, classes=classes)
+                training_samples += len(chunk_texts)
+            
+            if training_samples == 0:
+                return False, "Insufficient transaction data for training"
+            
+            accuracy = None
+            if holdout_texts:
+                accuracy = float(self.model.score(self.vectorizer.transform(holdout_texts), holdout_labels))
+            
+            joblib.dump(self.model, self.model_file)
+            _loaded_category_classifier.clear()
+            
+            return True, {
+                'accuracy': round(accuracy, 3) if accuracy is not None else None,
+                'training_samples': training_samples,
+                'holdout_samples': len(holdout_texts),
+                'categories': len(classes),
+                'model_saved': self.model_file
+            }
+            
+        except Exception as e:
+            return False, f"Training failed: {str(e)}"
+    
+    def load(self):
+        """Load the saved model; returns False if it has not been trained yet."""
+        if not os.path.exists(self.model_file):
+            return False
+        self.model = joblib.load(self.model_file)
+        return True
+    
+    def predict_batch(self, rows):
+        """Predict (category_id, probability) for (description, merchant_name) rows.
+        
+        Works through the rows in chunks so memory stays flat for large pages.
+        """
+        results = []
+        rows = list(rows)
+        for start in range(0, len(rows), self.CHUNK_SIZE):
+            chunk = rows[start:start + self.CHUNK_SIZE]
+            features = self.vectorizer.transform(
+                [self.build_text(description, merchant) for description, merchant in chunk]
+            )
+            probabilities = self.model.predict_proba(features)
+            best = probabilities.argmax(axis=1)
+            results.extend(
+                (int(self.model.classes_[index]), float(probabilities[row, index]))
+                for row, index in enumerate(best)
+            )
+        return results
+
+
+_loaded_category_classifier = {}
+
+
+def get_category_classifier():
+    """Return the trained classifier, loaded once per process (None if untrained).
+    
+    Only the model file's mtime is checked per call; a retrained file is
+    reloaded on the next call.
+    """
+    try:
+        mtime = os.path.getmtime(category_classifier_file())
+    except OSError:
+        return None
+    
+    cached = _loaded_category_classifier.get('classifier')
+    if cached and cached[0] == mtime:
+        return cached[1]
+    
+    classifier = CategoryClassifier()
+    classifier.load()
+    _loaded_category_classifier['classifier'] = (mtime, classifier)
+    return classifier
+
+
 def generate_ai_insights(user_id):
     """Generate comprehensive AI insights for a user."""
     insights = {
@@ -433,9 +661,9 @@ def generate_ai_insights(user_id):
                     'category': 'Subscriptions'
                 })
         
-        # Train and run prediction model
+        # Run the prediction model, training it if missing or stale
         prediction_model = ExpensePredictionModel()
-        success, result = prediction_model.train(user_id)
+        success, result = prediction_model.ensure_trained(user_id)
         
         if success:
             predictions, error = prediction_model.predict_next_month_expenses(user_id)
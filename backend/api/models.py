@@ -3,7 +3,7 @@ from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, Permis
 from django.db import models
 from django.utils import timezone
 from decimal import Decimal
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 class UserManager(BaseUserManager):
@@ -82,20 +82,30 @@ class Category(models.Model):
     ]
     
     name = models.CharField(max_length=100)
+    normalized_name = models.CharField(max_length=100, blank=True, editable=False)  # Lookup key, see api.category_resolver
     category_type = models.CharField(max_length=10, choices=CATEGORY_TYPES, default='expense')
     description = models.TextField(blank=True, null=True)
     icon = models.CharField(max_length=50, blank=True, null=True)  # Font Awesome icon class
     color = models.CharField(max_length=7, default='#3182CE')  # Hex color code
     is_default = models.BooleanField(default=False)  # System default categories
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Versions the category_resolver map
 
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['normalized_name', 'category_type']),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.category_type})"
 
+    def save(self, *args, **kwargs):
+        from .category_resolver import normalize_category_name
+        self.normalized_name = normalize_category_name(self.name)
+        super().save(*args, **kwargs)
+
 class Account(models.Model):
     """User's financial accounts (bank accounts, credit cards, etc.)"""
     ACCOUNT_TYPES = [
@@ -132,6 +142,7 @@ class Account(models.Model):
         ('weekly', 'Weekly'),
     ], default='daily')
     last_plaid_sync = models.DateTimeField(null=True, blank=True)
+    next_sync_at = models.DateTimeField(null=True, blank=True)  # Set by api.sync_scheduler
     
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -139,6 +150,9 @@ class Account(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['auto_sync_enabled', 'is_plaid_account', 'next_sync_at']),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.get_account_type_display()})"
@@ -203,6 +217,8 @@ class Transaction(models.Model):
     
     # Auto-categorization confidence score
     categorization_confidence = models.FloatField(default=0.0)
+    # Category picked by the user; these rows train the category classifier
+    category_set_by_user = models.BooleanField(default=False)
     is_recurring = models.BooleanField(default=False)
 
     class Meta:
@@ -264,6 +280,9 @@ class RecurringTransaction(models.Model):
     start_date = models.DateField()
     end_date = models.DateField(null=True, blank=True)
     next_due_date = models.DateField()
+    # False for payments that already arrive through bank sync or import (templates
+    # accepted from a RecurringSuggestion): they are only tracked and forecast
+    creates_transactions = models.BooleanField(default=True)
     
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -271,10 +290,143 @@ class RecurringTransaction(models.Model):
 
     class Meta:
         ordering = ['next_due_date']
+        indexes = [
+            # Due-template scan of the materializer (see api.recurring)
+            models.Index(
+                fields=['next_due_date'],
+                name='recurring_due_idx',
+                condition=models.Q(is_active=True),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.description} - ${self.amount} ({self.frequency})"
 
+class RecurringSuggestion(models.Model):
+    """Recurring payment series found in a user's history (see api.recurring_detection)."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('accepted', 'Accepted'),
+        ('dismissed', 'Dismissed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_suggestions')
+    account = models.ForeignKey(Account, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    recurring_transaction = models.ForeignKey(
+        RecurringTransaction, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='suggestions', help_text="Template created when the suggestion was accepted"
+    )
+    
+    merchant_key = models.CharField(max_length=200, help_text="Normalized merchant name")
+    description = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    frequency = models.CharField(max_length=10, choices=RecurringTransaction.FREQUENCY_CHOICES)
+    
+    occurrences = models.PositiveIntegerField()
+    last_date = models.DateField()
+    next_due_date = models.DateField()
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['user', 'account', 'merchant_key', 'transaction_type', 'frequency']
+        ordering = ['next_due_date']
+
+    def __str__(self):
+        return f"{self.description} - ${self.amount} ({self.frequency}, {self.status})"
+
+class CategoryRule(models.Model):
+    """User-defined auto-categorization rule (see api.categorization)."""
+    RULE_TYPES = [
+        ('keyword', 'Keyword in description or merchant'),
+        ('merchant', 'Exact merchant name'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='category_rules')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    rule_type = models.CharField(max_length=10, choices=RULE_TYPES, default='keyword')
+    pattern = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['user', 'rule_type', 'pattern']
+        ordering = ['rule_type', 'pattern']
+
+    def __str__(self):
+        return f"{self.pattern} -> {self.category.name} ({self.rule_type})"
+
+class StatementImport(models.Model):
+    """An uploaded bank statement (CSV, OFX or QIF) and its import progress."""
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ofx', 'OFX'),
+        ('qif', 'QIF'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    DATE_ORDER_CHOICES = [
+        ('auto', 'Detect'),
+        ('mdy', 'Month first (MM/DD/YYYY)'),
+        ('dmy', 'Day first (DD/MM/YYYY)'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='statement_imports')
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='statement_imports')
+    file = models.FileField(upload_to='statement_imports/%Y/%m/')
+    file_format = models.CharField(max_length=3, choices=FORMAT_CHOICES)
+    # Replaced by the detected order once the import starts
+    date_order = models.CharField(max_length=4, choices=DATE_ORDER_CHOICES, default='auto')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Progress counters, updated once per imported chunk
+    bytes_total = models.BigIntegerField(default=0)
+    bytes_processed = models.BigIntegerField(default=0)
+    rows_processed = models.IntegerField(default=0)
+    rows_imported = models.IntegerField(default=0)
+    rows_duplicate = models.IntegerField(default=0)
+    rows_failed = models.IntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.file_format} import ({self.status})"
+
+class WeeklySummary(models.Model):
+    """Summary of a closed ISO week, computed once and kept (see api.weekly_summary)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='weekly_summaries')
+    week_start = models.DateField(help_text="Monday of the ISO week")
+    
+    total_income = models.DecimalField(max_digits=12, decimal_places=2)
+    total_expenses = models.DecimalField(max_digits=12, decimal_places=2)
+    transaction_count = models.IntegerField()
+    top_categories = models.JSONField(default=list, help_text="[[category, amount], ...] by amount spent")
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['user', 'week_start']
+        ordering = ['-week_start']
+
+    def __str__(self):
+        return f"{self.user.email} - week of {self.week_start}"
+
 # Signal to create default account for new users
 @receiver(post_save, sender=User)
 def create_default_account(sender, instance, created, **kwargs):
@@ -288,8 +440,56 @@ def create_default_account(sender, instance, created, **kwargs):
             currency="USD"
         )
 
+# Invalidate cached dashboard responses when the user's data changes
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+@receiver(post_save, sender=RecurringTransaction)
+@receiver(post_delete, sender=RecurringTransaction)
+def bump_user_data_version(sender, instance, **kwargs):
+    """Mark the owner's cached responses stale."""
+    from .response_cache import bump_data_version
+    bump_data_version(instance.user_id)
+
+# Keep cached category lookups in sync with the table
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_resolver(sender, instance, **kwargs):
+    """Mark cached category maps stale when a category changes."""
+    from .category_resolver import category_resolver
+    category_resolver.invalidate()
+
+@receiver(post_save, sender=CategoryRule)
+@receiver(post_delete, sender=CategoryRule)
+def invalidate_categorization_rules(sender, instance, **kwargs):
+    """Rebuild the user's categorization engine on the next use."""
+    from .categorization import invalidate_user_rules
+    invalidate_user_rules(instance.user_id)
+
 # Import notification models
 from .notification_models import (
     NotificationPreference, Notification, BudgetAlert, 
-    AIInsight, SavingsGoal
-)
\ No newline at end of file
+    AIInsight, SavingsGoal, SavingsGoalPeriod, OutboundEmail
+)
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def bump_user_notification_stamp(sender, instance, **kwargs):
+    """Move the owner's notification ETags on any notification change."""
+    from .response_cache import bump_change_stamp
+    bump_change_stamp(instance.user_id, 'notifications')
+
+@receiver(post_save, sender=Notification)
+def publish_notification_saved(sender, instance, created, **kwargs):
+    """Push new notifications and unread count changes to connected clients."""
+    from .notification_stream import publish_notification_change
+    publish_notification_change(instance, created)
+
+@receiver(post_delete, sender=Notification)
+def publish_notification_deleted(sender, instance, **kwargs):
+    """Push the new unread count after a notification is deleted."""
+    from .notification_stream import publish_notification_change
+    publish_notification_change(instance, False)
@@ -0,0 +1,133 @@
+"""
+Set-based notification operations.
+Mark-read and archive run as one UPDATE over a queryset instead of a
+save() per notification, and deletes as one DELETE per batch of ids.
+QuerySet.update() and the plain DELETE used here (see _delete_ids) send no
+model signals, so the change stamp bump and unread count push that
+api.models does per saved notification are done once per affected user
+instead (notifications_changed, also used after bulk_create).
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction as db_transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .notification_models import Notification
+from .notification_stream import publish_unread_counts
+from .response_cache import bump_change_stamp
+
+logger = logging.getLogger(__name__)
+
+DELETE_BATCH_SIZE = 1000
+
+
+def _affected_user_ids(queryset):
+    return list(queryset.order_by().values_list('user_id', flat=True).distinct())
+
+
+def notifications_changed(user_ids, unread_changed=True):
+    """Stamp bump and unread count push for changes made without model signals."""
+    for user_id in user_ids:
+        bump_change_stamp(user_id, 'notifications')
+    if unread_changed:
+        publish_unread_counts(user_ids)
+
+
+def mark_read(queryset):
+    """Mark every unread notification in queryset as read; returns the number updated."""
+    unread = queryset.filter(read_at__isnull=True)
+    with db_transaction.atomic():
+        user_ids = _affected_user_ids(unread)
+        now = timezone.now()
+        # update() skips auto_now, so updated_at is set explicitly
+        count = unread.update(read_at=now, status='read', updated_at=now)
+        if count:
+            notifications_changed(user_ids)
+    return count
+
+
+def archive(queryset):
+    """Archive notifications (archiving also marks them read); returns the number archived."""
+    active = queryset.filter(archived_at__isnull=True)
+    with db_transaction.atomic():
+        user_ids = _affected_user_ids(active)
+        now = timezone.now()
+        count = active.update(
+            archived_at=now,
+            read_at=Coalesce('read_at', now),
+            status='read',
+            updated_at=now,
+        )
+        if count:
+            notifications_changed(user_ids)
+    return count
+
+
+def _delete_ids(ids):
+    """Delete the notifications with these ids; returns the number deleted.
+
+    A plain DELETE statement: QuerySet.delete() would load every row to send
+    per-row delete signals, each pushing an unread count. Should a model ever
+    point at Notification, QuerySet.delete() runs instead so its cascades are
+    honoured.
+    """
+    if not ids:
+        return 0
+    if Notification._meta.related_objects:
+        return Notification.objects.filter(id__in=ids).delete()[1].get(Notification._meta.label, 0)
+    connection = connections[router.db_for_write(Notification)]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(Notification._meta.db_table)} "
+            f"WHERE {quote(Notification._meta.pk.column)} IN ({', '.join(['%s'] * len(ids))})",
+            ids,
+        )
+        return cursor.rowcount
+
+
+def delete(queryset, batch_size=DELETE_BATCH_SIZE):
+    """Delete notifications, batch_size ids per DELETE; returns the number deleted."""
+    queryset = queryset.order_by()
+    count = 0
+    with db_transaction.atomic():
+        user_ids = _affected_user_ids(queryset)
+        while True:
+            ids = list(queryset.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            count += _delete_ids(ids)
+        if count:
+            notifications_changed(user_ids)
+    return count
+
+
+def purge_read_notifications(retention_days=None, batch_size=DELETE_BATCH_SIZE):
+    """Delete notifications read more than retention_days ago, batch_size rows per statement.
+
+    Small batches keep each DELETE short so it never holds locks long enough
+    to block users marking or receiving notifications.
+    """
+    if retention_days is None:
+        retention_days = settings.NOTIFICATION_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    purged = 0
+    while True:
+        batch = list(
+            Notification.objects.filter(read_at__lt=cutoff)
+            .order_by()
+            .values_list('id', 'user_id')[:batch_size]
+        )
+        if not batch:
+            break
+        with db_transaction.atomic():
+            purged += _delete_ids([row[0] for row in batch])
+            # Only read notifications go, so unread counts are unchanged
+            notifications_changed({row[1] for row in batch}, unread_changed=False)
+
+    logger.info(f"Purged {purged} notifications read before {cutoff:%Y-%m-%d}")
+    return purged
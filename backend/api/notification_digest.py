@@ -0,0 +1,113 @@
+"""
+Notification digests.
+Jobs that produce several notifications for a user at once (AI insights,
+anomaly scans) add them to a NotificationDigest instead of creating each
+one. Sending the digest writes a single Notification (and at most one
+email); items sent while the user's previous digest is still unread and
+recent are merged into it instead of starting another.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .email_queue import queue_notification_email
+from .notification_models import Notification, NotificationPreference
+
+logger = logging.getLogger(__name__)
+
+DIGEST_MESSAGE_LIMIT = 20
+
+
+def wants_email(user, preference_type):
+    """Whether the user's preference for preference_type includes email delivery."""
+    pref = NotificationPreference.objects.filter(user=user, notification_type=preference_type).first()
+    return bool(pref and pref.delivery_method in ['email', 'both'])
+
+
+class NotificationDigest:
+    """Collects a user's notifications and writes them as one."""
+
+    def __init__(self, user, email_preference=None):
+        self.user = user
+        # NotificationPreference type that decides whether the digest is emailed
+        self.email_preference = email_preference
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, notification_type, title, message, data=None, **related):
+        """Queue a notification; related holds optional budget/transaction objects."""
+        self.items.append({
+            'notification_type': notification_type,
+            'title': title,
+            'message': message,
+            'data': data or {},
+            'related': related,
+        })
+
+    def _open_digest(self):
+        since = timezone.now() - timedelta(minutes=settings.NOTIFICATION_DIGEST_WINDOW_MINUTES)
+        return (
+            Notification.objects.select_for_update()
+            .filter(
+                user=self.user,
+                notification_type='digest',
+                read_at__isnull=True,
+                archived_at__isnull=True,
+                created_at__gte=since,
+            )
+            .order_by('-created_at')
+            .first()
+        )
+
+    @staticmethod
+    def _digest_content(items):
+        title = f"FinMate digest: {len(items)} new updates"
+        lines = [f"• {item['title']}: {item['message']}" for item in items[:DIGEST_MESSAGE_LIMIT]]
+        if len(items) > DIGEST_MESSAGE_LIMIT:
+            lines.append(f"…and {len(items) - DIGEST_MESSAGE_LIMIT} more in your FinMate dashboard.")
+        return title, "\n".join(lines)
+
+    def send(self):
+        """Write the collected items; returns the Notification written or None."""
+        if not self.items:
+            return None
+
+        with db_transaction.atomic():
+            digest = self._open_digest()
+            if digest is None and len(self.items) == 1:
+                item = self.items[0]
+                notification = Notification.objects.create(
+                    user=self.user,
+                    notification_type=item['notification_type'],
+                    title=item['title'],
+                    message=item['message'],
+                    data=item['data'],
+                    **item['related'],
+                )
+                created = True
+            else:
+                items = [
+                    {key: value for key, value in item.items() if key != 'related'}
+                    for item in self.items
+                ]
+                if digest is not None:
+                    items = digest.data.get('items', []) + items
+                    notification = digest
+                else:
+                    notification = Notification(user=self.user, notification_type='digest')
+                notification.title, notification.message = self._digest_content(items)
+                notification.data = {'count': len(items), 'items': items}
+                created = digest is None
+                notification.save()
+
+            # Merged items show up in-app; only a new notification is emailed
+            if created and self.email_preference and wants_email(self.user, self.email_preference):
+                queue_notification_email(notification)
+
+        self.items = []
+        return notification
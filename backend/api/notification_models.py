@@ -1,8 +1,10 @@
 """
 Notification and alert models for budget tracking and AI insights.
 """
-from django.db import models
+from django.db import models, transaction as db_transaction
+from django.db.models import Q
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from decimal import Decimal
 
 User = get_user_model()
@@ -60,6 +62,7 @@ class Notification(models.Model):
         ('anomaly_alert', 'Anomaly Alert'),
         ('goal_achievement', 'Goal Achievement'),
         ('saving_suggestion', 'Saving Suggestion'),
+        ('digest', 'Digest'),
     ]
     
     STATUS_CHOICES = [
@@ -78,6 +81,7 @@ class Notification(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     sent_at = models.DateTimeField(null=True, blank=True)
     read_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(null=True, blank=True)
     
     # Related objects
     budget = models.ForeignKey(
@@ -97,6 +101,17 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Notification tray and list, newest first
+            models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+            # Unread count and mark-read only touch the (small) unread set
+            models.Index(
+                fields=['user', '-created_at'], name='notif_user_unread_idx',
+                condition=Q(read_at__isnull=True),
+            ),
+            # Retention purge of old read notifications
+            models.Index(fields=['read_at'], name='notif_read_at_idx', condition=Q(read_at__isnull=False)),
+        ]
         
     def __str__(self):
         return f"{self.user.email} - {self.title}"
@@ -110,6 +125,53 @@ class Notification(models.Model):
             self.save()
 
 
+class OutboundEmail(models.Model):
+    """Email waiting in the outbound queue (see api.email_queue)."""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True, related_name='outbound_emails'
+    )
+    to_email = models.EmailField()
+    domain = models.CharField(max_length=255, help_text="Recipient domain, used for throttling")
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    attachment = models.FileField(upload_to='email_attachments/%Y/%m/', blank=True)
+    attachment_name = models.CharField(max_length=255, blank=True)
+    attachment_mimetype = models.CharField(max_length=100, blank=True)
+    
+    # Delivery tracking
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Notification marked sent (or failed) on delivery. A plain id, not a
+    # ForeignKey: notifications are deleted in bulk without the collector
+    # (api.notification_bulk), which a reverse relation would rule out.
+    notification_id = models.BigIntegerField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'], name='outbound_email_due_idx',
+                condition=Q(status__in=['pending', 'sending']),
+            ),
+        ]
+        
+    def __str__(self):
+        return f"{self.to_email} - {self.subject}"
+
+
 class BudgetAlert(models.Model):
     """Track budget alerts to prevent spam."""
     
@@ -175,6 +237,15 @@ class AIInsight(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='insight_user_created_idx'),
+            models.Index(fields=['user', 'insight_type', '-created_at'], name='insight_user_type_idx'),
+            # Insights still waiting for the user to act on them
+            models.Index(
+                fields=['user', '-created_at'], name='insight_user_open_idx',
+                condition=Q(is_actionable=True, action_taken=False),
+            ),
+        ]
         
     def __str__(self):
         return f"{self.user.email} - {self.title}"
@@ -220,8 +291,8 @@ class SavingsGoal(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.title}"
     
-    def calculate_progress(self):
-        """Calculate and update progress percentage."""
+    def refresh_progress(self):
+        """Recompute progress percentage and completion without saving."""
         if self.target_amount > 0:
             self.progress_percentage = min(
                 (self.current_amount / self.target_amount) * 100,
@@ -234,10 +305,46 @@ class SavingsGoal(models.Model):
         if self.progress_percentage >= 100 and self.status == 'active':
             self.status = 'completed'
         
+        return self.progress_percentage
+    
+    def calculate_progress(self):
+        """Calculate and update progress percentage."""
+        self.refresh_progress()
         self.save()
         return self.progress_percentage
     
     def add_savings(self, amount):
-        """Add money to the savings goal."""
-        self.current_amount += Decimal(str(amount))
-        return self.calculate_progress()
+        """Add money to the savings goal.
+
+        The row is locked and re-read first, so a concurrent update (another
+        contribution, the savings job) is added to rather than overwritten.
+        """
+        with db_transaction.atomic():
+            current = SavingsGoal.objects.select_for_update().values_list(
+                'current_amount', flat=True
+            ).get(pk=self.pk)
+            self.current_amount = current + Decimal(str(amount))
+            return self.calculate_progress()
+
+
+class SavingsGoalPeriod(models.Model):
+    """Savings credited to a goal for one month (see api.savings_goals)."""
+    
+    goal = models.ForeignKey(SavingsGoal, on_delete=models.CASCADE, related_name='periods')
+    period = models.DateField(help_text="First day of the month")
+    
+    baseline_spending = models.DecimalField(
+        max_digits=12, decimal_places=2,
+        help_text="Average monthly spending in the goal's categories over the 3 months before"
+    )
+    spent_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    saved_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['goal', 'period']
+        ordering = ['-period']
+        
+    def __str__(self):
+        return f"{self.goal.title} - {self.period.strftime('%B %Y')}"
@@ -0,0 +1,249 @@
+"""
+Server-Sent Events stream of a user's notifications.
+Notification saves publish to a per-user channel (see the signals in
+api.models); connected clients receive new notifications and unread count
+changes as they happen, and idle connections cost no queries, only a
+keep-alive comment every few seconds.
+
+The default broker is in-process, which only reaches clients connected to
+the process that saved the notification. Set NOTIFICATION_STREAM_REDIS_URL
+to publish through Redis so notifications created by Celery workers reach
+every web process.
+
+The stream view is async and needs an ASGI server, e.g.
+    uvicorn finmate_backend.asgi:application
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.http import JsonResponse, StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_NAME = 'notifications:{user_id}'
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class InProcessSubscription:
+    """A client's queue on the in-process broker."""
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, message):
+        # Runs on the subscriber's event loop; slow clients drop their oldest event
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Fan-out to subscribers connected to this process."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    async def subscribe(self, user_id):
+        subscription = InProcessSubscription(self, user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def has_subscribers(self, user_id):
+        return bool(self._subscriptions.get(user_id))
+
+    def publish(self, user_id, message):
+        # Called from sync code in any thread
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.put, message)
+
+
+class RedisSubscription:
+    """A client's Redis pub/sub subscription."""
+
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def get(self, timeout):
+        message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message['data'])
+
+    async def close(self):
+        await self.pubsub.unsubscribe()
+        close = getattr(self.pubsub, 'aclose', None) or self.pubsub.close
+        await close()
+
+
+class RedisBroker:
+    """Publishes through Redis channels so every process sees every event."""
+
+    def __init__(self, url):
+        import redis
+        import redis.asyncio
+
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+        self.async_client = redis.asyncio.Redis.from_url(url)
+
+    async def subscribe(self, user_id):
+        pubsub = self.async_client.pubsub()
+        await pubsub.subscribe(CHANNEL_NAME.format(user_id=user_id))
+        return RedisSubscription(pubsub)
+
+    def has_subscribers(self, user_id):
+        channel = CHANNEL_NAME.format(user_id=user_id)
+        return any(count for _, count in self.client.pubsub_numsub(channel))
+
+    def publish(self, user_id, message):
+        self.client.publish(CHANNEL_NAME.format(user_id=user_id), json.dumps(message))
+
+
+def _create_broker():
+    url = getattr(settings, 'NOTIFICATION_STREAM_REDIS_URL', '')
+    if url:
+        return RedisBroker(url)
+    return InProcessBroker()
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = _create_broker()
+    return _broker
+
+
+def _unread_count(user_id):
+    from .notification_models import Notification
+    return Notification.objects.filter(user_id=user_id, read_at__isnull=True).count()
+
+
+def publish_notification_change(notification, created):
+    """Push a notification (when created) and the new unread count to the user's clients."""
+    def publish():
+        try:
+            broker = get_broker()
+            if not broker.has_subscribers(notification.user_id):
+                return
+            message = {'event': 'unread_count', 'unread_count': _unread_count(notification.user_id)}
+            if created:
+                from .serializers import NotificationSerializer
+                message['event'] = 'notification'
+                message['notification'] = json.loads(
+                    json.dumps(NotificationSerializer(notification).data, default=str)
+                )
+            broker.publish(notification.user_id, message)
+        except Exception as e:
+            logger.error(f"Error publishing notification {notification.id}: {e}")
+
+    db_transaction.on_commit(publish)
+
+
+def publish_unread_counts(user_ids):
+    """Push the current unread count to each user's clients, for set-based changes that send no signals."""
+    user_ids = set(user_ids)
+
+    def publish():
+        broker = get_broker()
+        for user_id in user_ids:
+            try:
+                if broker.has_subscribers(user_id):
+                    broker.publish(user_id, {'event': 'unread_count', 'unread_count': _unread_count(user_id)})
+            except Exception as e:
+                logger.error(f"Error publishing unread count for user {user_id}: {e}")
+
+    if user_ids:
+        db_transaction.on_commit(publish)
+
+
+def _authenticate(request):
+    """Resolve the user from a Bearer header or ?token= (EventSource can't set headers)."""
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+    authentication = JWTAuthentication()
+    raw_token = request.GET.get('token')
+    if not raw_token:
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else None
+    if not raw_token:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+def _format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _event_stream(user_id, initial_unread):
+    broker = get_broker()
+    subscription = await broker.subscribe(user_id)
+    heartbeat = settings.NOTIFICATION_STREAM_HEARTBEAT_SECONDS
+    try:
+        yield f"retry: {settings.NOTIFICATION_STREAM_RETRY_MS}\n\n"
+        yield _format_event('unread_count', {'unread_count': initial_unread})
+        while True:
+            message = await subscription.get(heartbeat)
+            if message is None:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            yield _format_event(message.pop('event'), message)
+    finally:
+        await subscription.close()
+
+
+async def notification_stream(request):
+    """GET /api/notifications/stream/ - text/event-stream of notification events."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    user = await sync_to_async(_authenticate)(request)
+    if user is None or not user.is_active:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    initial_unread = await sync_to_async(_unread_count)(user.id)
+    response = StreamingHttpResponse(
+        _event_stream(user.id, initial_unread), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Disable buffering in nginx so events are flushed immediately
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,161 @@
+"""
+Pagination classes for API list endpoints.
+Transactions support keyset (cursor) pagination on
+(transaction_date, created_at, id): each page is an index range scan from
+the previous page's last row, with no COUNT(*) and no OFFSET.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Keyset pagination over a fixed (date, timestamp, id) ordering.
+
+    Cursors are opaque url-safe tokens encoding the last row of the page.
+    Descending order is used unless the ordering parameter asks for the
+    ascending date; other orderings are rejected with a 400.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 20
+    max_page_size = 200
+    keyset_fields = ('transaction_date', 'created_at', 'id')
+    invalid_cursor_message = 'Invalid cursor'
+    invalid_ordering_message = 'Cursor pagination only supports ordering by transaction_date or -transaction_date'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        ordering = request.query_params.get('ordering')
+        if ordering not in (None, '', self.keyset_fields[0], '-' + self.keyset_fields[0]):
+            raise ValidationError({'ordering': self.invalid_ordering_message})
+        self.reverse = ordering != self.keyset_fields[0]
+
+        position = self.decode_cursor(request)
+        prefix = '-' if self.reverse else ''
+        queryset = queryset.order_by(*[prefix + field for field in self.keyset_fields])
+        if position is not None:
+            queryset = queryset.filter(self.position_filter(position))
+
+        # One extra row tells us whether there is a next page
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def position_filter(self, position):
+        """Rows strictly after position in the current ordering.
+
+        Expands the row comparison (a, b, c) < (x, y, z) into ORed terms and
+        repeats the leading bound on its own so the planner can turn it into
+        a range on the (user, transaction_date) index.
+        """
+        lookup = 'lt' if self.reverse else 'gt'
+        date_field = self.keyset_fields[0]
+        condition = Q()
+        for index, field in enumerate(self.keyset_fields):
+            term = Q(**{f'{field}__{lookup}': position[index]})
+            for previous_field, value in zip(self.keyset_fields[:index], position):
+                term &= Q(**{previous_field: value})
+            condition |= term
+        return Q(**{f'{date_field}__{lookup}e': position[0]}) & condition
+
+    def encode_cursor(self, instance):
+        # Pages may hold model instances or .values() rows
+        if isinstance(instance, dict):
+            position = [instance[field] for field in self.keyset_fields]
+        else:
+            position = [getattr(instance, field) for field in self.keyset_fields]
+        payload = json.dumps([
+            value.isoformat() if isinstance(value, (date, datetime)) else value
+            for value in position
+        ], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            raw_date, raw_created_at, raw_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return (
+                date.fromisoformat(raw_date),
+                datetime.fromisoformat(raw_created_at),
+                int(raw_id),
+            )
+        except (TypeError, ValueError, binascii.Error, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class TransactionPagination(PageNumberPagination):
+    """Page-number pagination, switching to keyset pagination on request.
+
+    Clients opt in with ?pagination=cursor (first page) and then follow the
+    returned next links, which carry the cursor parameter.
+    """
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.keyset = KeysetPagination()
+        self.use_keyset = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_keyset = (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.keyset.cursor_query_param in request.query_params
+        )
+        if self.use_keyset:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.use_keyset:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_next_link(self):
+        if self.use_keyset:
+            return self.keyset.get_next_link()
+        return super().get_next_link()
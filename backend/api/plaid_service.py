@@ -3,14 +3,25 @@ Plaid API Integration Service - Simplified Version
 Handles bank account connection and transaction syncing
 """
 import os
+import hashlib
+import hmac
 import json
 import logging
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
+import urllib.request
 from django.conf import settings
+from django.core.cache import cache
+import jwt
 
 logger = logging.getLogger(__name__)
 
+# Plaid-Verification JWTs older than this are replays
+WEBHOOK_MAX_AGE_SECONDS = 5 * 60
+WEBHOOK_KEY_CACHE_KEY = 'plaid_webhook_key:{key_id}'
+WEBHOOK_KEY_CACHE_SECONDS = 24 * 60 * 60
+
 class PlaidService:
     def __init__(self):
         """Initialize Plaid client"""
@@ -163,6 +174,79 @@ class PlaidService:
             logger.error(f"Error getting item status: {e}")
             raise
     
+    def get_webhook_verification_key(self, key_id: str) -> Optional[Dict]:
+        """Public JWK that signed a webhook, from /webhook_verification_key/get
+        
+        Keys are cached for WEBHOOK_KEY_CACHE_SECONDS; expired keys are not
+        returned. Without PLAID_CLIENT_ID and PLAID_SECRET no key can be
+        fetched and JWT verification fails closed.
+        """
+        if not key_id or not (self.client_id and self.secret):
+            return None
+        cache_key = WEBHOOK_KEY_CACHE_KEY.format(key_id=key_id)
+        key = cache.get(cache_key)
+        if key is None:
+            try:
+                request = urllib.request.Request(
+                    f'{self.base_url}/webhook_verification_key/get',
+                    data=json.dumps({
+                        'client_id': self.client_id,
+                        'secret': self.secret,
+                        'key_id': key_id,
+                    }).encode(),
+                    headers={'Content-Type': 'application/json'},
+                    method='POST',
+                )
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    key = json.loads(response.read().decode())['key']
+            except Exception as e:
+                logger.error(f"Error fetching webhook verification key {key_id}: {e}")
+                return None
+            cache.set(cache_key, key, WEBHOOK_KEY_CACHE_SECONDS)
+        if key.get('expired_at'):
+            return None
+        return key
+    
+    def verify_webhook(self, body: bytes, headers: Dict, secret: Optional[str] = None) -> bool:
+        """Verify a webhook by its Plaid-Verification JWT, or else by the shared secret
+        
+        The JWT must be ES256-signed by a Plaid key, at most
+        WEBHOOK_MAX_AGE_SECONDS old, and carry the SHA-256 of the body. The
+        shared secret (settings.PLAID_WEBHOOK_SECRET, passed as ?secret= in
+        the webhook URL) is accepted when set. Anything else is rejected.
+        """
+        token = headers.get('Plaid-Verification')
+        if token and self._verify_jwt(token, body):
+            return True
+        
+        expected = getattr(settings, 'PLAID_WEBHOOK_SECRET', '')
+        if expected and secret:
+            return hmac.compare_digest(secret.encode(), expected.encode())
+        return False
+    
+    def _verify_jwt(self, token: str, body: bytes) -> bool:
+        try:
+            header = jwt.get_unverified_header(token)
+            if header.get('alg') != 'ES256':
+                return False
+            key = self.get_webhook_verification_key(header.get('kid'))
+            if not key:
+                return False
+            claims = jwt.decode(
+                token,
+                jwt.algorithms.ECAlgorithm.from_jwk(json.dumps(key)),
+                algorithms=['ES256'],
+            )
+            if time.time() - claims.get('iat', 0) > WEBHOOK_MAX_AGE_SECONDS:
+                return False
+            return hmac.compare_digest(
+                claims.get('request_body_sha256', ''),
+                hashlib.sha256(body).hexdigest()
+            )
+        except Exception as e:
+            logger.warning(f"Rejected Plaid webhook JWT: {e}")
+            return False
+    
     def remove_item(self, access_token: str) -> bool:
         """Remove/unlink an item"""
         try:
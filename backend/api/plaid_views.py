@@ -3,20 +3,30 @@ Plaid Integration Views
 Handles bank account connection and transaction syncing
 """
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
 from django.utils import timezone
 from datetime import datetime, timedelta
 import json
 import logging
 
 from .plaid_service import plaid_service
+from .category_resolver import category_resolver
+from .categorization import categorize_transactions
+from .ledger import BalanceDeltas
+from .recurring_detection import schedule_detection
 from .models import Account, PlaidItem, Transaction, Category
 from .serializers import AccountSerializer, TransactionSerializer
 
 logger = logging.getLogger(__name__)
 
+# Webhooks for the same item inside this window collapse into one sync
+WEBHOOK_DEBOUNCE_SECONDS = getattr(settings, 'PLAID_WEBHOOK_DEBOUNCE_SECONDS', 30)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_link_token(request):
@@ -139,6 +149,8 @@ def sync_transactions(request):
                 status=status.HTTP_404_NOT_FOUND
             )
         
+        category_resolver.warm()
+        started_at = timezone.now()
         synced_transactions = []
         sync_summary = {
             'accounts_synced': 0,
@@ -156,31 +168,9 @@ def sync_transactions(request):
                         account.plaid_access_token,
                         account.sync_cursor
                     )
-                    
-                    # Process added transactions
-                    for transaction_data in sync_result['added']:
-                        if transaction_data['account_id'] == account.plaid_account_id:
-                            transaction = _create_or_update_transaction(
-                                transaction_data, account, request.user
-                            )
-                            if transaction:
-                                synced_transactions.append(transaction)
-                                sync_summary['transactions_added'] += 1
-                    
-                    # Process modified transactions
-                    for transaction_data in sync_result['modified']:
-                        if transaction_data['account_id'] == account.plaid_account_id:
-                            transaction = _create_or_update_transaction(
-                                transaction_data, account, request.user
-                            )
-                            if transaction:
-                                sync_summary['transactions_updated'] += 1
-                    
-                    # Process removed transactions
-                    for removed_id in sync_result['removed']:
-                        Transaction.objects.filter(
-                            plaid_transaction_id=removed_id
-                        ).delete()
+                    synced_transactions.extend(
+                        _apply_sync_result(sync_result, account, request.user, sync_summary, started_at)
+                    )
                     
                     # Update cursor
                     account.sync_cursor = sync_result['next_cursor']
@@ -197,13 +187,17 @@ def sync_transactions(request):
                         [account.plaid_account_id]
                     )
                     
+                    account_transactions = []
                     for transaction_data in transactions:
                         transaction = _create_or_update_transaction(
                             transaction_data, account, request.user
                         )
                         if transaction:
-                            synced_transactions.append(transaction)
+                            account_transactions.append(transaction)
                             sync_summary['transactions_added'] += 1
+                    
+                    _categorize_transactions(account_transactions, request.user)
+                    synced_transactions.extend(account_transactions)
                 
                 # Update last sync time
                 account.last_sync = timezone.now()
@@ -231,6 +225,55 @@ def sync_transactions(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def plaid_webhook(request):
+    """Receive Plaid webhooks and trigger targeted item syncs"""
+    if not plaid_service.verify_webhook(request.body, request.headers, request.query_params.get('secret')):
+        return Response(
+            {'error': 'Invalid webhook signature'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    
+    webhook_type = request.data.get('webhook_type')
+    webhook_code = request.data.get('webhook_code')
+    item_id = request.data.get('item_id')
+    
+    plaid_item = PlaidItem.objects.filter(plaid_item_id=item_id).first()
+    if not plaid_item:
+        # Acknowledge so Plaid does not keep retrying for unknown items
+        logger.warning(f"Plaid webhook {webhook_type}/{webhook_code} for unknown item {item_id}")
+        return Response({'status': 'ignored'}, status=status.HTTP_200_OK)
+    
+    PlaidItem.objects.filter(id=plaid_item.id).update(last_webhook=timezone.now())
+    action = 'none'
+    
+    if webhook_type == 'TRANSACTIONS':
+        if webhook_code == 'TRANSACTIONS_REMOVED':
+            removed_ids = request.data.get('removed_transactions') or []
+            removed = remove_plaid_transactions(plaid_item.user, removed_ids)
+            action = f'removed {removed}'
+        elif webhook_code in ('SYNC_UPDATES_AVAILABLE', 'DEFAULT_UPDATE',
+                              'INITIAL_UPDATE', 'HISTORICAL_UPDATE'):
+            action = 'sync queued' if _queue_item_sync(item_id) else 'sync already queued'
+    
+    elif webhook_type == 'ITEM':
+        if webhook_code == 'ERROR':
+            error = request.data.get('error') or {}
+            plaid_item.error_type = error.get('error_type')
+            plaid_item.error_code = error.get('error_code')
+            plaid_item.save(update_fields=['error_type', 'error_code', 'updated_at'])
+            action = 'error recorded'
+        elif webhook_code == 'LOGIN_REPAIRED':
+            plaid_item.error_type = None
+            plaid_item.error_code = None
+            plaid_item.save(update_fields=['error_type', 'error_code', 'updated_at'])
+            action = 'sync queued' if _queue_item_sync(item_id) else 'sync already queued'
+    
+    logger.info(f"Plaid webhook {webhook_type}/{webhook_code} for item {item_id}: {action}")
+    return Response({'status': 'received', 'action': action}, status=status.HTTP_200_OK)
+
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def disconnect_account(request, account_id):
@@ -294,6 +337,88 @@ def _map_plaid_account_type(plaid_type):
     }
     return mapping.get(plaid_type, 'checking')
 
+def _webhook_debounce_key(plaid_item_id):
+    return f'plaid_webhook_sync:{plaid_item_id}'
+
+def _queue_item_sync(plaid_item_id):
+    """Queue a delayed item sync unless one is already pending"""
+    from .tasks import sync_plaid_item
+    
+    if not cache.add(_webhook_debounce_key(plaid_item_id), True, WEBHOOK_DEBOUNCE_SECONDS * 2):
+        return False
+    sync_plaid_item.apply_async(args=[plaid_item_id], countdown=WEBHOOK_DEBOUNCE_SECONDS)
+    return True
+
+def clear_webhook_debounce(plaid_item_id):
+    """Allow the next webhook for this item to queue a new sync"""
+    cache.delete(_webhook_debounce_key(plaid_item_id))
+
+def sync_account_with_cursor(account, summary, started_at):
+    """Pull every pending cursor page for one account into the database; started_at is when the sync began"""
+    category_resolver.warm()
+    has_more = True
+    while has_more:
+        sync_result = plaid_service.sync_transactions(
+            account.plaid_access_token,
+            account.sync_cursor
+        )
+        _apply_sync_result(sync_result, account, account.user, summary, started_at)
+        account.sync_cursor = sync_result['next_cursor']
+        has_more = sync_result.get('has_more', False)
+
+def _apply_sync_result(sync_result, account, user, summary, started_at):
+    """Apply one /transactions/sync page to an account; returns added transactions"""
+    added_transactions = []
+    
+    # Process added transactions
+    for transaction_data in sync_result['added']:
+        if transaction_data['account_id'] == account.plaid_account_id:
+            transaction = _create_or_update_transaction(transaction_data, account, user)
+            if transaction:
+                added_transactions.append(transaction)
+                summary['transactions_added'] += 1
+    
+    # Process modified transactions
+    for transaction_data in sync_result['modified']:
+        if transaction_data['account_id'] == account.plaid_account_id:
+            transaction = _create_or_update_transaction(transaction_data, account, user)
+            if transaction:
+                summary['transactions_updated'] += 1
+    
+    _categorize_transactions(added_transactions, user)
+    if added_transactions:
+        schedule_detection(user.id, started_at)
+    
+    # Process removed transactions
+    removed_ids = [
+        removed['transaction_id'] if isinstance(removed, dict) else removed
+        for removed in sync_result['removed']
+    ]
+    if removed_ids:
+        remove_plaid_transactions(user, removed_ids)
+    
+    return added_transactions
+
+def remove_plaid_transactions(user, plaid_transaction_ids):
+    """Delete the user's transactions Plaid removed, reversing their balance effect"""
+    with db_transaction.atomic():
+        transactions = Transaction.objects.select_for_update().filter(
+            user=user,
+            plaid_transaction_id__in=plaid_transaction_ids
+        )
+        deltas = BalanceDeltas()
+        for row in transactions.values('account_id', 'transaction_type', 'amount'):
+            deltas.remove(row['account_id'], row['transaction_type'], row['amount'])
+        removed, _ = transactions.delete()
+        deltas.apply()
+    return removed
+
+def _categorize_transactions(transactions, user):
+    """Categorize still-uncategorized transactions of a sync page in one batch"""
+    changed = categorize_transactions(transactions, user.id)
+    if changed:
+        Transaction.objects.bulk_update(changed, ['category', 'categorization_confidence'])
+
 def _create_or_update_transaction(transaction_data, account, user):
     """Create or update a transaction from Plaid data"""
     try:
@@ -321,11 +446,15 @@ def _create_or_update_transaction(transaction_data, account, user):
             transaction.location = _format_location(transaction_data.get('location', {}))
             transaction.save()
         
-        # Auto-categorize if no category is set
-        if not transaction.category and transaction_data.get('category'):
-            category = _get_or_create_category(transaction_data['category'])
-            if category:
-                transaction.category = category
+        # Auto-categorize from Plaid's category if none is set; rows without
+        # one are categorized per page in _categorize_transactions
+        if not transaction.category_id and transaction_data.get('category'):
+            category_id = category_resolver.resolve_plaid(
+                transaction_data['category'],
+                category_type=transaction.transaction_type
+            )
+            if category_id:
+                transaction.category_id = category_id
                 transaction.save()
         
         return transaction
@@ -348,25 +477,3 @@ def _format_location(location_data):
         parts.append(location_data['country'])
     
     return ', '.join(parts)
-
-def _get_or_create_category(plaid_categories):
-    """Get or create category from Plaid category list"""
-    if not plaid_categories:
-        return None
-    
-    # Use the most specific category (last in the list)
-    category_name = plaid_categories[-1] if isinstance(plaid_categories, list) else plaid_categories
-    
-    try:
-        category, created = Category.objects.get_or_create(
-            name=category_name,
-            defaults={
-                'category_type': 'expense',
-                'description': f'Auto-created from Plaid: {category_name}',
-                'is_default': False,
-            }
-        )
-        return category
-    except Exception as e:
-        logger.error(f"Error creating category {category_name}: {e}")
-        return None
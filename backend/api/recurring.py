@@ -0,0 +1,253 @@
+"""
+Materializes recurring transaction templates into transactions.
+Due templates (is_active and next_due_date <= today, a partial index scan)
+are processed in chunks. For each chunk the missed occurrences up to today
+are generated with NumPy date arithmetic, one frequency group at a time,
+then written with bulk_create. A chunk holds at most MAX_ROWS_PER_CHUNK
+new rows: templates with more missed occurrences than their share are
+advanced part of the way and finish in later chunks. Account balances get one UPDATE for the
+chunk and next_due_date is advanced with one UPDATE per distinct new
+date, all in a single transaction, so a template is never materialized twice.
+
+Templates with creates_transactions off (payments that arrive through bank
+sync or import) are only advanced, so their next_due_date stays current
+for the cash-flow forecast without recording the payment twice.
+
+Monthly, quarterly and yearly templates keep the day of month of their
+start date: a template starting on the 31st falls on the last day of
+shorter months and returns to the 31st after.
+"""
+import calendar
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .ledger import BalanceDeltas
+from .models import RecurringTransaction, Transaction
+from .response_cache import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+# Bounds one chunk's unsaved Transaction objects, shared out between its templates
+MAX_ROWS_PER_CHUNK = 20000
+# Default bound per template for expand_occurrences (the forecast's longest horizon fits)
+MAX_OCCURRENCES = 400
+
+FREQUENCY_DAYS = {'daily': 1, 'weekly': 7}
+FREQUENCY_MONTHS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+FREQUENCIES = list(FREQUENCY_DAYS) + list(FREQUENCY_MONTHS)
+
+
+def _group_offsets(counts):
+    """[0..counts[0]-1, 0..counts[1]-1, ...] as one array."""
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.arange(counts.sum()) - starts
+
+
+def _month_dates(months, anchor_days):
+    """Day anchor_days of each month (datetime64[M]), clamped to the month's last day."""
+    month_starts = months.astype('datetime64[D]')
+    days_in_month = ((months + 1).astype('datetime64[D]') - month_starts).astype(np.int64)
+    return month_starts + (np.minimum(anchor_days, days_in_month) - 1)
+
+
+def day_occurrences(next_due, limit, step, max_occurrences=MAX_OCCURRENCES):
+    """Occurrences every `step` days from next_due through limit, at most
+    max_occurrences per template.
+
+    Returns (counts per template, all occurrence dates, next due date per template).
+    """
+    counts = np.where(limit >= next_due, (limit - next_due).astype(np.int64) // step + 1, 0)
+    counts = np.minimum(counts, max_occurrences)
+    dates = np.repeat(next_due, counts) + _group_offsets(counts) * step
+    return counts, dates, next_due + counts * step
+
+
+def month_occurrences(next_due, limit, anchor_days, step, max_occurrences=MAX_OCCURRENCES):
+    """Occurrences every `step` months on anchor_days, from next_due through limit.
+
+    anchor_days must put the first occurrence on next_due itself.
+    """
+    first_months = next_due.astype('datetime64[M]')
+    month_diff = (limit.astype('datetime64[M]') - first_months).astype(np.int64)
+    counts = np.where(limit >= next_due, month_diff // step + 1, 0)
+    # The last candidate month may put the occurrence after limit
+    last = _month_dates(first_months + np.maximum(counts - 1, 0) * step, anchor_days)
+    counts = np.where((counts > 0) & (last > limit), counts - 1, counts)
+    counts = np.minimum(counts, max_occurrences)
+
+    offsets = _group_offsets(counts)
+    dates = _month_dates(np.repeat(first_months, counts) + offsets * step, np.repeat(anchor_days, counts))
+    following = _month_dates(first_months + counts * step, anchor_days)
+    return counts, dates, following
+
+
+def following_occurrence(day, frequency, anchor_day=None):
+    """Occurrence one period after day; month-based ones fall on anchor_day (default day.day)."""
+    if frequency in FREQUENCY_DAYS:
+        return day + timedelta(days=FREQUENCY_DAYS[frequency])
+    year, month = divmod(day.year * 12 + day.month - 1 + FREQUENCY_MONTHS[frequency], 12)
+    month += 1
+    return date(year, month, min(anchor_day or day.day, calendar.monthrange(year, month)[1]))
+
+
+def _anchor_day(template):
+    """Day of month to repeat on; the start date's day unless next_due_date was moved."""
+    start_day = template['start_date'].day
+    next_due = template['next_due_date']
+    days_in_month = calendar.monthrange(next_due.year, next_due.month)[1]
+    if next_due.day == min(start_day, days_in_month):
+        return start_day
+    return next_due.day
+
+
+def expand_occurrences(templates, until, max_occurrences=MAX_OCCURRENCES):
+    """{template id: (occurrence dates, following due date)} of template rows, from
+    their next_due_date through until (or their end date), at most
+    max_occurrences each; the following due date picks up after the last one.
+
+    Rows need id, frequency, start_date, end_date and next_due_date.
+    """
+    results = {}
+    by_frequency = {}
+    for template in templates:
+        by_frequency.setdefault(template['frequency'], []).append(template)
+
+    for frequency, group in by_frequency.items():
+        next_due = np.array([template['next_due_date'] for template in group], dtype='datetime64[D]')
+        limit = np.array(
+            [min(until, template['end_date']) if template['end_date'] else until for template in group],
+            dtype='datetime64[D]',
+        )
+        if frequency in FREQUENCY_DAYS:
+            counts, dates, following = day_occurrences(next_due, limit, FREQUENCY_DAYS[frequency], max_occurrences)
+        elif frequency in FREQUENCY_MONTHS:
+            anchor_days = np.array([_anchor_day(template) for template in group], dtype=np.int64)
+            counts, dates, following = month_occurrences(
+                next_due, limit, anchor_days, FREQUENCY_MONTHS[frequency], max_occurrences
+            )
+        else:
+            logger.warning(f"Skipping {len(group)} recurring templates with unknown frequency {frequency}")
+            continue
+
+        dates = dates.astype(object)
+        following = following.astype(object)
+        position = 0
+        for template, count, next_date in zip(group, counts.tolist(), following):
+            results[template['id']] = (dates[position:position + count], next_date)
+            position += count
+    return results
+
+
+def _materialize_chunk(today, chunk_size):
+    """Materialize one chunk of due templates; returns (templates, transactions) processed."""
+    with db_transaction.atomic():
+        templates = list(
+            # Unknown frequencies would never advance and be picked up forever
+            RecurringTransaction.objects.filter(is_active=True, next_due_date__lte=today, frequency__in=FREQUENCIES)
+            .select_for_update(skip_locked=True)
+            .order_by('next_due_date')
+            .values(
+                'id', 'user_id', 'account_id', 'category_id', 'amount', 'transaction_type',
+                'description', 'frequency', 'start_date', 'end_date', 'next_due_date', 'creates_transactions',
+            )[:chunk_size]
+        )
+        if not templates:
+            return 0, 0
+
+        occurrences = expand_occurrences(templates, today, max(1, MAX_ROWS_PER_CHUNK // len(templates)))
+        transactions = []
+        # Templates in a chunk share few next due dates: one UPDATE per distinct value
+        advanced = defaultdict(list)
+        deltas = BalanceDeltas()
+        for template in templates:
+            if template['id'] not in occurrences:
+                continue
+            dates, next_due_date = occurrences[template['id']]
+            # Past its end date: nothing left to generate
+            is_active = not (template['end_date'] and next_due_date > template['end_date'])
+            advanced[(next_due_date, is_active)].append(template['id'])
+            if not template['creates_transactions']:
+                continue
+
+            for transaction_date in dates:
+                transactions.append(Transaction(
+                    user_id=template['user_id'],
+                    account_id=template['account_id'],
+                    category_id=template['category_id'],
+                    amount=template['amount'],
+                    transaction_type=template['transaction_type'],
+                    description=template['description'],
+                    transaction_date=transaction_date,
+                    is_recurring=True,
+                ))
+            deltas.add(template['account_id'], template['transaction_type'], template['amount'] * len(dates))
+
+        Transaction.objects.bulk_create(transactions, batch_size=1000)
+        deltas.apply()
+        now = timezone.now()
+        for (next_due_date, is_active), template_ids in advanced.items():
+            RecurringTransaction.objects.filter(id__in=template_ids).update(
+                next_due_date=next_due_date, is_active=is_active, updated_at=now
+            )
+        for user_id in {template['user_id'] for template in templates}:
+            bump_data_version(user_id)
+    return len(templates), len(transactions)
+
+
+def skip_missed_occurrences(templates, today):
+    """Move next_due_date of the active templates in the queryset to their first
+    occurrence on or after today without creating the ones before; returns
+    the number of templates moved.
+
+    For templates that predate materialization (see migration 0028): their
+    stale next_due_date would otherwise back-fill years of transactions.
+    Works with a migration's historical model.
+    """
+    due = templates.filter(is_active=True, next_due_date__lt=today, frequency__in=FREQUENCIES).order_by('id')
+    moved = set()
+    while True:
+        # Templates far behind take several rounds of MAX_OCCURRENCES
+        rows = list(due.values('id', 'frequency', 'start_date', 'end_date', 'next_due_date')[:CHUNK_SIZE])
+        if not rows:
+            break
+        occurrences = expand_occurrences(rows, today - timedelta(days=1))
+        advanced = defaultdict(list)
+        for row in rows:
+            next_due_date = occurrences[row['id']][1]
+            is_active = not (row['end_date'] and next_due_date > row['end_date'])
+            advanced[(next_due_date, is_active)].append(row['id'])
+            moved.add(row['id'])
+        with db_transaction.atomic():
+            now = timezone.now()
+            for (next_due_date, is_active), template_ids in advanced.items():
+                templates.filter(id__in=template_ids).update(
+                    next_due_date=next_due_date, is_active=is_active, updated_at=now
+                )
+    return len(moved)
+
+
+def materialize_recurring_transactions(today=None, chunk_size=CHUNK_SIZE):
+    """Create every due occurrence of active recurring templates up to today."""
+    today = today or timezone.now().date()
+    skipped = RecurringTransaction.objects.filter(is_active=True, next_due_date__lte=today).exclude(
+        frequency__in=FREQUENCIES
+    ).count()
+    if skipped:
+        logger.warning(f"Skipping {skipped} due recurring templates with an unknown frequency")
+
+    template_count = transaction_count = 0
+    while True:
+        templates, transactions = _materialize_chunk(today, chunk_size)
+        if not templates:
+            break
+        template_count += templates
+        transaction_count += transactions
+
+    logger.info(f"Materialized {transaction_count} transactions from {template_count} recurring templates")
+    return transaction_count
@@ -0,0 +1,294 @@
+"""
+Recurring payment detection.
+A user's transactions from the last LOOKBACK_DAYS are loaded into one
+DataFrame (at most MAX_ROWS_PER_USER rows, so memory is bounded per user)
+and grouped into series by transaction type, normalized merchant and amount
+bucket: amounts of one merchant sorted ascending start a new bucket when
+they jump by more than AMOUNT_TOLERANCE, so price changes of a few percent
+stay in the same series (up to MAX_AMOUNT_SPREAD between its extremes).
+
+Per series the gaps between payment dates give the median gap and its
+dispersion (median absolute deviation / median gap, plus a bound on the
+largest deviation so a few coincidental dates don't pass), computed with grouped
+pandas operations for all series at once. Regular series whose median gap
+matches a template frequency are flagged is_recurring with one UPDATE, and
+the ones still running become RecurringSuggestion rows unless the user
+already has a matching template or dismissed the suggestion.
+
+The weekly batch job covers every user; after a sync or import
+schedule_detection runs the detector for that user, evaluating only the
+series that gained rows since the sync or import started. Syncs landing
+before the run share it, from the earliest start.
+"""
+import logging
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .models import RecurringSuggestion, RecurringTransaction, Transaction, User
+from .recurring import following_occurrence
+from .response_cache import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+LOOKBACK_DAYS = 400
+MAX_ROWS_PER_USER = 20000
+AMOUNT_TOLERANCE = 0.15
+MAX_AMOUNT_SPREAD = 0.3
+MAX_DISPERSION = 0.15
+# No single gap may be further than this share of the median gap from it
+MAX_GAP_DEVIATION = 0.5
+MIN_OCCURRENCES = 3
+MIN_YEARLY_OCCURRENCES = 2
+# A series is still running if its last payment is at most this many median gaps old
+ACTIVE_GAPS = 1.5
+MERCHANT_KEY_WORDS = 3
+UPDATE_BATCH_SIZE = 500
+
+# (frequency, min median gap, max median gap) in days
+FREQUENCY_GAPS = [
+    ('weekly', 6, 8),
+    ('monthly', 27, 33),
+    ('quarterly', 85, 97),
+    ('yearly', 355, 375),
+]
+
+# Card, processor and corporate noise in bank descriptions
+MERCHANT_NOISE = (
+    r'\b(?:[a-z]|x+|pos|ach|debit|credit|card|purchase|payment|pmt|recurring|autopay|'
+    r'online|www|com|net|inc|llc|ltd|co)\b'
+)
+
+DETECTION_DELAY = 5 * 60  # seconds; syncs landing meanwhile share one run
+# Holds the earliest start of the syncs waiting for the scheduled run
+DETECTION_SINCE_KEY = 'recurring_detection:since:{user_id}'
+
+TRANSACTION_FIELDS = [
+    'id', 'account_id', 'category_id', 'transaction_type', 'description',
+    'merchant_name', 'amount', 'transaction_date', 'is_recurring',
+]
+
+
+def normalize_merchants(merchant_names, descriptions):
+    """Merchant keys ("NETFLIX.COM 8845-XX" -> "netflix") for aligned Series."""
+    text = merchant_names.fillna('').str.strip()
+    text = text.where(text != '', descriptions.fillna(''))
+    text = (
+        text.str.lower()
+        .str.replace('&', ' and ', regex=False)
+        .str.replace(r'[^a-z]+', ' ', regex=True)
+        .str.replace(MERCHANT_NOISE, ' ', regex=True)
+    )
+    return text.str.split().str[:MERCHANT_KEY_WORDS].str.join(' ').fillna('')
+
+
+def _load_transactions(user_id, today):
+    rows = (
+        Transaction.objects.filter(user_id=user_id, transaction_date__gte=today - timedelta(days=LOOKBACK_DAYS))
+        .order_by('-transaction_date')
+        .values_list(*TRANSACTION_FIELDS)[:MAX_ROWS_PER_USER]
+    )
+    frame = pd.DataFrame.from_records(list(rows), columns=TRANSACTION_FIELDS)
+    frame['merchant'] = normalize_merchants(frame['merchant_name'], frame['description'])
+    return frame[frame['merchant'] != '']
+
+
+def find_series(frame):
+    """Assign every row a series id and return per-series statistics."""
+    frame = frame.sort_values(['transaction_type', 'merchant', 'amount'], kind='mergesort')
+    amounts = frame['amount'].astype(float)
+    same_merchant = (
+        frame['transaction_type'].eq(frame['transaction_type'].shift())
+        & frame['merchant'].eq(frame['merchant'].shift())
+    )
+    frame = frame.assign(series=(~same_merchant | (amounts > amounts.shift() * (1 + AMOUNT_TOLERANCE))).cumsum())
+
+    frame = frame.sort_values(['series', 'transaction_date'], kind='mergesort')
+    days = pd.to_datetime(frame['transaction_date']).values.astype('datetime64[D]').astype(np.int64)
+    gaps = pd.Series(np.diff(days, prepend=days[:1]).astype(float), index=frame.index)
+    # Same-day duplicates don't count as another occurrence
+    gaps = gaps.where(frame['series'].eq(frame['series'].shift()) & (gaps > 0))
+    frame = frame.assign(gap=gaps)
+
+    series = frame.groupby('series')
+    median_gaps = series['gap'].transform('median')
+    frame = frame.assign(deviation=(frame['gap'] - median_gaps).abs())
+    stats = frame.groupby('series').agg(
+        occurrences=('gap', 'count'),
+        median_gap=('gap', 'median'),
+        deviation=('deviation', 'median'),
+        max_deviation=('deviation', 'max'),
+        last_date=('transaction_date', 'last'),
+        amount=('amount', 'last'),
+        min_amount=('amount', 'min'),
+        max_amount=('amount', 'max'),
+        description=('description', 'last'),
+        account_id=('account_id', 'last'),
+        category_id=('category_id', 'last'),
+        transaction_type=('transaction_type', 'first'),
+        merchant=('merchant', 'first'),
+    )
+    stats['occurrences'] += 1
+    stats['dispersion'] = stats['deviation'] / stats['median_gap']
+    stats['frequency'] = np.select(
+        [stats['median_gap'].between(low, high) for _, low, high in FREQUENCY_GAPS],
+        [frequency for frequency, _, _ in FREQUENCY_GAPS],
+        default='',
+    )
+    min_occurrences = np.where(stats['frequency'] == 'yearly', MIN_YEARLY_OCCURRENCES, MIN_OCCURRENCES)
+    stats['is_recurring'] = (
+        (stats['frequency'] != '')
+        & (stats['occurrences'] >= min_occurrences)
+        & (stats['dispersion'] <= MAX_DISPERSION)
+        & (stats['max_deviation'] <= stats['median_gap'] * MAX_GAP_DEVIATION)
+        # Buckets chain small steps; varying amounts (groceries, coffee) are not one series
+        & (stats['max_amount'].astype(float) <= stats['min_amount'].astype(float) * (1 + MAX_AMOUNT_SPREAD))
+    )
+    return frame, stats
+
+
+def _existing_templates(user_id):
+    """{(account_id, transaction_type, merchant, frequency)} of the user's templates."""
+    templates = pd.DataFrame.from_records(
+        list(RecurringTransaction.objects.filter(user_id=user_id).values_list(
+            'account_id', 'transaction_type', 'description', 'frequency'
+        )),
+        columns=['account_id', 'transaction_type', 'description', 'frequency'],
+    )
+    merchants = normalize_merchants(pd.Series([None] * len(templates), dtype=object), templates['description'])
+    return set(zip(templates['account_id'], templates['transaction_type'], merchants, templates['frequency']))
+
+
+def _save_suggestions(user_id, running, today):
+    templates = _existing_templates(user_id)
+    stored = {
+        (s.account_id, s.merchant_key, s.transaction_type, s.frequency): s
+        for s in RecurringSuggestion.objects.filter(user_id=user_id)
+    }
+
+    now = timezone.now()
+    new_suggestions, changed = [], []
+    for row in running.itertuples():
+        if (row.account_id, row.transaction_type, row.merchant, row.frequency) in templates:
+            continue
+        next_due_date = following_occurrence(row.last_date, row.frequency)
+        while next_due_date < today:
+            # Late or skipped payments: suggest the next upcoming date
+            next_due_date = following_occurrence(next_due_date, row.frequency, row.last_date.day)
+        values = {
+            'category_id': None if pd.isna(row.category_id) else int(row.category_id),
+            'description': row.description or row.merchant.title(),
+            'amount': row.amount,
+            'occurrences': int(row.occurrences),
+            'last_date': row.last_date,
+            'next_due_date': next_due_date,
+        }
+        suggestion = stored.get((row.account_id, row.merchant, row.transaction_type, row.frequency))
+        if suggestion is None:
+            new_suggestions.append(RecurringSuggestion(
+                user_id=user_id,
+                account_id=int(row.account_id),
+                merchant_key=row.merchant,
+                transaction_type=row.transaction_type,
+                frequency=row.frequency,
+                **values,
+            ))
+        elif suggestion.status == 'pending' and suggestion.last_date != row.last_date:
+            for field, value in values.items():
+                setattr(suggestion, field, value)
+            suggestion.updated_at = now
+            changed.append(suggestion)
+
+    # ignore_conflicts: a concurrent run for the same user may have stored it
+    RecurringSuggestion.objects.bulk_create(new_suggestions, ignore_conflicts=True)
+    RecurringSuggestion.objects.bulk_update(
+        changed, ['category_id', 'description', 'amount', 'occurrences', 'last_date', 'next_due_date', 'updated_at']
+    )
+    return len(new_suggestions)
+
+
+def detect_for_user(user_id, today=None, since=None):
+    """Detect the user's recurring series; returns (rows flagged, suggestions created).
+
+    With since, only series with transactions created since then are evaluated.
+    """
+    today = today or timezone.now().date()
+    frame = _load_transactions(user_id, today)
+    if frame.empty:
+        return 0, 0
+
+    frame, stats = find_series(frame)
+    if since is not None:
+        new_ids = Transaction.objects.filter(user_id=user_id, created_at__gte=since).values_list('id', flat=True)
+        touched = frame.loc[frame['id'].isin(list(new_ids)), 'series'].unique()
+        stats = stats[stats.index.isin(touched)]
+
+    recurring = stats[stats['is_recurring']]
+    if recurring.empty:
+        return 0, 0
+
+    flag_ids = frame.loc[frame['series'].isin(recurring.index) & ~frame['is_recurring'], 'id'].tolist()
+    active_since = pd.Timestamp(today) - pd.to_timedelta(recurring['median_gap'] * ACTIVE_GAPS, unit='D')
+    running = recurring[pd.to_datetime(recurring['last_date']) >= active_since]
+
+    with db_transaction.atomic():
+        for start in range(0, len(flag_ids), UPDATE_BATCH_SIZE):
+            Transaction.objects.filter(id__in=flag_ids[start:start + UPDATE_BATCH_SIZE]).update(is_recurring=True)
+        created = _save_suggestions(user_id, running, today)
+        if flag_ids:
+            bump_data_version(user_id)
+    return len(flag_ids), created
+
+
+def detect_recurring_payments(today=None, user_ids=None):
+    """Run detection for every active user; returns (rows flagged, suggestions created)."""
+    users = User.objects.filter(is_active=True).order_by('id')
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+
+    flagged = created = 0
+    for user_id in users.values_list('id', flat=True).iterator(chunk_size=2000):
+        try:
+            user_flagged, user_created = detect_for_user(user_id, today)
+            flagged += user_flagged
+            created += user_created
+        except Exception as e:
+            logger.error(f"Error detecting recurring payments for user {user_id}: {str(e)}")
+
+    logger.info(f"Recurring detection flagged {flagged} transactions and suggested {created} templates")
+    return flagged, created
+
+
+def schedule_detection(user_id, since):
+    """Detect recurring payments among the user's rows created since `since`
+    (when the sync or import started) shortly after commit."""
+    def schedule():
+        key = DETECTION_SINCE_KEY.format(user_id=user_id)
+        # Outlives the countdown; if it still expires the run evaluates every series
+        if not cache.add(key, since, DETECTION_DELAY * 2):
+            # A run is pending: make it cover this sync's rows too
+            pending = cache.get(key)
+            if pending is not None and since < pending:
+                cache.set(key, since, DETECTION_DELAY * 2)
+            return
+        try:
+            from .tasks import detect_recurring_for_user
+            detect_recurring_for_user.apply_async(args=[user_id], countdown=DETECTION_DELAY)
+        except Exception as e:
+            # The weekly batch job picks the rows up instead
+            logger.error(f"Error scheduling recurring detection for user {user_id}: {e}")
+
+    db_transaction.on_commit(schedule)
+
+
+def take_detection_since(user_id):
+    """Earliest sync start waiting for the user's scheduled run, clearing it; None if unknown."""
+    key = DETECTION_SINCE_KEY.format(user_id=user_id)
+    since = cache.get(key)
+    # Syncs committing from here on schedule a new run
+    cache.delete(key)
+    return since
@@ -0,0 +1,200 @@
+"""
+Per-user response caching and conditional GET for read-heavy endpoints.
+Each user has change stamps (microsecond timestamps) per kind of data:
+'data' moves whenever the user's transactions, budgets, accounts or
+recurring templates change and when a bank sync or import finishes,
+'notifications' whenever one of their notifications changes (see the
+signals in api.models). A bump makes every cached response for the user
+unreachable, so nothing is deleted explicitly; old entries simply expire.
+The same stamps drive weak ETags and Last-Modified dates, letting polling
+clients get a 304 without any query.
+
+Uses the default cache. A shared cache (Redis) sees every bump at once,
+so stamps are kept until the next change. The per-process LocMem default
+never sees stamps bumped by Celery workers or other web processes, so there
+stamps expire after USER_RESPONSE_LOCAL_STAMP_TIMEOUT seconds: the next
+request starts a new stamp, which bounds how long another process's change
+can go unseen. USER_RESPONSE_CACHE_ENABLED turns response caching off.
+"""
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+CHANGE_STAMP_KEY = 'user_change_stamp:{kind}:{user_id}'
+RESPONSE_KEY = 'user_response:{scope}:{user_id}:{version}:{params}'
+
+# Cache backends that only the current process can see
+PROCESS_LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def user_caching_enabled():
+    """Whether per-user responses may be cached."""
+    return settings.USER_RESPONSE_CACHE_ENABLED
+
+
+def _stamp_timeout():
+    """Lifetime of a change stamp: until the next change in a shared cache, short in a per-process one."""
+    if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHE_BACKENDS:
+        return settings.USER_RESPONSE_LOCAL_STAMP_TIMEOUT
+    return None
+
+
+def _now_stamp():
+    return time.time_ns() // 1000
+
+
+def get_change_stamp(user_id, kind='data'):
+    """Microsecond timestamp of the user's last change of this kind.
+
+    Users with no recorded change (or whose stamp expired from a per-process
+    cache) get the current time, which stays their stamp until the next bump.
+    """
+    key = CHANGE_STAMP_KEY.format(kind=kind, user_id=user_id)
+    stamp = cache.get(key)
+    if stamp is None:
+        now = _now_stamp()
+        cache.add(key, now, _stamp_timeout())
+        stamp = cache.get(key, now)
+    return stamp
+
+
+def bump_change_stamp(user_id, kind='data'):
+    """Record a change for the user once the current DB transaction commits."""
+    def bump():
+        key = CHANGE_STAMP_KEY.format(kind=kind, user_id=user_id)
+        # Always moves forward, even for two bumps within the same microsecond
+        cache.set(key, max(_now_stamp(), (cache.get(key) or 0) + 1), _stamp_timeout())
+
+    if user_id:
+        db_transaction.on_commit(bump)
+
+
+def get_data_version(user_id):
+    """Version of the user's financial data (transactions, budgets, accounts, recurring templates)."""
+    return get_change_stamp(user_id, 'data')
+
+
+def bump_data_version(user_id):
+    """Invalidate every cached response built from the user's financial data."""
+    bump_change_stamp(user_id, 'data')
+
+
+def _params_digest(request):
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    # Date-relative views ("this month", "last 7 days") must not outlive the day
+    params = f"{timezone.now().date().isoformat()}?{params}"
+    return hashlib.md5(params.encode()).hexdigest()
+
+
+def cache_user_response(scope, timeout=None):
+    """Cache a DRF view method's 200 response data per user, data version and query string."""
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            user = request.user
+            if not user or not user.is_authenticated or not user_caching_enabled():
+                return view_method(self, request, *args, **kwargs)
+
+            key = RESPONSE_KEY.format(
+                scope=scope,
+                user_id=user.id,
+                version=get_data_version(user.id),
+                params=_params_digest(request),
+            )
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, timeout or settings.USER_RESPONSE_CACHE_TIMEOUT)
+                response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def _etag_matches(if_none_match, etag):
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison: W/"x" and "x" are the same entity tag
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def _last_modified(stamp):
+    """Last-Modified (epoch seconds) for a change stamp, or None while its second is still running.
+
+    Date-relative views change at midnight, so it is never before the start
+    of the day. A second that is not over yet would also date a later change
+    in the same second, so no date is given then (RFC 9110 8.8.2.2).
+    """
+    day_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    modified = int(max(stamp / 1_000_000, day_start))
+    if modified >= int(time.time()):
+        return None
+    return modified
+
+
+def _not_modified(request, etag, last_modified):
+    """If-None-Match decides when sent; If-Modified-Since only without it."""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return last_modified is not None and if_modified_since is not None and last_modified <= if_modified_since
+
+
+def conditional_user_response(scope, kind='data'):
+    """Weak ETag and Last-Modified for a DRF view method from the user's change stamp.
+
+    A matching If-None-Match, or without one an If-Modified-Since not older
+    than the stamp, returns 304 before the view runs. The ETag covers the
+    microsecond stamp, the query string and the day. Conditional GETs work
+    whether or not response caching is enabled.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            user = request.user
+            if not user or not user.is_authenticated:
+                return view_method(self, request, *args, **kwargs)
+
+            stamp = get_change_stamp(user.id, kind)
+            etag = f'W/"{scope}-{stamp}-{_params_digest(request)[:12]}"'
+            last_modified = _last_modified(stamp)
+
+            if _not_modified(request, etag, last_modified):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Per-user content: private, and clients must revalidate before reuse
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization'])
+            return response
+        return wrapper
+    return decorator
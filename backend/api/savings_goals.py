@@ -0,0 +1,222 @@
+"""
+Savings goal progress from reduced spending.
+Each active goal with target categories is credited, per month, with how
+much less the user spent in those categories than their baseline (the
+average monthly spending there over the 3 months before). The credit is
+stored per (goal, month) in SavingsGoalPeriod and only the difference from
+the stored value is added to the goal, so runs are idempotent: running the
+job twice, or daily through the month, never counts a month twice.
+
+The last closed month and the current one are recomputed on every run so
+late-posted transactions are picked up. The current month's baseline is
+prorated by the days elapsed, otherwise the first days of a month would
+look like a month of savings. Likewise a goal's first month only counts
+from the day it was created: the spending since then against the baseline
+prorated to those days.
+
+All goals in a chunk are locked, computed from one grouped spending query
+(per user, category and month) and written with bulk_create/bulk_update in
+one transaction. Credits are added to the locked current amount, so manual
+contributions made while the job runs are kept.
+"""
+import calendar
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Transaction
+from .notification_bulk import notifications_changed
+from .notification_models import Notification, SavingsGoal, SavingsGoalPeriod
+
+logger = logging.getLogger(__name__)
+
+BASELINE_MONTHS = 3
+GOAL_CHUNK_SIZE = 1000
+
+
+def add_months(month_start, months):
+    """First day of the month `months` after month_start (negative goes back)."""
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return month_start.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def _month_end(month_start):
+    return add_months(month_start, 1) - timedelta(days=1)
+
+
+def _spending(goals, first_day, last_day):
+    """Expenses in every goal's categories from first_day through last_day."""
+    user_ids = {goal.user_id for goal in goals}
+    category_ids = {category.id for goal in goals for category in goal.target_categories.all()}
+    return Transaction.objects.filter(
+        user_id__in=user_ids,
+        category_id__in=category_ids,
+        transaction_type='expense',
+        transaction_date__range=[first_day, last_day],
+    ).order_by()
+
+
+def _monthly_spending(goals, first_month, last_day):
+    """{(user_id, category_id, month): total} for every goal's categories, one query."""
+    rows = (
+        _spending(goals, first_month, last_day)
+        .annotate(month=TruncMonth('transaction_date'))
+        .values('user_id', 'category_id', 'month')
+        .annotate(total=Sum('amount'))
+    )
+    return {(row['user_id'], row['category_id'], row['month']): row['total'] for row in rows}
+
+
+def _daily_spending(goals, first_day, last_day):
+    """{(user_id, category_id, day): total} for goals created since first_day, one query (none if there are none)."""
+    goals = [goal for goal in goals if goal.created_at.date() >= first_day]
+    if not goals:
+        return {}
+    rows = (
+        _spending(goals, first_day, last_day)
+        .values('user_id', 'category_id', 'transaction_date')
+        .annotate(total=Sum('amount'))
+    )
+    return {(row['user_id'], row['category_id'], row['transaction_date']): row['total'] for row in rows}
+
+
+def _period_amounts(goal, spending, daily_spending, period, today):
+    """(baseline, spent, saved) for goal in the month starting at period."""
+    category_ids = [category.id for category in goal.target_categories.all()]
+
+    def spent_in(month):
+        return sum(
+            (spending.get((goal.user_id, category_id, month), Decimal('0.00')) for category_id in category_ids),
+            Decimal('0.00'),
+        )
+
+    baseline = sum(
+        (spent_in(add_months(period, -offset)) for offset in range(1, BASELINE_MONTHS + 1)),
+        Decimal('0.00'),
+    ) / BASELINE_MONTHS
+    days_in_month = calendar.monthrange(period.year, period.month)[1]
+    last_day = min(today, _month_end(period))
+    created = goal.created_at.date()
+    if created <= period:
+        first_day = period
+        spent = spent_in(period)
+    else:
+        # The goal's first month only counts from the day it was created
+        first_day = created
+        spent = sum(
+            (
+                daily_spending.get((goal.user_id, category_id, first_day + timedelta(days=offset)), Decimal('0.00'))
+                for offset in range((last_day - first_day).days + 1)
+                for category_id in category_ids
+            ),
+            Decimal('0.00'),
+        )
+    expected = baseline * ((last_day - first_day).days + 1) / days_in_month
+
+    saved = max(expected - spent, Decimal('0.00'))
+    return baseline.quantize(Decimal('0.01')), spent, saved.quantize(Decimal('0.01'))
+
+
+def _update_chunk(goal_ids, today):
+    current_month = today.replace(day=1)
+    periods = [add_months(current_month, -1), current_month]
+
+    with db_transaction.atomic():
+        # Locked, so contributions made meanwhile (add_savings) and concurrent
+        # runs are applied on top of each other instead of overwritten
+        goals = list(
+            SavingsGoal.objects.select_for_update()
+            .filter(id__in=goal_ids, status='active')
+            .order_by('id')
+            .prefetch_related('target_categories')
+        )
+        spending = _monthly_spending(goals, add_months(periods[0], -BASELINE_MONTHS), today)
+        daily_spending = _daily_spending(goals, periods[0], today)
+        stored = {
+            (period.goal_id, period.period): period
+            for period in SavingsGoalPeriod.objects.filter(goal__in=goals, period__in=periods)
+        }
+
+        now = timezone.now()
+        new_periods, changed_periods, changed_goals, completed = [], [], [], []
+        for goal in goals:
+            delta = Decimal('0.00')
+            for period in periods:
+                # Months that ended before the goal existed earn nothing
+                if _month_end(period) < goal.created_at.date():
+                    continue
+                baseline, spent, saved = _period_amounts(goal, spending, daily_spending, period, today)
+                existing = stored.get((goal.id, period))
+                if existing is None:
+                    new_periods.append(SavingsGoalPeriod(
+                        goal=goal, period=period,
+                        baseline_spending=baseline, spent_amount=spent, saved_amount=saved,
+                    ))
+                    delta += saved
+                elif (existing.baseline_spending, existing.spent_amount, existing.saved_amount) != (baseline, spent, saved):
+                    delta += saved - existing.saved_amount
+                    existing.baseline_spending = baseline
+                    existing.spent_amount = spent
+                    existing.saved_amount = saved
+                    existing.updated_at = now
+                    changed_periods.append(existing)
+
+            if delta:
+                # Not clamped: a later correction must take back exactly what was credited
+                goal.current_amount += delta
+                goal.refresh_progress()
+                goal.updated_at = now
+                changed_goals.append(goal)
+                if goal.status == 'completed':
+                    completed.append(goal)
+
+        notifications = [
+            Notification(
+                user_id=goal.user_id,
+                notification_type='goal_achievement',
+                title=f"Savings Goal Achieved: {goal.title}",
+                message=f"Congratulations! You've reached your savings goal of ${goal.target_amount:.2f} for {goal.title}!",
+                data={'goal_id': goal.id, 'amount_saved': float(goal.current_amount)},
+            )
+            for goal in completed
+        ]
+
+        SavingsGoalPeriod.objects.bulk_create(new_periods)
+        SavingsGoalPeriod.objects.bulk_update(
+            changed_periods, ['baseline_spending', 'spent_amount', 'saved_amount', 'updated_at']
+        )
+        SavingsGoal.objects.bulk_update(
+            changed_goals, ['current_amount', 'progress_percentage', 'status', 'updated_at']
+        )
+        Notification.objects.bulk_create(notifications)
+        notifications_changed([notification.user_id for notification in notifications])
+    return len(changed_goals)
+
+
+def update_savings_goals(today=None, chunk_size=GOAL_CHUNK_SIZE):
+    """Credit reduced spending to every active goal; returns the number of goals changed."""
+    today = today or timezone.now().date()
+    goals = (
+        SavingsGoal.objects.filter(status='active', target_categories__isnull=False)
+        .distinct()
+        .order_by('id')
+    )
+
+    updated = 0
+    last_id = 0
+    while True:
+        # Keyset chunks of ids; each chunk is locked and read again in _update_chunk
+        chunk = list(goals.filter(id__gt=last_id).values_list('id', flat=True)[:chunk_size])
+        if not chunk:
+            break
+        updated += _update_chunk(chunk, today)
+        last_id = chunk[-1]
+
+    logger.info(f"Updated {updated} savings goals")
+    return updated
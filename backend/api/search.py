@@ -0,0 +1,101 @@
+"""
+Transaction search.
+On PostgreSQL, searches the generated `search_vector` tsvector column (GIN
+indexed, see migration 0013) and matches partial merchant names through
+pg_trgm indexes, ranking results by text rank plus merchant similarity.
+Other databases (SQLite in tests) fall back to ILIKE matching.
+"""
+from functools import reduce
+import operator
+
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+SEARCH_CONFIG = 'english'
+
+# Fields searched by the ILIKE fallback, with their rank weight
+FALLBACK_WEIGHTS = {
+    'merchant_name': 1.0,
+    'description': 0.5,
+    'notes': 0.2,
+}
+
+
+def uses_search_index():
+    """Whether the database has the full-text and trigram indexes."""
+    return connection.vendor == 'postgresql'
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _postgres_match(term):
+    table = 'api_transaction'
+    pattern = _like_pattern(term)
+    return RawSQL(
+        f'("{table}"."search_vector" @@ websearch_to_tsquery(%s::regconfig, %s)'
+        f' OR "{table}"."merchant_name" ILIKE %s'
+        f' OR "{table}"."description" ILIKE %s)',
+        (SEARCH_CONFIG, term, pattern, pattern),
+        output_field=BooleanField(),
+    )
+
+
+def _postgres_rank(term):
+    table = 'api_transaction'
+    return RawSQL(
+        f'ts_rank_cd("{table}"."search_vector", websearch_to_tsquery(%s::regconfig, %s))'
+        f' + similarity(COALESCE("{table}"."merchant_name", \'\'), %s)',
+        (SEARCH_CONFIG, term, term),
+        output_field=FloatField(),
+    )
+
+
+def _term_condition(term):
+    if uses_search_index():
+        return _postgres_match(term)
+    condition = Q()
+    for field in FALLBACK_WEIGHTS:
+        condition |= Q(**{f'{field}__icontains': term})
+    return condition
+
+
+def filter_transactions(queryset, term):
+    """Restrict queryset to transactions matching every word of term, in any
+    order and any field (no ordering change)."""
+    for word in (term or '').split():
+        queryset = queryset.filter(_term_condition(word))
+    return queryset
+
+
+def search_transactions(queryset, term):
+    """Return matching transactions annotated with `rank`, best first."""
+    queryset = filter_transactions(queryset, term)
+    if uses_search_index():
+        rank = _postgres_rank(term.strip())
+    else:
+        rank = reduce(operator.add, (
+            Case(
+                When(**{f'{field}__icontains': term.strip()}, then=Value(weight)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+            for field, weight in FALLBACK_WEIGHTS.items()
+        ))
+    return queryset.annotate(rank=rank).order_by('-rank', '-transaction_date', '-id')
+
+
+class TransactionSearchFilter(filters.SearchFilter):
+    """`?search=` backed by the transaction search index instead of ILIKE per field."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        for term in terms:
+            queryset = queryset.filter(_term_condition(term))
+        return queryset
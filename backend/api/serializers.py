@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Category, Account, Transaction, Budget, RecurringTransaction
+from .models import (
+    Category, Account, Transaction, Budget, RecurringTransaction, RecurringSuggestion, CategoryRule,
+    StatementImport
+)
 from .notification_models import (
     NotificationPreference, Notification, BudgetAlert, 
     AIInsight, SavingsGoal
@@ -58,6 +61,54 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name', 'category_type', 'description', 'icon', 'color', 'is_default']
 
+class CategoryRuleSerializer(serializers.ModelSerializer):
+    """Serializer for user auto-categorization rules."""
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    
+    class Meta:
+        model = CategoryRule
+        fields = ['id', 'rule_type', 'pattern', 'category', 'category_name', 'created_at']
+        read_only_fields = ['created_at']
+    
+    def validate_pattern(self, value):
+        value = value.strip()
+        if not value:
+            raise serializers.ValidationError("Pattern cannot be blank.")
+        return value
+
+class StatementImportSerializer(serializers.ModelSerializer):
+    """Serializer for statement uploads and their import status."""
+    account_name = serializers.CharField(source='account.name', read_only=True)
+    file_format = serializers.ChoiceField(choices=StatementImport.FORMAT_CHOICES, required=False)
+    progress = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = StatementImport
+        fields = [
+            'id', 'account', 'account_name', 'file', 'file_format', 'date_order', 'status', 'progress',
+            'bytes_total', 'bytes_processed', 'rows_processed', 'rows_imported',
+            'rows_duplicate', 'rows_failed', 'error_message', 'created_at', 'started_at', 'completed_at'
+        ]
+        read_only_fields = [
+            'status', 'bytes_total', 'bytes_processed', 'rows_processed', 'rows_imported',
+            'rows_duplicate', 'rows_failed', 'error_message', 'created_at', 'started_at', 'completed_at'
+        ]
+        extra_kwargs = {
+            'file': {'write_only': True},
+        }
+    
+    def get_progress(self, obj):
+        if obj.status == 'completed':
+            return 100
+        if not obj.bytes_total:
+            return 0
+        return min(99, int(obj.bytes_processed * 100 / obj.bytes_total))
+    
+    def validate_account(self, value):
+        if value.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError("Account not found.")
+        return value
+
 class AccountSerializer(serializers.ModelSerializer):
     """Serializer for user accounts."""
     balance_display = serializers.SerializerMethodField()
@@ -70,7 +121,17 @@ class AccountSerializer(serializers.ModelSerializer):
     def get_balance_display(self, obj):
         return f"{obj.currency} {obj.balance:,.2f}"
 
-class TransactionSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Limit serialized fields with a `fields` kwarg (e.g. from ?fields=a,b)."""
+    
+    def __init__(self, *args, **kwargs):
+        requested = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if requested:
+            for field_name in set(self.fields) - set(requested):
+                self.fields.pop(field_name)
+
+class TransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for transactions."""
     category = CategorySerializer(read_only=True)
     account = AccountSerializer(read_only=True)
@@ -83,10 +144,10 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'account', 'category', 'amount', 'amount_display', 'transaction_type',
             'description', 'notes', 'transaction_date', 'merchant_name', 'location',
-            'categorization_confidence', 'is_recurring', 'category_name', 'account_name',
-            'created_at', 'updated_at'
+            'categorization_confidence', 'category_set_by_user', 'is_recurring', 'category_name',
+            'account_name', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['categorization_confidence', 'created_at', 'updated_at']
+        read_only_fields = ['categorization_confidence', 'category_set_by_user', 'created_at', 'updated_at']
     
     def get_amount_display(self, obj):
         return f"${obj.amount:,.2f}"
@@ -96,6 +157,75 @@ class TransactionSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Amount must be greater than zero.")
         return value
 
+class TransactionListSerializer(SparseFieldsMixin, serializers.Serializer):
+    """Slim read-only serializer for transaction lists.
+    
+    Works on `.values()` rows rather than model instances; VALUES maps each
+    output field to the lookup the view projects.
+    """
+    VALUES = {
+        'id': 'id',
+        'account': 'account_id',
+        'account_name': 'account__name',
+        'category': 'category_id',
+        'category_name': 'category__name',
+        'amount': 'amount',
+        'transaction_type': 'transaction_type',
+        'description': 'description',
+        'notes': 'notes',
+        'transaction_date': 'transaction_date',
+        'merchant_name': 'merchant_name',
+        'location': 'location',
+        'categorization_confidence': 'categorization_confidence',
+        'category_set_by_user': 'category_set_by_user',
+        'is_recurring': 'is_recurring',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    }
+    # Computed fields and the projected fields they need
+    DERIVED = {
+        'amount_display': ['amount'],
+    }
+    
+    id = serializers.IntegerField()
+    account = serializers.IntegerField(source='account_id')
+    account_name = serializers.CharField()
+    category = serializers.IntegerField(source='category_id', allow_null=True)
+    category_name = serializers.CharField(allow_null=True)
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    amount_display = serializers.SerializerMethodField()
+    transaction_type = serializers.CharField()
+    description = serializers.CharField(allow_null=True)
+    notes = serializers.CharField(allow_null=True)
+    transaction_date = serializers.DateField()
+    merchant_name = serializers.CharField(allow_null=True)
+    location = serializers.CharField(allow_null=True)
+    categorization_confidence = serializers.FloatField()
+    category_set_by_user = serializers.BooleanField()
+    is_recurring = serializers.BooleanField()
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
+    
+    @classmethod
+    def projection(cls, fields=None):
+        """Return (plain field names, {alias: lookup}) to pass to QuerySet.values()."""
+        fields = fields or list(cls.VALUES) + list(cls.DERIVED)
+        lookups = set()
+        for field_name in fields:
+            if field_name in cls.VALUES:
+                lookups.add(cls.VALUES[field_name])
+            for dependency in cls.DERIVED.get(field_name, []):
+                lookups.add(cls.VALUES[dependency])
+        plain = sorted(lookup for lookup in lookups if '__' not in lookup)
+        aliased = {
+            field_name: lookup for field_name, lookup in cls.VALUES.items()
+            if lookup in lookups and '__' in lookup
+        }
+        return plain, aliased
+    
+    def get_amount_display(self, row):
+        return f"${row['amount']:,.2f}"
+
 class TransactionCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating transactions."""
     class Meta:
@@ -119,15 +249,46 @@ class TransactionCreateSerializer(serializers.ModelSerializer):
         
         # If no description provided, generate one from merchant_name or category
         if not validated_data.get('description'):
-            if validated_data.get('merchant_name'):
-                validated_data['description'] = f"Transaction at {validated_data['merchant_name']}"
-            elif validated_data.get('category'):
-                validated_data['description'] = f"{validated_data['category'].name} transaction"
-            else:
-                validated_data['description'] = f"{validated_data['transaction_type'].title()} transaction"
+            category = validated_data.get('category')
+            validated_data['description'] = default_transaction_description(
+                validated_data, category.name if category else None
+            )
         
         return super().create(validated_data)
 
+def default_transaction_description(validated_data, category_name=None):
+    """Description for a transaction created without one."""
+    if validated_data.get('merchant_name'):
+        return f"Transaction at {validated_data['merchant_name']}"
+    elif category_name:
+        return f"{category_name} transaction"
+    return f"{validated_data['transaction_type'].title()} transaction"
+
+class TransactionBulkItemSerializer(serializers.ModelSerializer):
+    """One item of a bulk transaction request.
+    
+    Account and category are plain ids so a batch validates without a
+    query per row; the bulk view checks ownership for the whole batch.
+    """
+    id = serializers.IntegerField(required=False)
+    account = serializers.IntegerField(source='account_id')
+    category = serializers.IntegerField(source='category_id', required=False, allow_null=True)
+    
+    class Meta:
+        model = Transaction
+        fields = [
+            'id', 'account', 'category', 'amount', 'transaction_type',
+            'description', 'notes', 'transaction_date', 'merchant_name', 'location'
+        ]
+        extra_kwargs = {
+            'description': {'required': False, 'allow_blank': True},
+        }
+    
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be greater than zero.")
+        return value
+
 class BudgetSerializer(serializers.ModelSerializer):
     """Serializer for budgets."""
     category_name = serializers.CharField(source='category.name', read_only=True)
@@ -195,8 +356,22 @@ class RecurringTransactionSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'account', 'category', 'amount', 'transaction_type',
             'description', 'frequency', 'start_date', 'end_date', 'next_due_date',
-            'is_active', 'category_name', 'account_name'
+            'creates_transactions', 'is_active', 'category_name', 'account_name'
+        ]
+
+class RecurringSuggestionSerializer(serializers.ModelSerializer):
+    """Serializer for detected recurring payment suggestions."""
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    account_name = serializers.CharField(source='account.name', read_only=True)
+    
+    class Meta:
+        model = RecurringSuggestion
+        fields = [
+            'id', 'account', 'category', 'description', 'amount', 'transaction_type',
+            'frequency', 'occurrences', 'last_date', 'next_due_date', 'status',
+            'recurring_transaction', 'category_name', 'account_name', 'created_at'
         ]
+        read_only_fields = fields
 
 class TransactionAnalyticsSerializer(serializers.Serializer):
     """Serializer for transaction analytics data."""
@@ -208,8 +383,9 @@ class TransactionAnalyticsSerializer(serializers.Serializer):
     # Category breakdown
     category_breakdown = serializers.ListField(child=serializers.DictField())
     
-    # Monthly trends
-    monthly_trends = serializers.ListField(child=serializers.DictField())
+    # Income/expense trends per day, week or month
+    granularity = serializers.CharField()
+    trends = serializers.ListField(child=serializers.DictField())
     
     # Recent transactions
     recent_transactions = TransactionSerializer(many=True)
@@ -242,9 +418,38 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = [
             'id', 'notification_type', 'title', 'message', 'status',
-            'sent_at', 'read_at', 'data', 'created_at', 'updated_at'
+            'sent_at', 'read_at', 'archived_at', 'data', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at', 'sent_at']
+        read_only_fields = ['created_at', 'updated_at', 'sent_at', 'archived_at']
+
+class NotificationBulkActionSerializer(serializers.Serializer):
+    """Selects notifications for a bulk action: explicit ids, filters, or all."""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=5000)
+    notification_type = serializers.ChoiceField(choices=Notification.NOTIFICATION_TYPES, required=False)
+    status = serializers.ChoiceField(choices=Notification.STATUS_CHOICES, required=False)
+    created_before = serializers.DateTimeField(required=False)
+    all = serializers.BooleanField(required=False, default=False)
+    
+    FILTER_FIELDS = ['notification_type', 'status', 'created_before']
+    
+    def validate(self, attrs):
+        if 'ids' not in attrs and not attrs['all'] and not any(field in attrs for field in self.FILTER_FIELDS):
+            raise serializers.ValidationError(
+                "Select notifications with ids, a filter (notification_type, status, created_before) or all=true"
+            )
+        return attrs
+    
+    def filter_queryset(self, queryset):
+        data = self.validated_data
+        if 'ids' in data:
+            queryset = queryset.filter(id__in=data['ids'])
+        if 'notification_type' in data:
+            queryset = queryset.filter(notification_type=data['notification_type'])
+        if 'status' in data:
+            queryset = queryset.filter(status=data['status'])
+        if 'created_before' in data:
+            queryset = queryset.filter(created_at__lt=data['created_before'])
+        return queryset
 
 class AIInsightSerializer(serializers.ModelSerializer):
     """Serializer for AI insights."""
@@ -314,6 +519,7 @@ class ExpensePredictionSerializer(serializers.Serializer):
     total_monthly_prediction = serializers.DecimalField(max_digits=12, decimal_places=2)
     daily_predictions = serializers.ListField(child=serializers.DictField())
     category = serializers.CharField()
+    backend = serializers.CharField(required=False)
     confidence_score = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
 
 class SpendingInsightSerializer(serializers.Serializer):
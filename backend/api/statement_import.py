@@ -0,0 +1,378 @@
+"""
+Bank statement import (CSV, OFX and QIF).
+Files are parsed row by row with generators and imported in fixed-size
+chunks: each chunk is deduplicated against the account's existing rows by
+a (account, date, amount, normalized description) hash, categorized in one
+batch and written with bulk_create, so memory stays bounded by the chunk
+size whatever the file size.
+
+Numeric dates like 03/04/2024 are read month first or day first for the
+whole file: as chosen on upload, or else detected with a first pass over
+the dates (any first field above 12 means day first).
+
+The uploaded file is deleted once its import completes or fails, so bank
+exports don't stay on disk.
+"""
+import csv
+import hashlib
+import io
+import logging
+import re
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .categorization import categorize_transactions
+from .category_resolver import normalize_category_name
+from .ledger import BalanceDeltas
+from .models import StatementImport, Transaction
+from .recurring_detection import schedule_detection
+from .response_cache import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+OFX_READ_SIZE = 64 * 1024
+
+YEAR_FIRST_FORMATS = ['%Y-%m-%d', '%Y/%m/%d', '%Y%m%d']
+DATE_FORMATS = {
+    'mdy': YEAR_FIRST_FORMATS + ['%m/%d/%Y', '%m/%d/%y', '%m-%d-%Y', '%m.%d.%Y'],
+    'dmy': YEAR_FIRST_FORMATS + ['%d/%m/%Y', '%d/%m/%y', '%d-%m-%Y', '%d.%m.%Y'],
+}
+_NUMERIC_DATE = re.compile(r'^(\d{1,2})[/.-](\d{1,2})[/.-]\d{2,4}$')
+
+# Lower-cased CSV header names, in order of preference
+CSV_DATE_COLUMNS = ['date', 'transaction date', 'posted date', 'posting date', 'trans date']
+CSV_AMOUNT_COLUMNS = ['amount', 'transaction amount']
+CSV_DEBIT_COLUMNS = ['debit', 'withdrawal', 'withdrawals']
+CSV_CREDIT_COLUMNS = ['credit', 'deposit', 'deposits']
+CSV_DESCRIPTION_COLUMNS = ['description', 'payee', 'name', 'merchant', 'details', 'memo']
+CSV_MEMO_COLUMNS = ['memo', 'notes', 'reference']
+
+_OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+class StatementParseError(Exception):
+    """Raised when a statement file can't be read at all (bad header, unknown format)."""
+
+
+def detect_format(filename):
+    """Guess the statement format from the file name."""
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension in ('ofx', 'qfx'):
+        return 'ofx'
+    if extension == 'qif':
+        return 'qif'
+    return 'csv'
+
+
+def _clean_date(value):
+    return (value or '').strip().replace("'", '/')
+
+
+def parse_date(value, date_order='mdy'):
+    value = _clean_date(value)
+    for date_format in DATE_FORMATS[date_order]:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_amount(value):
+    """Parse '1,234.56', '(12.00)' or '$-3.10' into a signed Decimal."""
+    value = (value or '').strip().replace(',', '').replace('$', '')
+    if not value:
+        return None
+    negative = value.startswith('(') and value.endswith(')')
+    try:
+        amount = Decimal(value.strip('()'))
+    except InvalidOperation:
+        return None
+    return -amount if negative else amount
+
+
+def detect_date_order(date_values):
+    """'dmy' if a numeric date can only be day first, 'mdy' if only month first
+    (or nothing decides it)."""
+    for value in date_values:
+        match = _NUMERIC_DATE.match(_clean_date(value))
+        if not match:
+            continue
+        first, second = int(match.group(1)), int(match.group(2))
+        if first > 12 >= second:
+            return 'dmy'
+        if second > 12 >= first:
+            return 'mdy'
+    return 'mdy'
+
+
+def statement_row(raw_row, date_order='mdy'):
+    """Normalized row from a parser's (date, amount, description, memo), or
+    None when the date or amount is unusable."""
+    date_value, amount_value, description, memo = raw_row
+    transaction_date = parse_date(date_value, date_order)
+    amount = parse_amount(amount_value) if isinstance(amount_value, str) else amount_value
+    if transaction_date is None or amount is None:
+        return None
+    return {
+        'date': transaction_date,
+        'amount': amount,
+        'description': (description or '').strip(),
+        'memo': (memo or '').strip(),
+    }
+
+
+def _find_column(fieldnames, candidates):
+    lowered = {name.strip().lower(): name for name in fieldnames if name}
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered[candidate]
+    return None
+
+
+def parse_csv(text_stream):
+    """Yield raw (date, amount, description, memo) rows from a CSV export with a header line."""
+    reader = csv.DictReader(text_stream)
+    fieldnames = reader.fieldnames or []
+    date_column = _find_column(fieldnames, CSV_DATE_COLUMNS)
+    amount_column = _find_column(fieldnames, CSV_AMOUNT_COLUMNS)
+    debit_column = _find_column(fieldnames, CSV_DEBIT_COLUMNS)
+    credit_column = _find_column(fieldnames, CSV_CREDIT_COLUMNS)
+    description_column = _find_column(fieldnames, CSV_DESCRIPTION_COLUMNS)
+    memo_column = _find_column(fieldnames, CSV_MEMO_COLUMNS)
+    if memo_column == description_column:
+        memo_column = None
+
+    if not date_column or not (amount_column or debit_column or credit_column):
+        raise StatementParseError(f"CSV needs a date and an amount column, found: {fieldnames}")
+
+    for record in reader:
+        if amount_column:
+            amount = parse_amount(record.get(amount_column))
+        else:
+            # Separate debit/credit columns hold unsigned amounts
+            debit = parse_amount(record.get(debit_column)) if debit_column else None
+            credit = parse_amount(record.get(credit_column)) if credit_column else None
+            amount = (credit or Decimal('0')) - abs(debit or Decimal('0')) if (debit or credit) else None
+        yield (
+            record.get(date_column),
+            amount,
+            record.get(description_column) if description_column else '',
+            record.get(memo_column) if memo_column else '',
+        )
+
+
+def _ofx_tags(text_stream):
+    """Yield (closing, tag, value) from OFX/QFX in fixed-size reads.
+
+    Works for SGML (unclosed leaf tags, one per line) and XML files that
+    put the whole document on a single line.
+    """
+    buffer = ''
+    while True:
+        block = text_stream.read(OFX_READ_SIZE)
+        buffer += block
+        # Keep a possibly incomplete trailing tag for the next read
+        cut = buffer.rfind('<') if block else -1
+        if cut == -1:
+            cut = len(buffer)
+        for match in _OFX_TAG.finditer(buffer, 0, cut):
+            yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+        buffer = buffer[cut:]
+        if not block:
+            return
+
+
+def parse_ofx(text_stream):
+    """Yield raw rows from the STMTTRN records of an OFX/QFX file."""
+    record = None
+    for closing, tag, value in _ofx_tags(text_stream):
+        if tag == 'STMTTRN':
+            if closing and record is not None:
+                yield (
+                    record.get('DTPOSTED', '')[:8],
+                    record.get('TRNAMT'),
+                    record.get('NAME') or record.get('PAYEE') or record.get('MEMO'),
+                    record.get('MEMO', '') if record.get('NAME') else '',
+                )
+                record = None
+            elif not closing:
+                record = {}
+        elif record is not None and not closing and value:
+            record[tag] = value
+
+
+def parse_qif(text_stream):
+    """Yield raw rows from a QIF file (records end with '^')."""
+    record = {}
+    for line in text_stream:
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('!'):
+            continue
+        code, value = line[0], line[1:]
+        if code == '^':
+            if record:
+                yield (
+                    record.get('D'),
+                    record.get('T') or record.get('U'),
+                    record.get('P') or record.get('M'),
+                    record.get('M', '') if record.get('P') else '',
+                )
+            record = {}
+        elif code in 'DTUPM':
+            record[code] = value
+    if record:
+        yield (
+            record.get('D'),
+            record.get('T') or record.get('U'),
+            record.get('P') or record.get('M'),
+            record.get('M', '') if record.get('P') else '',
+        )
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'ofx': parse_ofx,
+    'qif': parse_qif,
+}
+
+
+def transaction_fingerprint(account_id, transaction_date, signed_amount, description):
+    """Stable hash used to recognize a statement row that is already imported."""
+    key = '|'.join([
+        str(account_id),
+        transaction_date.isoformat(),
+        f"{Decimal(signed_amount):.2f}",
+        normalize_category_name(description),
+    ])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _existing_fingerprints(account_id, rows, before):
+    """Fingerprint counts of the account's rows that could match rows (one query)."""
+    counts = Counter()
+    dates = {row['date'] for row in rows}
+    rows = Transaction.objects.filter(
+        account_id=account_id,
+        transaction_date__range=(min(dates), max(dates)),
+        transaction_date__in=dates,
+        amount__in={abs(row['amount']) for row in rows},
+        created_at__lt=before,
+    ).values_list('transaction_date', 'amount', 'transaction_type', 'description')
+    for transaction_date, amount, transaction_type, description in rows.iterator():
+        signed_amount = -amount if transaction_type == 'expense' else amount
+        counts[transaction_fingerprint(account_id, transaction_date, signed_amount, description)] += 1
+    return counts
+
+
+def _import_chunk(job, rows):
+    """Dedupe, categorize and insert one chunk; returns (imported, duplicates)."""
+    existing = _existing_fingerprints(job.account_id, rows, job.started_at)
+
+    new_transactions = []
+    deltas = BalanceDeltas()
+    duplicates = 0
+    for row in rows:
+        fingerprint = transaction_fingerprint(job.account_id, row['date'], row['amount'], row['description'])
+        # Counted so that identical rows (two coffees on the same day) each match once
+        if existing[fingerprint] > 0:
+            existing[fingerprint] -= 1
+            duplicates += 1
+            continue
+
+        transaction_type = 'expense' if row['amount'] < 0 else 'income'
+        description = row['description'][:255] or f"{transaction_type.title()} transaction"
+        transaction = Transaction(
+            user_id=job.user_id,
+            account_id=job.account_id,
+            amount=abs(row['amount']),
+            transaction_type=transaction_type,
+            description=description,
+            notes=row['memo'] or None,
+            transaction_date=row['date'],
+        )
+        deltas.add(job.account_id, transaction_type, transaction.amount)
+        new_transactions.append(transaction)
+
+    categorize_transactions(new_transactions, job.user_id)
+    with db_transaction.atomic():
+        Transaction.objects.bulk_create(new_transactions, batch_size=CHUNK_SIZE)
+        deltas.apply()
+        bump_data_version(job.user_id)
+        if new_transactions:
+            schedule_detection(job.user_id, job.started_at)
+    return len(new_transactions), duplicates
+
+
+def _detect_file_date_order(job):
+    """Streaming first pass over the file's dates; stops at the first deciding one."""
+    with job.file.open('rb') as raw:
+        text_stream = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+        return detect_date_order(raw_row[0] for raw_row in PARSERS[job.file_format](text_stream))
+
+
+def run_statement_import(job):
+    """Import a StatementImport's file, updating its progress per chunk."""
+    job.status = 'processing'
+    job.started_at = timezone.now()
+    job.error_message = ''
+    job.save(update_fields=['status', 'started_at', 'error_message'])
+
+    counters = Counter()
+    try:
+        if job.date_order == 'auto':
+            # OFX dates are always YYYYMMDD
+            job.date_order = 'mdy' if job.file_format == 'ofx' else _detect_file_date_order(job)
+            StatementImport.objects.filter(id=job.id).update(date_order=job.date_order)
+
+        with job.file.open('rb') as raw:
+            job.bytes_total = job.file.size
+            text_stream = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+            parsed = (statement_row(raw_row, job.date_order) for raw_row in PARSERS[job.file_format](text_stream))
+
+            while True:
+                chunk = list(islice(parsed, CHUNK_SIZE))
+                if not chunk:
+                    break
+                rows = [row for row in chunk if row is not None]
+                counters['failed'] += len(chunk) - len(rows)
+                counters['processed'] += len(chunk)
+                if rows:
+                    imported, duplicates = _import_chunk(job, rows)
+                    counters['imported'] += imported
+                    counters['duplicate'] += duplicates
+
+                StatementImport.objects.filter(id=job.id).update(
+                    bytes_total=job.bytes_total,
+                    bytes_processed=min(raw.tell(), job.bytes_total),
+                    rows_processed=counters['processed'],
+                    rows_imported=counters['imported'],
+                    rows_duplicate=counters['duplicate'],
+                    rows_failed=counters['failed'],
+                )
+
+        job.status = 'completed'
+        job.bytes_processed = job.bytes_total
+    except Exception as e:
+        logger.error(f"Statement import {job.id} failed: {e}")
+        job.status = 'failed'
+        job.error_message = str(e)
+
+    try:
+        job.file.delete(save=False)
+    except Exception as e:
+        logger.warning(f"Could not delete the file of statement import {job.id}: {e}")
+
+    job.rows_processed = counters['processed']
+    job.rows_imported = counters['imported']
+    job.rows_duplicate = counters['duplicate']
+    job.rows_failed = counters['failed']
+    job.completed_at = timezone.now()
+    job.save()
+    return job
@@ -0,0 +1,132 @@
+"""
+Plaid auto-sync scheduler.
+Works out when each auto-sync account is next due and picks due accounts
+in priority order (most overdue first). Items that send webhooks are synced
+on demand, so polling them only runs as a daily safety net.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Account, PlaidItem
+
+logger = logging.getLogger(__name__)
+
+SYNC_PERIODS = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+}
+
+# Largest number of accounts queued per scheduler run
+DEFAULT_BATCH_SIZE = 500
+
+_EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+
+# Items that receive Plaid webhooks are only polled as a safety net
+WEBHOOK_SAFETY_NET_PERIOD = timedelta(days=1)
+
+
+def get_sync_period(account, webhook_driven=False):
+    """Return the sync period for an account's sync_frequency."""
+    period = SYNC_PERIODS.get(account.sync_frequency, SYNC_PERIODS['daily'])
+    if webhook_driven:
+        period = max(period, WEBHOOK_SAFETY_NET_PERIOD)
+    return period
+
+
+def get_webhook_item_ids(accounts):
+    """Return the Plaid item ids among accounts that have delivered webhooks."""
+    item_ids = {account.plaid_item_id for account in accounts if account.plaid_item_id}
+    if not item_ids:
+        return set()
+    return set(PlaidItem.objects.filter(
+        plaid_item_id__in=item_ids,
+        last_webhook__isnull=False
+    ).values_list('plaid_item_id', flat=True))
+
+
+def get_sync_offset(account_id, period):
+    """Stable per-account offset inside the period.
+
+    Each account gets a fixed slot, so syncs are spread over the whole period
+    instead of all landing at the top of the hour.
+    """
+    period_seconds = int(period.total_seconds())
+    # Multiplicative hash spreads consecutive ids across the period
+    return timedelta(seconds=(account_id * 2654435761) % period_seconds)
+
+
+def _next_slot_after(moment, account, webhook_driven=False):
+    """First slot boundary (epoch + offset + k * period) strictly after moment."""
+    period = get_sync_period(account, webhook_driven)
+    offset = get_sync_offset(account.id, period)
+    slots = (moment - _EPOCH - offset) // period + 1
+    return _EPOCH + offset + slots * period
+
+
+def compute_next_sync_at(account, now=None, webhook_driven=None):
+    """Return the next time an account is due for an automatic sync."""
+    now = now or timezone.now()
+    last_sync = account.last_plaid_sync
+    if last_sync is None:
+        # Never synced - due straight away
+        return now
+    if webhook_driven is None:
+        webhook_driven = bool(get_webhook_item_ids([account]))
+    return _next_slot_after(last_sync, account, webhook_driven)
+
+
+def schedule_account(account, now=None, save=True, webhook_driven=None):
+    """Recompute and store next_sync_at for an account."""
+    account.next_sync_at = compute_next_sync_at(account, now, webhook_driven)
+    if save:
+        Account.objects.filter(id=account.id).update(next_sync_at=account.next_sync_at)
+    return account.next_sync_at
+
+
+def get_due_accounts(now=None, limit=DEFAULT_BATCH_SIZE):
+    """Return auto-sync accounts that are due, most overdue first."""
+    now = now or timezone.now()
+    return Account.objects.filter(
+        Q(next_sync_at__lte=now) | Q(next_sync_at__isnull=True),
+        auto_sync_enabled=True,
+        is_plaid_account=True,
+        is_active=True,
+    ).order_by(F('next_sync_at').asc(nulls_first=True)).only(
+        'id', 'user_id', 'plaid_item_id', 'sync_frequency', 'last_plaid_sync', 'next_sync_at'
+    )[:limit]
+
+
+def claim_due_accounts(now=None, limit=DEFAULT_BATCH_SIZE):
+    """Pick due accounts and push their next_sync_at forward.
+
+    Claiming moves each account to its next slot up front, so an overlapping
+    scheduler run does not queue the same account twice. A successful sync
+    reschedules the account again from its new last_plaid_sync.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        accounts = list(get_due_accounts(now, limit).select_for_update(skip_locked=True))
+        webhook_item_ids = get_webhook_item_ids(accounts)
+        due = []
+
+        for account in accounts:
+            webhook_driven = account.plaid_item_id in webhook_item_ids
+            if account.next_sync_at is None:
+                # Not slotted yet (new account or pre-scheduler row)
+                account.next_sync_at = compute_next_sync_at(account, now, webhook_driven)
+                if account.next_sync_at > now:
+                    continue
+            account.next_sync_at = _next_slot_after(now, account, webhook_driven)
+            due.append(account)
+
+        if accounts:
+            Account.objects.bulk_update(accounts, ['next_sync_at'])
+
+    logger.info(f"Claimed {len(due)} accounts due for auto-sync")
+    return due
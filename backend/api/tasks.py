@@ -2,21 +2,26 @@
 Celery tasks for features: AI insights, notifications, and budget alerts.
 """
 from celery import shared_task
-from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.db.models import Sum, Avg
+from django.db.models import Sum
 from datetime import datetime, timedelta
 from decimal import Decimal
 import logging
 
-from .models import Transaction, Budget, Category
+from .models import Transaction, Budget, Category, Account
 from .notification_models import (
     Notification, NotificationPreference, BudgetAlert, 
     AIInsight, SavingsGoal
 )
 from .ml_models import generate_ai_insights, ExpensePredictionModel, AnomalyDetectionModel
+from .sync_scheduler import claim_due_accounts, schedule_account
+from .category_resolver import category_resolver
+from .categorization import get_engine as get_categorization_engine
+from .email_queue import queue_email, queue_notification_email
+from .notification_digest import NotificationDigest
+from .recurring_detection import schedule_detection
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -148,18 +153,18 @@ def send_budget_alert(budget_id, alert_type, percentage_used):
         ).first()
         
         if pref and pref.delivery_method in ['email', 'both']:
-            send_email_notification.delay(notification.id)
+            # Marked sent by the email queue once delivered
+            queue_notification_email(notification)
+        else:
+            notification.status = 'sent'
+            notification.sent_at = timezone.now()
+            notification.save()
         
         # Mark alert as sent
         alert.is_sent = True
         alert.sent_at = timezone.now()
         alert.save()
         
-        # Update notification status
-        notification.status = 'sent'
-        notification.sent_at = timezone.now()
-        notification.save()
-        
         logger.info(f"Budget alert sent to {budget.user.email} for {budget.category.name}")
         return "Alert sent successfully"
         
@@ -170,142 +175,74 @@ def send_budget_alert(budget_id, alert_type, percentage_used):
 
 @shared_task
 def send_email_notification(notification_id):
-    """Send email notification to user."""
+    """Queue the email for a notification."""
     try:
         notification = Notification.objects.select_related('user').get(id=notification_id)
+        queue_notification_email(notification)
         
-        subject = f"FinMate: {notification.title}"
-        message = notification.message
-        
-        # Add footer
-        message += "\n\n---\nThis is an automated message from FinMate. Visit your dashboard for more details."
-        
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL or 'noreply@finmate.com',
-            recipient_list=[notification.user.email],
-            fail_silently=False
-        )
-        
-        logger.info(f"Email sent to {notification.user.email}: {notification.title}")
-        return "Email sent successfully"
+        logger.info(f"Email queued for {notification.user.email}: {notification.title}")
+        return "Email queued successfully"
         
     except Exception as e:
-        logger.error(f"Error sending email notification: {str(e)}")
+        logger.error(f"Error queuing email notification: {str(e)}")
         return f"Error: {str(e)}"
 
 
+@shared_task
+def flush_email_queue():
+    """Send due emails from the outbound queue in batches."""
+    from .email_queue import flush_email_queue as flush
+    
+    return dict(flush())
+
+
+@shared_task
+def purge_sent_emails():
+    """Delete delivered and abandoned emails past the retention period."""
+    from .email_queue import purge_sent_emails as purge
+    
+    return purge()
+
+
 @shared_task
 def generate_weekly_summary():
     """Generate weekly summary for all users."""
-    logger.info("Starting weekly summary generation...")
+    from .weekly_summary import send_weekly_summaries
     
-    # Get all users who want weekly summaries
-    preferences = NotificationPreference.objects.filter(
-        notification_type='weekly_summary',
-        is_enabled=True
-    ).select_related('user')
-    
-    summaries_sent = 0
+    logger.info("Starting weekly summary generation...")
     
-    for pref in preferences:
-        try:
-            send_weekly_summary.delay(pref.user.id)
-            summaries_sent += 1
-        except Exception as e:
-            logger.error(f"Error queuing weekly summary for user {pref.user.id}: {str(e)}")
+    # Grouped queries per chunk of users instead of a task per user
+    summaries_sent = send_weekly_summaries()
     
-    logger.info(f"Weekly summary generation completed. {summaries_sent} summaries queued.")
+    logger.info(f"Weekly summary generation completed. {summaries_sent} summaries sent.")
     return summaries_sent
 
 
 @shared_task
 def send_weekly_summary(user_id):
     """Send weekly summary to a specific user."""
+    from .weekly_summary import get_weekly_summary, summary_notification
+    
     try:
         user = User.objects.get(id=user_id)
         
-        # Calculate date range (last 7 days)
-        end_date = timezone.now().date()
-        start_date = end_date - timedelta(days=7)
-        
-        # Get weekly transactions
-        transactions = Transaction.objects.filter(
-            user=user,
-            transaction_date__range=[start_date, end_date]
-        )
+        # The current week so far, shared with the dashboard's cached summary
+        summary = get_weekly_summary(user.id)
         
-        if not transactions.exists():
+        if not summary['transaction_count']:
             return "No transactions this week"
         
-        # Calculate summary statistics
-        total_income = transactions.filter(transaction_type='income').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
-        
-        total_expenses = transactions.filter(transaction_type='expense').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
-        
-        net_cash_flow = total_income - total_expenses
-        
-        # Get top spending categories
-        category_spending = {}
-        for transaction in transactions.filter(transaction_type='expense'):
-            category_name = transaction.category.name if transaction.category else 'Uncategorized'
-            category_spending[category_name] = category_spending.get(category_name, Decimal('0.00')) + transaction.amount
-        
-        top_categories = sorted(category_spending.items(), key=lambda x: x[1], reverse=True)[:3]
-        
-        # Create summary message
-        title = f"Weekly Summary - {start_date.strftime('%b %d')} to {end_date.strftime('%b %d')}"
-        
-        message = f"""
-        Here's your weekly financial summary:
-        
-        💰 Total Income: ${total_income:.2f}
-        💸 Total Expenses: ${total_expenses:.2f}
-        📊 Net Cash Flow: ${net_cash_flow:.2f}
-        
-        Top Spending Categories:
-        """
-        
-        for i, (category, amount) in enumerate(top_categories, 1):
-            message += f"\n{i}. {category}: ${amount:.2f}"
-        
-        if net_cash_flow < 0:
-            message += f"\n\n⚠️ You spent ${abs(net_cash_flow):.2f} more than you earned this week."
-        else:
-            message += f"\n\n✅ Great job! You saved ${net_cash_flow:.2f} this week."
-        
-        # Create notification
-        notification = Notification.objects.create(
-            user=user,
-            notification_type='weekly_summary',
-            title=title,
-            message=message,
-            data={
-                'total_income': float(total_income),
-                'total_expenses': float(total_expenses),
-                'net_cash_flow': float(net_cash_flow),
-                'top_categories': dict(top_categories),
-                'transaction_count': transactions.count()
-            }
-        )
-        
         # Send email if enabled
         pref = NotificationPreference.objects.filter(
             user=user,
             notification_type='weekly_summary'
         ).first()
+        emailed = bool(pref and pref.delivery_method in ['email', 'both'])
         
-        if pref and pref.delivery_method in ['email', 'both']:
-            send_email_notification.delay(notification.id)
-        
-        notification.status = 'sent'
-        notification.sent_at = timezone.now()
+        notification = summary_notification(user, summary, emailed=emailed)
         notification.save()
+        if emailed:
+            queue_notification_email(notification)
         
         logger.info(f"Weekly summary sent to {user.email}")
         return "Weekly summary sent successfully"
@@ -359,11 +296,12 @@ def generate_user_ai_insights(user_id):
         if not insights:
             return "No insights generated"
         
-        insights_created = 0
+        # (insight, notification to send for it or None), written in one INSERT
+        pending = []
         
         # Process spending patterns
         for pattern in insights.get('spending_patterns', []):
-            ai_insight = AIInsight.objects.create(
+            ai_insight = AIInsight(
                 user=user,
                 insight_type='spending_pattern',
                 title=f"Spending Pattern: {pattern.get('type', 'Unknown')}",
@@ -371,21 +309,11 @@ def generate_user_ai_insights(user_id):
                 data=pattern,
                 confidence_score=Decimal('85.0')  # Default confidence
             )
-            
-            # Create notification
-            Notification.objects.create(
-                user=user,
-                notification_type='ai_insight',
-                title=ai_insight.title,
-                message=ai_insight.description,
-                data={'insight_id': ai_insight.id}
-            )
-            
-            insights_created += 1
+            pending.append((ai_insight, {'notification_type': 'ai_insight'}))
         
         # Process budget suggestions
         for suggestion in insights.get('budget_suggestions', []):
-            ai_insight = AIInsight.objects.create(
+            ai_insight = AIInsight(
                 user=user,
                 insight_type='budget_suggestion',
                 title="AI Budget Recommendation",
@@ -394,12 +322,11 @@ def generate_user_ai_insights(user_id):
                 confidence_score=Decimal('90.0'),
                 is_actionable=True
             )
-            
-            insights_created += 1
+            pending.append((ai_insight, None))
         
         # Process savings opportunities
         for opportunity in insights.get('savings_opportunities', []):
-            ai_insight = AIInsight.objects.create(
+            ai_insight = AIInsight(
                 user=user,
                 insight_type='savings_opportunity',
                 title=f"Savings Opportunity: {opportunity.get('category', 'General')}",
@@ -409,21 +336,18 @@ def generate_user_ai_insights(user_id):
                 is_actionable=True
             )
             
-            # Create notification for significant savings opportunities
+            # Notify for significant savings opportunities
+            notification = None
             if opportunity.get('potential_savings', 0) > 50:
-                Notification.objects.create(
-                    user=user,
-                    notification_type='saving_suggestion',
-                    title=ai_insight.title,
-                    message=ai_insight.description,
-                    data={'insight_id': ai_insight.id, 'potential_savings': opportunity.get('potential_savings')}
-                )
-            
-            insights_created += 1
+                notification = {
+                    'notification_type': 'saving_suggestion',
+                    'data': {'potential_savings': opportunity.get('potential_savings')},
+                }
+            pending.append((ai_insight, notification))
         
         # Process anomalies
         for anomaly in insights.get('anomalies', []):
-            ai_insight = AIInsight.objects.create(
+            ai_insight = AIInsight(
                 user=user,
                 insight_type='anomaly',
                 title="Unusual Spending Detected",
@@ -432,22 +356,20 @@ def generate_user_ai_insights(user_id):
                 confidence_score=Decimal('75.0')
             )
             
-            # Create high-priority notification for large anomalies
+            # High-priority notification for large anomalies
+            notification = None
             if anomaly.get('amount', 0) > 200:
-                Notification.objects.create(
-                    user=user,
-                    notification_type='anomaly_alert',
-                    title="Large Unusual Transaction Detected",
-                    message=ai_insight.description,
-                    data={'insight_id': ai_insight.id, 'transaction_id': anomaly.get('transaction_id')}
-                )
-            
-            insights_created += 1
+                notification = {
+                    'notification_type': 'anomaly_alert',
+                    'title': "Large Unusual Transaction Detected",
+                    'data': {'transaction_id': anomaly.get('transaction_id')},
+                }
+            pending.append((ai_insight, notification))
         
         # Process predictions
         predictions = insights.get('predictions', {})
         if predictions:
-            ai_insight = AIInsight.objects.create(
+            ai_insight = AIInsight(
                 user=user,
                 insight_type='prediction',
                 title="Monthly Expense Prediction",
@@ -455,8 +377,23 @@ def generate_user_ai_insights(user_id):
                 data=predictions,
                 confidence_score=Decimal('85.0')
             )
-            
-            insights_created += 1
+            pending.append((ai_insight, None))
+        
+        AIInsight.objects.bulk_create([ai_insight for ai_insight, _ in pending])
+        insights_created = len(pending)
+        
+        # One digest notification (and email) instead of one per insight
+        digest = NotificationDigest(user, email_preference='ai_insights')
+        for ai_insight, notification in pending:
+            if notification is None:
+                continue
+            digest.add(
+                notification['notification_type'],
+                notification.get('title', ai_insight.title),
+                ai_insight.description,
+                data={'insight_id': ai_insight.id, **notification.get('data', {})},
+            )
+        digest.send()
         
         logger.info(f"Generated {insights_created} AI insights for user {user.email}")
         return f"Generated {insights_created} insights"
@@ -489,22 +426,22 @@ def detect_anomalies_for_user(user_id):
             return "No anomalies detected"
         
         # Process each anomaly
-        for anomaly in anomalies[:3]:  # Top 3 anomalies
-            try:
-                transaction = Transaction.objects.get(id=anomaly['transaction_id'])
-                
-                # Create notification
-                Notification.objects.create(
-                    user=user,
-                    notification_type='anomaly_alert',
-                    title="Unusual Spending Detected",
-                    message=f"We detected an unusual transaction: {anomaly['description']} for ${anomaly['amount']:.2f} on {anomaly['date']}. This is significantly different from your normal spending patterns.",
-                    transaction=transaction,
-                    data=anomaly
-                )
-                
-            except Transaction.DoesNotExist:
+        top_anomalies = anomalies[:3]  # Top 3 anomalies
+        transactions = Transaction.objects.in_bulk([anomaly['transaction_id'] for anomaly in top_anomalies])
+        digest = NotificationDigest(user, email_preference='anomaly_detection')
+        for anomaly in top_anomalies:
+            transaction = transactions.get(anomaly['transaction_id'])
+            if transaction is None:
                 continue
+            
+            digest.add(
+                'anomaly_alert',
+                "Unusual Spending Detected",
+                f"We detected an unusual transaction: {anomaly['description']} for ${anomaly['amount']:.2f} on {anomaly['date']}. This is significantly different from your normal spending patterns.",
+                data=anomaly,
+                transaction=transaction,
+            )
+        digest.send()
         
         logger.info(f"Processed {len(anomalies)} anomalies for user {user.email}")
         return f"Processed {len(anomalies)} anomalies"
@@ -517,64 +454,88 @@ def detect_anomalies_for_user(user_id):
 @shared_task
 def update_savings_goals():
     """Update progress for all active savings goals."""
+    from .savings_goals import update_savings_goals as update_goals
+    
     logger.info("Starting savings goals update...")
+    return update_goals()
+
+
+@shared_task
+def materialize_recurring_transactions():
+    """Create the transactions of all due recurring templates."""
+    from .recurring import materialize_recurring_transactions as materialize
     
-    active_goals = SavingsGoal.objects.filter(status='active')
-    updated_count = 0
+    logger.info("Materializing recurring transactions...")
+    return materialize()
+
+
+@shared_task
+def detect_recurring_payments():
+    """Flag recurring transactions and suggest templates for all users."""
+    from .recurring_detection import detect_recurring_payments as detect
     
-    for goal in active_goals:
-        try:
-            # Calculate savings based on category spending reduction
-            if goal.target_categories.exists():
-                # Get current month spending in target categories
-                current_month = timezone.now().replace(day=1).date()
-                
-                current_spending = Transaction.objects.filter(
-                    user=goal.user,
-                    category__in=goal.target_categories.all(),
-                    transaction_type='expense',
-                    transaction_date__gte=current_month
-                ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-                
-                # Get average spending for comparison (last 3 months)
-                three_months_ago = (current_month - timedelta(days=90)).replace(day=1)
-                avg_spending = Transaction.objects.filter(
-                    user=goal.user,
-                    category__in=goal.target_categories.all(),
-                    transaction_type='expense',
-                    transaction_date__range=[three_months_ago, current_month]
-                ).aggregate(avg=Avg('amount'))['avg'] or Decimal('0.00')
-                
-                # Calculate savings (if spending less than average)
-                if avg_spending > current_spending:
-                    monthly_savings = avg_spending - current_spending
-                    goal.current_amount += monthly_savings
-                    goal.calculate_progress()
-                    
-                    # Check if goal is completed
-                    if goal.progress_percentage >= 100:
-                        Notification.objects.create(
-                            user=goal.user,
-                            notification_type='goal_achievement',
-                            title=f"Savings Goal Achieved: {goal.title}",
-                            message=f"Congratulations! You've reached your savings goal of ${goal.target_amount:.2f} for {goal.title}!",
-                            data={'goal_id': goal.id, 'amount_saved': float(goal.current_amount)}
-                        )
-                
-                updated_count += 1
-                
-        except Exception as e:
-            logger.error(f"Error updating savings goal {goal.id}: {str(e)}")
+    logger.info("Detecting recurring payments...")
+    flagged, suggested = detect()
+    return f"Flagged {flagged} transactions, suggested {suggested} templates"
+
+
+@shared_task
+def detect_recurring_for_user(user_id, since=None):
+    """Detect recurring payments among a user's transactions created since the scheduled syncs started."""
+    from django.utils.dateparse import parse_datetime
+    from .recurring_detection import detect_for_user, take_detection_since
+    
+    # `since` is only passed by runs queued before the start was kept in the cache
+    since = take_detection_since(user_id) or (parse_datetime(since) if since else None)
+    flagged, suggested = detect_for_user(user_id, since=since)
+    return f"Flagged {flagged} transactions, suggested {suggested} templates"
+
+
+@shared_task
+def import_statement(import_id):
+    """Import an uploaded bank statement in chunks."""
+    from .models import StatementImport
+    from .statement_import import run_statement_import
+    
+    try:
+        job = StatementImport.objects.get(id=import_id)
+    except StatementImport.DoesNotExist:
+        logger.warning(f"Statement import {import_id} no longer exists")
+        return None
     
-    logger.info(f"Updated {updated_count} savings goals")
-    return updated_count
+    job = run_statement_import(job)
+    logger.info(
+        f"Statement import {job.id} {job.status}: {job.rows_imported} imported, "
+        f"{job.rows_duplicate} duplicates, {job.rows_failed} unreadable rows"
+    )
+    return job.status
+
+
+@shared_task
+def train_category_classifier():
+    """Retrain the transaction category classifier from manual categorizations."""
+    from .ml_models import CategoryClassifier
+    
+    success, result = CategoryClassifier().train()
+    if success:
+        logger.info(f"Category classifier trained: {result}")
+    else:
+        logger.warning(f"Category classifier not trained: {result}")
+    return result
+
+
+@shared_task
+def purge_read_notifications():
+    """Delete read notifications past the retention period, in batches."""
+    from .notification_bulk import purge_read_notifications as purge
+    
+    return purge()
 
 
 @shared_task
 def send_financial_report_email(user_id, email, report_type='monthly', report_format='pdf', period='this_month'):
     """Generate and email financial reports to users."""
     try:
-        from django.core.mail import EmailMessage
         from .reports import FinancialReportGenerator, WeeklyReportGenerator, MonthlyReportGenerator
         
         user = User.objects.get(id=user_id)
@@ -615,13 +576,6 @@ def send_financial_report_email(user_id, email, report_type='monthly', report_fo
         The FinMate Team
         """
         
-        email_msg = EmailMessage(
-            subject=subject,
-            body=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[email]
-        )
-        
         # Generate and attach report
         if report_format.lower() == 'csv':
             # Generate CSV content
@@ -640,7 +594,7 @@ def send_financial_report_email(user_id, email, report_type='monthly', report_fo
                 csv_content.write(f"{transaction['date']},{transaction['description']},{transaction['type']},${transaction['amount']},{transaction['category__name']},{transaction['account__name']}\n")
             
             filename = f"financial_report_{data['period']['start_date'].strftime('%Y%m%d')}_to_{data['period']['end_date'].strftime('%Y%m%d')}.csv"
-            email_msg.attach(filename, csv_content.getvalue(), 'text/csv')
+            attachment = (filename, csv_content.getvalue().encode(), 'text/csv')
         
         else:
             # Generate PDF
@@ -650,13 +604,13 @@ def send_financial_report_email(user_id, email, report_type='monthly', report_fo
             # Read the PDF content from the response
             response.seek(0)
             pdf_content = response.read()
-            email_msg.attach(filename, pdf_content, 'application/pdf')
+            attachment = (filename, pdf_content, 'application/pdf')
         
-        # Send email
-        email_msg.send()
+        # Delivered by the outbound email queue
+        queue_email(email, subject, message, user=user, attachment=attachment)
         
-        logger.info(f"Financial report emailed successfully to {email}")
-        return f"Report sent to {email}"
+        logger.info(f"Financial report queued for {email}")
+        return f"Report queued for {email}"
         
     except Exception as e:
         logger.error(f"Error sending financial report email: {str(e)}")
@@ -674,6 +628,7 @@ def sync_plaid_transactions(user_id, account_id=None, force_sync=False):
         from plaid.api_client import ApiClient
         from datetime import datetime, timedelta
         
+        started_at = timezone.now()
         user = User.objects.get(id=user_id)
         logger.info(f"Starting Plaid sync for user {user.email}")
         
@@ -702,6 +657,8 @@ def sync_plaid_transactions(user_id, account_id=None, force_sync=False):
         client = plaid_api.PlaidApi(api_client)
         
         total_synced = 0
+        category_resolver.warm()
+        engine = get_categorization_engine(user.id)
         
         for account in plaid_accounts:
             try:
@@ -749,23 +706,31 @@ def sync_plaid_transactions(user_id, account_id=None, force_sync=False):
                         # Determine transaction type
                         transaction_type = 'expense' if plaid_transaction['amount'] > 0 else 'income'
                         
-                        # Get or create category
-                        category_name = plaid_transaction['category'][0] if plaid_transaction['category'] else 'Other'
-                        category, created = Category.objects.get_or_create(
-                            user=user,
-                            name=category_name,
-                            defaults={'category_type': transaction_type}
-                        )
+                        # Resolve category from the warmed in-process map,
+                        # falling back to the rule engine when Plaid has none
+                        confidence = 0.0
+                        if plaid_transaction['category']:
+                            category_id = category_resolver.resolve_plaid(
+                                plaid_transaction['category'],
+                                category_type=transaction_type
+                            )
+                        else:
+                            category_id, confidence = engine.categorize(
+                                plaid_transaction['name'], plaid_transaction.get('merchant_name')
+                            )
+                            if not category_id:
+                                category_id = category_resolver.resolve_plaid(['Other'], category_type=transaction_type)
                         
                         # Create transaction
                         Transaction.objects.create(
                             user=user,
                             account=account,
-                            category=category,
+                            category_id=category_id,
                             description=plaid_transaction['name'],
                             amount=abs(plaid_transaction['amount']),
-                            type=transaction_type,
-                            date=plaid_transaction['date'],
+                            transaction_type=transaction_type,
+                            transaction_date=plaid_transaction['date'],
+                            categorization_confidence=confidence,
                             plaid_transaction_id=plaid_transaction['transaction_id'],
                             is_plaid_transaction=True
                         )
@@ -776,8 +741,9 @@ def sync_plaid_transactions(user_id, account_id=None, force_sync=False):
                         logger.error(f"Error creating transaction {plaid_transaction['transaction_id']}: {str(e)}")
                         continue
                 
-                # Update last sync time
+                # Update last sync time and book the next automatic sync
                 account.last_plaid_sync = timezone.now()
+                schedule_account(account, save=False)
                 account.save()
                 
                 total_synced += synced_count
@@ -801,6 +767,9 @@ def sync_plaid_transactions(user_id, account_id=None, force_sync=False):
                 logger.error(f"Error syncing account {account.id}: {str(e)}")
                 continue
         
+        if total_synced:
+            schedule_detection(user.id, started_at)
+        
         logger.info(f"Plaid sync completed. Total transactions synced: {total_synced}")
         return f"Synced {total_synced} transactions"
         
@@ -809,6 +778,52 @@ def sync_plaid_transactions(user_id, account_id=None, force_sync=False):
         raise
 
 
+@shared_task
+def sync_plaid_item(plaid_item_id):
+    """Cursor-sync only the accounts of one Plaid item (queued by webhooks)."""
+    from .models import PlaidItem
+    from .plaid_views import sync_account_with_cursor, clear_webhook_debounce
+    
+    # Webhooks arriving from here on should queue a fresh sync
+    clear_webhook_debounce(plaid_item_id)
+    
+    try:
+        plaid_item = PlaidItem.objects.get(plaid_item_id=plaid_item_id, is_active=True)
+    except PlaidItem.DoesNotExist:
+        return f"Plaid item {plaid_item_id} not found"
+    
+    if plaid_item.error_code:
+        logger.warning(f"Skipping sync for Plaid item {plaid_item_id} in error state {plaid_item.error_code}")
+        return f"Item in error state: {plaid_item.error_code}"
+    
+    accounts = Account.objects.filter(
+        plaid_item_id=plaid_item_id,
+        plaid_access_token__isnull=False,
+        is_active=True
+    ).select_related('user')
+    
+    started_at = timezone.now()
+    summary = {'transactions_added': 0, 'transactions_updated': 0}
+    
+    for account in accounts:
+        try:
+            sync_account_with_cursor(account, summary, started_at)
+            
+            account.last_sync = timezone.now()
+            account.last_plaid_sync = account.last_sync
+            schedule_account(account, save=False, webhook_driven=True)
+            account.save()
+            
+        except Exception as e:
+            logger.error(f"Error syncing account {account.id} for item {plaid_item_id}: {str(e)}")
+    
+    logger.info(
+        f"Item sync for {plaid_item_id} completed: {summary['transactions_added']} added, "
+        f"{summary['transactions_updated']} updated"
+    )
+    return f"Synced item {plaid_item_id}: {summary['transactions_added']} added, {summary['transactions_updated']} updated"
+
+
 @shared_task
 def disconnect_plaid_account(account_id):
     """Safely disconnect a Plaid account."""
@@ -839,25 +854,23 @@ def disconnect_plaid_account(account_id):
 
 @shared_task
 def auto_sync_all_plaid_accounts():
-    """Daily task to automatically sync all Plaid accounts."""
-    logger.info("Starting automatic Plaid sync for all users")
-    
-    # Get all users with Plaid accounts that have auto-sync enabled
-    users_with_plaid = User.objects.filter(
-        accounts__is_plaid_account=True,
-        accounts__auto_sync_enabled=True
-    ).distinct()
+    """Queue syncs for auto-sync Plaid accounts that are due.
+
+    Runs every few minutes; each account is only picked up once per its
+    sync_frequency, in the slot assigned by the sync scheduler.
+    """
+    logger.info("Starting automatic Plaid sync for due accounts")
     
-    total_synced = 0
+    due_accounts = claim_due_accounts()
+    total_queued = 0
     
-    for user in users_with_plaid:
+    for account in due_accounts:
         try:
-            result = sync_plaid_transactions.delay(user.id)
-            total_synced += 1
-            logger.info(f"Queued sync for user {user.email}")
+            sync_plaid_transactions.delay(account.user_id, account_id=account.id)
+            total_queued += 1
             
         except Exception as e:
-            logger.error(f"Error queueing sync for user {user.email}: {str(e)}")
+            logger.error(f"Error queueing sync for account {account.id}: {str(e)}")
     
-    logger.info(f"Queued automatic sync for {total_synced} users")
-    return f"Queued sync for {total_synced} users"
+    logger.info(f"Queued automatic sync for {total_queued} accounts")
+    return f"Queued sync for {total_queued} accounts"
@@ -1,3 +1,843 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from smtplib import SMTPException
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date
+from rest_framework.test import APIClient
+
+from . import notification_bulk
+from .cash_flow import build_forecast
+from .category_resolver import CategoryResolver
+from .email_queue import flush_email_queue, queue_email, queue_notification_email
+from .management.commands.explain_notification_indexes import hot_queries
+from .models import (
+    Account, Category, Notification, NotificationPreference, OutboundEmail, PlaidItem, RecurringSuggestion,
+    RecurringTransaction, SavingsGoal, StatementImport, Transaction, User, WeeklySummary,
+)
+from .plaid_service import PlaidService, plaid_service
+from .recurring import materialize_recurring_transactions, skip_missed_occurrences
+from .recurring_detection import detect_for_user, schedule_detection, take_detection_since
+from .response_cache import CHANGE_STAMP_KEY, _stamp_timeout, get_change_stamp
+from .savings_goals import update_savings_goals
+from .statement_import import (
+    StatementParseError, detect_date_order, parse_csv, parse_date, parse_ofx, parse_qif, run_statement_import,
+    transaction_fingerprint,
+)
+from .weekly_summary import get_weekly_summary, send_weekly_summaries
+
+
+def create_user(email='user@example.com'):
+    return User.objects.create_user(email=email, password='password', name='Test User', is_active=True)
+
+
+def create_account(user, balance='1000.00'):
+    return Account.objects.create(user=user, name='Checking', account_type='checking', balance=Decimal(balance))
+
+
+class CategoryResolverTests(TestCase):
+    def test_other_process_sees_renamed_and_deleted_categories(self):
+        groceries = Category.objects.create(name='Groceries', category_type='expense')
+        coffee = Category.objects.create(name='Coffee Shop', category_type='expense')
+        # Another process's resolver: signals here don't reach its map
+        worker = CategoryResolver()
+        worker.warm()
+        self.assertEqual(worker.get('groceries', 'expense'), groceries.id)
+
+        coffee.delete()
+        groceries.name = 'Supermarkets'
+        groceries.save()
+        worker.warm()
+
+        self.assertIsNone(worker.get('coffee shop', 'expense'))
+        self.assertIsNone(worker.get('groceries', 'expense'))
+        self.assertEqual(worker.get('supermarkets', 'expense'), groceries.id)
+
+    def test_plaid_category_types_resolve_separately(self):
+        resolver = CategoryResolver()
+        resolver.warm()
+
+        income_id = resolver.resolve_plaid(['Transfer', 'Payroll'], category_type='income')
+        expense_id = resolver.resolve_plaid(['Transfer', 'Payroll'], category_type='expense')
+
+        self.assertNotEqual(income_id, expense_id)
+        self.assertEqual(Category.objects.get(id=income_id).category_type, 'income')
+        self.assertEqual(resolver.resolve_plaid(['Payroll'], category_type='income'), income_id)
+
+
+class TransactionCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.account = create_account(self.user)
+        for day, amount in [(1, '30.00'), (2, '10.00'), (3, '20.00')]:
+            Transaction.objects.create(
+                user=self.user, account=self.account, amount=Decimal(amount), transaction_type='expense',
+                transaction_date=date(2025, 3, day),
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('transactions-list')
+
+    def dates(self, response):
+        return [row['transaction_date'] for row in response.data['results']]
+
+    def test_pages_follow_date_order(self):
+        response = self.client.get(self.url, {'pagination': 'cursor', 'page_size': 2, 'ordering': 'transaction_date'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.dates(response), ['2025-03-01', '2025-03-02'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.dates(response), ['2025-03-03'])
+        self.assertIsNone(response.data['next'])
+
+    def test_other_orderings_are_rejected(self):
+        for ordering in ('amount', '-created_at'):
+            response = self.client.get(self.url, {'pagination': 'cursor', 'ordering': ordering})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('ordering', response.data)
+
+        # Page-number mode still orders by any allowed field
+        response = self.client.get(self.url, {'ordering': 'amount'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.dates(response), ['2025-03-02', '2025-03-03', '2025-03-01'])
+
+
+class StatementParserTests(SimpleTestCase):
+    def test_csv_amount_and_debit_credit_columns(self):
+        rows = list(parse_csv(io.StringIO(
+            'Date,Description,Amount,Memo\n'
+            '03/04/2024,STARBUCKS #123,"(4.50)",card\n'
+            '03/05/2024,Payroll,"1,200.00",\n'
+        )))
+        self.assertEqual(rows, [
+            ('03/04/2024', Decimal('-4.50'), 'STARBUCKS #123', 'card'),
+            ('03/05/2024', Decimal('1200.00'), 'Payroll', ''),
+        ])
+
+        rows = list(parse_csv(io.StringIO(
+            'Posted Date,Payee,Debit,Credit\n'
+            '2024-03-04,Rent,800.00,\n'
+            '2024-03-05,Refund,,12.00\n'
+        )))
+        self.assertEqual([row[1] for row in rows], [Decimal('-800.00'), Decimal('12.00')])
+
+    def test_csv_without_amount_column_is_rejected(self):
+        with self.assertRaises(StatementParseError):
+            list(parse_csv(io.StringIO('Date,Description\n2024-03-04,Rent\n')))
+
+    def test_ofx_sgml_and_single_line_xml(self):
+        sgml = (
+            'OFXHEADER:100\n<OFX>\n<BANKTRANLIST>\n<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20240304120000\n'
+            '<TRNAMT>-4.50\n<NAME>STARBUCKS\n<MEMO>card\n</STMTTRN>\n</BANKTRANLIST>\n</OFX>\n'
+        )
+        xml = (
+            '<OFX><STMTTRN><DTPOSTED>20240305</DTPOSTED><TRNAMT>1200.00</TRNAMT>'
+            '<MEMO>Payroll</MEMO></STMTTRN></OFX>'
+        )
+        self.assertEqual(list(parse_ofx(io.StringIO(sgml))), [('20240304', '-4.50', 'STARBUCKS', 'card')])
+        self.assertEqual(list(parse_ofx(io.StringIO(xml))), [('20240305', '1200.00', 'Payroll', '')])
+
+    def test_qif_records(self):
+        qif = '!Type:Bank\nD03/04/2024\nT-4.50\nPSTARBUCKS\nMcard\n^\nD03/05/2024\nU1,200.00\nMPayroll\n'
+        self.assertEqual(list(parse_qif(io.StringIO(qif))), [
+            ('03/04/2024', '-4.50', 'STARBUCKS', 'card'),
+            ('03/05/2024', '1,200.00', 'Payroll', ''),
+        ])
+
+    def test_date_order_detection(self):
+        self.assertEqual(detect_date_order(['03/04/2024', '25/04/2024']), 'dmy')
+        self.assertEqual(detect_date_order(['2024-03-04', '04/25/2024']), 'mdy')
+        self.assertEqual(detect_date_order(['03/04/2024', 'not a date']), 'mdy')
+
+        self.assertEqual(parse_date('03/04/2024'), date(2024, 3, 4))
+        self.assertEqual(parse_date('03/04/2024', 'dmy'), date(2024, 4, 3))
+        self.assertEqual(parse_date('2024-03-04', 'dmy'), date(2024, 3, 4))
+        self.assertIsNone(parse_date('25/04/2024'))
+
+    def test_fingerprint_ignores_description_formatting(self):
+        self.assertEqual(
+            transaction_fingerprint(1, date(2024, 3, 4), Decimal('-4.5'), 'Starbucks & Co.'),
+            transaction_fingerprint(1, date(2024, 3, 4), Decimal('-4.50'), 'STARBUCKS and co'),
+        )
+        self.assertNotEqual(
+            transaction_fingerprint(1, date(2024, 3, 4), Decimal('-4.50'), 'Starbucks'),
+            transaction_fingerprint(1, date(2024, 3, 4), Decimal('4.50'), 'Starbucks'),
+        )
+
+
+class StatementImportTests(TestCase):
+    csv_content = (
+        b'Date,Description,Amount\n'
+        b'04/03/2024,Coffee,-4.50\n'
+        b'04/03/2024,Coffee,-4.50\n'
+        b'25/03/2024,Salary,2000.00\n'
+        b'not a date,Broken,1.00\n'
+    )
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.user = create_user()
+        self.account = create_account(self.user)
+
+    def run_import(self):
+        job = StatementImport.objects.create(
+            user=self.user, account=self.account, file_format='csv',
+            file=SimpleUploadedFile('statement.csv', self.csv_content),
+        )
+        self.file_name = job.file.name
+        return run_statement_import(job)
+
+    def test_import_detects_day_first_dates_and_deletes_the_file(self):
+        job = self.run_import()
+
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.date_order, 'dmy')
+        self.assertEqual((job.rows_processed, job.rows_imported, job.rows_failed), (4, 3, 1))
+        self.assertEqual(
+            sorted(Transaction.objects.filter(account=self.account).values_list('transaction_date', flat=True)),
+            [date(2024, 3, 4), date(2024, 3, 4), date(2024, 3, 25)],
+        )
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('2991.00'))
+        self.assertFalse(default_storage.exists(self.file_name))
+        self.assertFalse(StatementImport.objects.get(id=job.id).file)
+
+    def test_reimport_counts_duplicates(self):
+        self.run_import()
+        job = self.run_import()
+
+        self.assertEqual((job.rows_imported, job.rows_duplicate), (0, 3))
+        self.assertEqual(Transaction.objects.filter(account=self.account).count(), 3)
+
+    def test_failed_import_deletes_the_file(self):
+        self.csv_content = b'Date,Description\n04/03/2024,Coffee\n'
+        job = self.run_import()
+
+        self.assertEqual(job.status, 'failed')
+        self.assertFalse(default_storage.exists(self.file_name))
+        self.assertFalse(StatementImport.objects.get(id=job.id).file)
+
+
+class NotificationBulkTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.other = create_user('other@example.com')
+        for user in (self.user, self.other):
+            Notification.objects.bulk_create([
+                Notification(user=user, notification_type='ai_insight', title=f'Insight {i}', message='')
+                for i in range(5)
+            ])
+
+    def test_delete_in_batches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted = notification_bulk.delete(Notification.objects.filter(user=self.user), batch_size=2)
+
+        self.assertEqual(deleted, 5)
+        self.assertFalse(Notification.objects.filter(user=self.user).exists())
+        self.assertEqual(Notification.objects.filter(user=self.other).count(), 5)
+
+    def test_delete_sends_no_per_row_signals(self):
+        with mock.patch('api.notification_bulk.bump_change_stamp') as bump, \
+                mock.patch('api.notification_stream.publish_notification_change') as publish_row:
+            notification_bulk.delete(Notification.objects.filter(user=self.user), batch_size=2)
+
+        bump.assert_called_once_with(self.user.id, 'notifications')
+        publish_row.assert_not_called()
+
+    def test_purge_only_old_read_notifications(self):
+        old = timezone.now() - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS + 1)
+        ids = list(Notification.objects.filter(user=self.user).values_list('id', flat=True))
+        Notification.objects.filter(id__in=ids[:3]).update(read_at=old, status='read')
+        Notification.objects.filter(id=ids[3]).update(read_at=timezone.now(), status='read')
+
+        self.assertEqual(notification_bulk.purge_read_notifications(batch_size=2), 3)
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', "EXPLAIN plans are checked on PostgreSQL only")
+class NotificationIndexPlanTests(TestCase):
+    def test_hot_queries_use_their_indexes(self):
+        user = create_user()
+        Notification.objects.bulk_create([
+            Notification(user=user, notification_type='ai_insight', title=f'Insight {i}', message='')
+            for i in range(50)
+        ])
+        with connection.cursor() as cursor:
+            # Lasts until the test's transaction ends; a tiny table would otherwise be scanned
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        for label, queryset, index_name in hot_queries(user):
+            with self.subTest(label):
+                self.assertIn(index_name, queryset.explain())
+
+
+class EmailQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+
+    @override_settings(EMAIL_QUEUE_DOMAIN_RATE_LIMITS={'example.com': 2})
+    def test_domain_rate_limit_defers_the_rest_to_next_minute(self):
+        for i in range(5):
+            queue_email(f'user{i}@example.com', 'Hello', 'Body')
+        queue_email('user@other.com', 'Hello', 'Body')
+
+        counts = flush_email_queue()
+
+        self.assertEqual(counts['sent'], 3)
+        self.assertEqual(counts['deferred'], 3)
+        self.assertEqual(len(mail.outbox), 3)
+        deferred = OutboundEmail.objects.filter(status='pending')
+        self.assertEqual(deferred.count(), 3)
+        self.assertTrue(all(email.attempts == 0 for email in deferred))
+        self.assertTrue(all(email.next_attempt_at > timezone.now() for email in deferred))
+
+    def test_failed_send_is_retried_with_backoff(self):
+        email = queue_email('user@example.com', 'Hello', 'Body')
+
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=SMTPException('rejected')):
+            counts = flush_email_queue()
+
+        email.refresh_from_db()
+        self.assertEqual(counts['retried'], 1)
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('rejected', email.last_error)
+        self.assertGreater(
+            email.next_attempt_at,
+            timezone.now() + timedelta(seconds=settings.EMAIL_QUEUE_RETRY_BACKOFF - 5),
+        )
+
+        # Not due again until the backoff has passed
+        self.assertEqual(flush_email_queue()['sent'], 0)
+
+    def test_delivery_marks_notification_sent(self):
+        notification = Notification.objects.create(
+            user=self.user, notification_type='budget_warning', title='Budget', message='Over budget'
+        )
+        queue_notification_email(notification)
+
+        # Queuing alone does not mark it sent
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'pending')
+
+        flush_email_queue()
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'sent')
+        self.assertIsNotNone(notification.sent_at)
+
+    def test_giving_up_marks_notification_failed(self):
+        notification = Notification.objects.create(
+            user=self.user, notification_type='budget_warning', title='Budget', message='Over budget'
+        )
+        email = queue_notification_email(notification)
+        OutboundEmail.objects.filter(id=email.id).update(attempts=settings.EMAIL_QUEUE_MAX_ATTEMPTS - 1)
+
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=SMTPException('rejected')):
+            counts = flush_email_queue()
+
+        email.refresh_from_db()
+        notification.refresh_from_db()
+        self.assertEqual(counts['failed'], 1)
+        self.assertEqual(email.status, 'failed')
+        self.assertEqual(notification.status, 'failed')
+
+
+@override_settings(PLAID_WEBHOOK_SECRET='webhook-secret')
+class PlaidWebhookTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.account = create_account(self.user)
+        PlaidItem.objects.create(
+            user=self.user, plaid_item_id='item-1', access_token='access-token',
+            institution_id='ins_1', institution_name='Test Bank',
+        )
+        Transaction.objects.create(
+            user=self.user, account=self.account, amount=Decimal('40.00'), transaction_type='expense',
+            transaction_date=date(2025, 3, 1), plaid_transaction_id='txn-1',
+        )
+
+    body = json.dumps({
+        'webhook_type': 'TRANSACTIONS',
+        'webhook_code': 'TRANSACTIONS_REMOVED',
+        'item_id': 'item-1',
+        'removed_transactions': ['txn-1'],
+    })
+
+    def post(self, query='', **headers):
+        return self.client.post(
+            reverse('plaid_webhook') + query, self.body, content_type='application/json', **headers
+        )
+
+    def post_signed(self, signed_body=None, issued_at=None):
+        """Post with a Plaid-Verification JWT signed by a key Plaid would return."""
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        public_jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(private_key.public_key()))
+        token = jwt.encode(
+            {
+                'iat': int(time.time()) if issued_at is None else issued_at,
+                'request_body_sha256': hashlib.sha256((signed_body or self.body).encode()).hexdigest(),
+            },
+            private_key,
+            algorithm='ES256',
+            headers={'kid': 'key-1'},
+        )
+        with mock.patch.object(plaid_service, 'get_webhook_verification_key', return_value=public_jwk) as get_key:
+            response = self.post(HTTP_PLAID_VERIFICATION=token)
+        get_key.assert_called_once_with('key-1')
+        return response
+
+    def test_missing_or_wrong_secret_is_rejected(self):
+        self.assertEqual(self.post().status_code, 401)
+        self.assertEqual(self.post('?secret=wrong').status_code, 401)
+        self.assertEqual(self.post(HTTP_PLAID_VERIFICATION='not-a-jwt').status_code, 401)
+        self.assertTrue(Transaction.objects.filter(plaid_transaction_id='txn-1').exists())
+
+    @override_settings(PLAID_WEBHOOK_SECRET='')
+    def test_rejected_without_configured_secret(self):
+        self.assertEqual(self.post('?secret=').status_code, 401)
+
+    def test_removed_transactions_reverse_their_balance(self):
+        response = self.post('?secret=webhook-secret')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Transaction.objects.filter(plaid_transaction_id='txn-1').exists())
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('1040.00'))
+
+    def test_signed_jwt_is_accepted(self):
+        self.assertEqual(self.post_signed().status_code, 200)
+        self.assertFalse(Transaction.objects.filter(plaid_transaction_id='txn-1').exists())
+
+    def test_jwt_for_another_body_is_rejected(self):
+        self.assertEqual(self.post_signed(signed_body='{}').status_code, 401)
+
+    def test_stale_jwt_is_rejected(self):
+        self.assertEqual(self.post_signed(issued_at=int(time.time()) - 10 * 60).status_code, 401)
+
+    @override_settings(PLAID_CLIENT_ID='', PLAID_SECRET='')
+    def test_no_verification_key_without_plaid_credentials(self):
+        self.assertIsNone(PlaidService().get_webhook_verification_key('key-1'))
+
+
+class RecurringMaterializerTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.account = create_account(self.user)
+
+    def create_template(self, **fields):
+        values = {
+            'user': self.user,
+            'account': self.account,
+            'amount': Decimal('50.00'),
+            'transaction_type': 'expense',
+            'description': 'Rent',
+            'frequency': 'monthly',
+            'start_date': date(2025, 1, 31),
+            'next_due_date': date(2025, 1, 31),
+        }
+        values.update(fields)
+        return RecurringTransaction.objects.create(**values)
+
+    def test_month_end_start_is_clamped_to_shorter_months(self):
+        template = self.create_template()
+
+        created = materialize_recurring_transactions(today=date(2025, 4, 30))
+
+        self.assertEqual(created, 4)
+        self.assertEqual(
+            list(Transaction.objects.filter(user=self.user).order_by('transaction_date')
+                 .values_list('transaction_date', flat=True)),
+            [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)],
+        )
+        template.refresh_from_db()
+        self.assertEqual(template.next_due_date, date(2025, 5, 31))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('800.00'))
+
+    def test_rerun_is_idempotent(self):
+        self.create_template()
+
+        materialize_recurring_transactions(today=date(2025, 4, 30))
+        self.assertEqual(materialize_recurring_transactions(today=date(2025, 4, 30)), 0)
+
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 4)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('800.00'))
+
+    def test_unknown_frequency_is_skipped(self):
+        template = self.create_template(frequency='biweekly')
+
+        self.assertEqual(materialize_recurring_transactions(today=date(2025, 4, 30)), 0)
+
+        template.refresh_from_db()
+        self.assertEqual(template.next_due_date, date(2025, 1, 31))
+
+    def test_tracking_template_advances_without_creating_rows(self):
+        template = self.create_template(creates_transactions=False)
+
+        self.assertEqual(materialize_recurring_transactions(today=date(2025, 4, 30)), 0)
+
+        template.refresh_from_db()
+        self.assertEqual(template.next_due_date, date(2025, 5, 31))
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+    def test_upgrade_skips_occurrences_before_deploy(self):
+        # Created before materialization existed, never advanced since
+        stale = self.create_template(start_date=date(2024, 10, 1), next_due_date=date(2024, 10, 1))
+        ended = self.create_template(
+            start_date=date(2024, 10, 1), next_due_date=date(2024, 10, 1), end_date=date(2025, 1, 1)
+        )
+        current = self.create_template(start_date=date(2025, 5, 1), next_due_date=date(2025, 5, 1))
+
+        # What migration 0028 does on a deploy on 2025-04-15
+        self.assertEqual(skip_missed_occurrences(RecurringTransaction.objects.all(), date(2025, 4, 15)), 2)
+
+        for template in (stale, ended, current):
+            template.refresh_from_db()
+        self.assertEqual((stale.next_due_date, stale.is_active), (date(2025, 5, 1), True))
+        self.assertFalse(ended.is_active)
+        self.assertEqual(current.next_due_date, date(2025, 5, 1))
+        # The first nightly run after it back-fills nothing
+        self.assertEqual(materialize_recurring_transactions(today=date(2025, 4, 15)), 0)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('1000.00'))
+
+
+class RecurringDetectionTests(TestCase):
+    today = date(2025, 6, 20)
+
+    def setUp(self):
+        self.user = create_user()
+        self.account = create_account(self.user)
+
+    def create_transactions(self, amounts, merchant_name):
+        for i, amount in enumerate(amounts):
+            Transaction.objects.create(
+                user=self.user, account=self.account, amount=Decimal(amount), transaction_type='expense',
+                transaction_date=date(2025, 1 + i, 15), merchant_name=merchant_name,
+            )
+
+    def test_monthly_series_is_suggested(self):
+        self.create_transactions(['15.49'] * 6, 'NETFLIX.COM 8845')
+
+        flagged, created = detect_for_user(self.user.id, today=self.today)
+
+        self.assertEqual((flagged, created), (6, 1))
+        suggestion = RecurringSuggestion.objects.get(user=self.user)
+        self.assertEqual(suggestion.merchant_key, 'netflix')
+        self.assertEqual(suggestion.frequency, 'monthly')
+        self.assertEqual(suggestion.amount, Decimal('15.49'))
+        self.assertEqual(suggestion.next_due_date, date(2025, 7, 15))
+
+    def test_varying_amounts_are_not_a_series(self):
+        self.create_transactions(['12.00', '85.30', '40.10', '150.00', '23.75', '64.20'], 'Corner Grocery')
+
+        self.assertEqual(detect_for_user(self.user.id, today=self.today), (0, 0))
+        self.assertFalse(RecurringSuggestion.objects.filter(user=self.user).exists())
+
+    def test_scheduled_run_covers_a_long_sync_from_its_start(self):
+        cache.clear()
+        now = timezone.now()
+        today = timezone.localdate()
+        for months_ago in range(6):
+            Transaction.objects.create(
+                user=self.user, account=self.account, amount=Decimal('15.49'), transaction_type='expense',
+                transaction_date=today - timedelta(days=30 * months_ago), merchant_name='NETFLIX.COM 8845',
+            )
+        # Inserted early in a sync that ran for longer than DETECTION_DELAY
+        Transaction.objects.filter(user=self.user).update(created_at=now - timedelta(minutes=20))
+
+        with mock.patch('api.tasks.detect_recurring_for_user.apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                schedule_detection(self.user.id, now - timedelta(minutes=5))
+            # A sync that started earlier lands while that run is pending
+            with self.captureOnCommitCallbacks(execute=True):
+                schedule_detection(self.user.id, now - timedelta(minutes=30))
+        apply_async.assert_called_once_with(args=[self.user.id], countdown=mock.ANY)
+
+        since = take_detection_since(self.user.id)
+        self.assertEqual(since, now - timedelta(minutes=30))
+        self.assertIsNone(take_detection_since(self.user.id))
+        self.assertEqual(detect_for_user(self.user.id, today=today, since=since), (6, 1))
+
+
+class CashFlowForecastTests(TestCase):
+    today = date(2025, 6, 20)
+
+    def setUp(self):
+        self.user = create_user()
+        self.account = create_account(self.user)
+
+    def account_forecast(self, horizon_days=14):
+        forecast = build_forecast(self.user.id, horizon_days, today=self.today)
+        return next(account for account in forecast['accounts'] if account['account_id'] == self.account.id)
+
+    def test_scheduled_and_residual_flows(self):
+        RecurringTransaction.objects.create(
+            user=self.user, account=self.account, amount=Decimal('100.00'), transaction_type='expense',
+            description='Gym', frequency='monthly', start_date=date(2025, 5, 25), next_due_date=date(2025, 6, 25),
+        )
+        # Two weeks of history: averaged over two weeks, not RESIDUAL_WEEKS
+        Transaction.objects.create(
+            user=self.user, account=self.account, amount=Decimal('70.00'), transaction_type='expense',
+            transaction_date=self.today - timedelta(days=14),
+        )
+
+        forecast = self.account_forecast()
+
+        self.assertEqual(forecast['scheduled_total'], -100.0)
+        # The history weekday comes up twice in the 14 forecast days: 2 x 70 / 2
+        self.assertEqual(forecast['unscheduled_total'], -70.0)
+        self.assertEqual(forecast['balances'][-1], 830.0)
+        self.assertEqual(forecast['lowest_balance'], 830.0)
+
+    def test_recurring_rows_stay_in_residual_unless_scheduled(self):
+        Transaction.objects.create(
+            user=self.user, account=self.account, amount=Decimal('20.00'), transaction_type='expense',
+            transaction_date=self.today - timedelta(days=7), merchant_name='Spotify', is_recurring=True,
+        )
+        suggestion = RecurringSuggestion.objects.create(
+            user=self.user, account=self.account, merchant_key='spotify', description='Spotify',
+            amount=Decimal('20.00'), transaction_type='expense', frequency='monthly', occurrences=3,
+            last_date=self.today - timedelta(days=7), next_due_date=self.today + timedelta(days=23),
+        )
+        self.assertEqual(self.account_forecast()['unscheduled_total'], 0.0)
+
+        suggestion.status = 'dismissed'
+        suggestion.save()
+        self.assertEqual(self.account_forecast()['unscheduled_total'], -40.0)
+
+
+class WeeklySummaryTests(TestCase):
+    week_start = date(2025, 3, 3)  # Monday
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.account = create_account(self.user)
+        self.add_expense(date(2025, 3, 7), '30.00')
+
+    def add_expense(self, transaction_date, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(
+                user=self.user, account=self.account, amount=Decimal(amount), transaction_type='expense',
+                transaction_date=transaction_date,
+            )
+
+    def summary_on(self, today):
+        with mock.patch('django.utils.timezone.localdate', return_value=today):
+            return get_weekly_summary(self.user.id, self.week_start)
+
+    def test_week_is_computed_live_until_settled(self):
+        self.assertEqual(self.summary_on(date(2025, 3, 10))['total_expenses'], Decimal('30.00'))
+        self.assertFalse(WeeklySummary.objects.exists())
+
+        # Posted by the bank on Tuesday, dated the Sunday before
+        self.add_expense(date(2025, 3, 9), '12.50')
+        self.assertEqual(self.summary_on(date(2025, 3, 12))['total_expenses'], Decimal('42.50'))
+        self.assertFalse(WeeklySummary.objects.exists())
+
+        self.assertEqual(self.summary_on(date(2025, 3, 13))['total_expenses'], Decimal('42.50'))
+        self.assertEqual(WeeklySummary.objects.get(user=self.user).total_expenses, Decimal('42.50'))
+
+        # Settled weeks are frozen
+        self.add_expense(date(2025, 3, 8), '5.00')
+        self.assertEqual(self.summary_on(date(2025, 3, 14))['total_expenses'], Decimal('42.50'))
+
+    def test_monday_job_does_not_store_the_unsettled_week(self):
+        NotificationPreference.objects.create(
+            user=self.user, notification_type='weekly_summary', delivery_method='in_app',
+        )
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2025, 3, 10)):
+            self.assertEqual(send_weekly_summaries(), 1)
+
+        self.assertFalse(WeeklySummary.objects.exists())
+        self.assertEqual(Notification.objects.get(user=self.user).data['total_expenses'], 30.0)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.account = create_account(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('transactions-analytics')
+
+    def test_cached_until_data_changes(self):
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(
+                user=self.user, account=self.account, amount=Decimal('5.00'), transaction_type='expense',
+                transaction_date=timezone.now().date(),
+            )
+
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+
+    @override_settings(USER_RESPONSE_CACHE_ENABLED=False)
+    def test_disabled(self):
+        self.assertFalse(self.client.get(self.url).has_header('X-Cache'))
+
+    @override_settings(USER_RESPONSE_LOCAL_STAMP_TIMEOUT=30)
+    def test_local_stamps_expire(self):
+        # Another process's change is never seen here; the stamp expiring is
+        stamp = get_change_stamp(self.user.id)
+        self.assertEqual(get_change_stamp(self.user.id), stamp)
+
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=time.time() + 31):
+            self.assertGreater(get_change_stamp(self.user.id), stamp)
+
+    def test_shared_cache_stamps_do_not_expire(self):
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with self.settings(CACHES=shared):
+            self.assertIsNone(_stamp_timeout())
+
+
+class ConditionalResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.account = create_account(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('cash_flow_forecast')
+
+    def test_not_modified_until_data_changes(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(
+                user=self.user, account=self.account, amount=Decimal('5.00'), transaction_type='expense',
+                transaction_date=timezone.now().date(),
+            )
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_query_string(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, {'days': 30}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(USER_RESPONSE_CACHE_ENABLED=False)
+    def test_etag_without_response_cache(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def set_stamp(self, seconds_ago):
+        key = CHANGE_STAMP_KEY.format(kind='data', user_id=self.user.id)
+        cache.set(key, time.time_ns() // 1000 - int(seconds_ago * 1_000_000))
+
+    def test_last_modified(self):
+        self.set_stamp(5)
+        last_modified = self.client.get(self.url)['Last-Modified']
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['Last-Modified'], last_modified)
+
+        earlier = http_date(parse_http_date(last_modified) - 1)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=earlier).status_code, 200)
+
+    def test_if_none_match_takes_precedence(self):
+        self.set_stamp(5)
+        last_modified = self.client.get(self.url)['Last-Modified']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='W/"stale"', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_no_last_modified_within_the_changed_second(self):
+        # Not yet a whole second old, even if the test crosses a second boundary
+        self.set_stamp(-1)
+        response = self.client.get(self.url)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+
+class SavingsGoalProgressTests(TestCase):
+    today = date(2025, 4, 30)
+
+    def setUp(self):
+        self.user = create_user()
+        self.account = create_account(self.user)
+        self.dining = Category.objects.create(name='Dining', category_type='expense')
+        # A 300.00 baseline: 300.00 a month from January to March
+        for month in (1, 2, 3):
+            self.spend('300.00', date(2025, month, 15))
+
+    def spend(self, amount, transaction_date):
+        Transaction.objects.create(
+            user=self.user, account=self.account, category=self.dining, amount=Decimal(amount),
+            transaction_type='expense', transaction_date=transaction_date,
+        )
+
+    def create_goal(self, created):
+        goal = SavingsGoal.objects.create(
+            user=self.user, title='Holiday', target_amount=Decimal('5000.00'), target_date=date(2025, 12, 31),
+        )
+        goal.target_categories.add(self.dining)
+        SavingsGoal.objects.filter(id=goal.id).update(
+            created_at=timezone.make_aware(timezone.datetime.combine(created, timezone.datetime.min.time()))
+        )
+        return goal
+
+    def test_first_month_counts_from_creation(self):
+        # Spent before the goal existed, so it neither counts nor reduces the credit
+        self.spend('100.00', date(2025, 4, 10))
+        goal = self.create_goal(date(2025, 4, 28))
+
+        update_savings_goals(today=self.today)
+
+        # 3 of April's 30 days of the baseline, nothing spent since
+        goal.refresh_from_db()
+        self.assertEqual(goal.current_amount, Decimal('30.00'))
+
+    def test_rerun_is_idempotent_with_fixed_queries(self):
+        self.spend('100.00', date(2025, 4, 10))
+        goals = [self.create_goal(date(2025, 1, 1)) for _ in range(3)]
+
+        update_savings_goals(today=self.today)
+        # Chunk ids, savepoint, goals, categories, spending, stored periods, release, last chunk: no writes
+        with self.assertNumQueries(8):
+            self.assertEqual(update_savings_goals(today=self.today), 0)
+
+        for goal in goals:
+            goal.refresh_from_db()
+            # March: 300.00 - 300.00, April: 300.00 - 100.00
+            self.assertEqual(goal.current_amount, Decimal('200.00'))
@@ -1,9 +1,11 @@
-from rest_framework import status, generics, permissions, viewsets, filters
+from rest_framework import status, generics, permissions, viewsets, filters, mixins
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.db import transaction as db_transaction
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django_filters.rest_framework import DjangoFilterBackend
@@ -11,12 +13,21 @@ from .serializers import (
     UserSerializer, UserProfileSerializer, LoginSerializer, CategorySerializer, AccountSerializer,
     TransactionSerializer, BudgetSerializer, RecurringTransactionSerializer,
     NotificationSerializer, NotificationPreferenceSerializer, AIInsightSerializer,
-    SavingsGoalSerializer, ExpensePredictionSerializer, WeeklySummarySerializer
+    SavingsGoalSerializer, ExpensePredictionSerializer, WeeklySummarySerializer,
+    TransactionListSerializer, TransactionBulkItemSerializer, default_transaction_description,
+    StatementImportSerializer, NotificationBulkActionSerializer
 )
-from .models import User, Category, Account, Transaction, Budget, RecurringTransaction
+from .models import User, Category, Account, Transaction, Budget, RecurringTransaction, StatementImport
 from .notification_models import Notification, NotificationPreference, AIInsight, SavingsGoal
 from .utils import send_verification_email, send_password_reset_email
 from .reports import FinancialReportGenerator, WeeklyReportGenerator, MonthlyReportGenerator
+from .categorization import get_engine as get_categorization_engine, categorize_transactions
+from .pagination import KeysetPagination, TransactionPagination
+from .search import TransactionSearchFilter, search_transactions
+from .ledger import BalanceDeltas
+from . import notification_bulk
+from .weekly_summary import get_weekly_summary
+from .response_cache import bump_data_version, cache_user_response, conditional_user_response
 from rest_framework.permissions import AllowAny
 from django.shortcuts import get_object_or_404
 from decimal import Decimal
@@ -290,14 +301,14 @@ class UserProfileView(APIView):
 # Removed duplicate import - already imported at the top
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncMonth, TruncDay
+from django.db.models import Sum, Count, F, Q
+from django.db.models.functions import TruncMonth, TruncWeek, TruncDay
 from datetime import datetime, timedelta
 from decimal import Decimal
-from .models import Category, Account, Transaction, Budget, RecurringTransaction
+from .models import Category, Account, Transaction, Budget, RecurringTransaction, RecurringSuggestion, CategoryRule
 from .serializers import (
-    CategorySerializer, AccountSerializer, TransactionSerializer, 
-    TransactionCreateSerializer, BudgetSerializer, RecurringTransactionSerializer,
+    CategorySerializer, CategoryRuleSerializer, AccountSerializer, TransactionSerializer, 
+    TransactionCreateSerializer, BudgetSerializer, RecurringTransactionSerializer, RecurringSuggestionSerializer,
     TransactionAnalyticsSerializer, CategoryAnalyticsSerializer
 )
 
@@ -313,6 +324,40 @@ class CategoryViewSet(viewsets.ModelViewSet):
         # Return only default categories (shared across all users)
         return Category.objects.filter(is_default=True).order_by('name')
 
+class CategoryRuleViewSet(viewsets.ModelViewSet):
+    """ViewSet for managing the user's auto-categorization rules."""
+    serializer_class = CategoryRuleSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['rule_type', 'category']
+    
+    def get_queryset(self):
+        return CategoryRule.objects.filter(user=self.request.user).select_related('category')
+    
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+class StatementImportViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """Upload bank statements (CSV/OFX/QIF) and poll their import status."""
+    serializer_class = StatementImportSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+    
+    def get_queryset(self):
+        return StatementImport.objects.filter(user=self.request.user).select_related('account')
+    
+    def perform_create(self, serializer):
+        from .statement_import import detect_format
+        from .tasks import import_statement
+        
+        upload = serializer.validated_data['file']
+        job = serializer.save(
+            user=self.request.user,
+            file_format=serializer.validated_data.get('file_format') or detect_format(upload.name),
+            bytes_total=upload.size,
+        )
+        import_statement.delay(job.id)
+
 class AccountViewSet(viewsets.ModelViewSet):
     """ViewSet for managing user accounts."""
     serializer_class = AccountSerializer
@@ -345,14 +390,35 @@ class AccountViewSet(viewsets.ModelViewSet):
         return Response({'error': 'Balance is required'}, 
                        status=status.HTTP_400_BAD_REQUEST)
 
+# granularity -> (truncation, number of buckets the trend covers at least)
+ANALYTICS_GRANULARITIES = {
+    'day': (TruncDay, 30),
+    'week': (TruncWeek, 12),
+    'month': (TruncMonth, 6),
+}
+
+def _trend_window_start(end_date, granularity, buckets):
+    """First day of the oldest bucket in a trend of `buckets` buckets ending at end_date."""
+    if granularity == 'day':
+        return end_date - timedelta(days=buckets - 1)
+    if granularity == 'week':
+        week_start = end_date - timedelta(days=end_date.weekday())
+        return week_start - timedelta(weeks=buckets - 1)
+    month_index = end_date.year * 12 + end_date.month - 1 - (buckets - 1)
+    return end_date.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+
 class TransactionViewSet(viewsets.ModelViewSet):
     """ViewSet for managing transactions."""
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [TransactionSearchFilter, DjangoFilterBackend, filters.OrderingFilter]
     search_fields = ['description', 'merchant_name', 'notes']
     filterset_fields = ['transaction_type', 'category', 'account']
     ordering_fields = ['transaction_date', 'amount', 'created_at']
     ordering = ['-transaction_date', '-created_at']
+    search_result_limit = 50
+    max_bulk_items = 1000
+    max_search_result_limit = 200
+    pagination_class = TransactionPagination
     
     def get_queryset(self):
         queryset = Transaction.objects.filter(user=self.request.user).select_related(
@@ -375,6 +441,47 @@ class TransactionViewSet(viewsets.ModelViewSet):
             return TransactionCreateSerializer
         return TransactionSerializer
     
+    def get_requested_fields(self):
+        """Field names from ?fields=a,b,c, or None when not given."""
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+        return [field.strip() for field in fields.split(',') if field.strip()]
+    
+    def get_serializer(self, *args, **kwargs):
+        if self.action == 'retrieve':
+            kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+    
+    @conditional_user_response('transaction-list')
+    def list(self, request, *args, **kwargs):
+        """List transactions; ?fields= or ?view=slim switch to a .values() projection."""
+        fields = self.get_requested_fields()
+        if fields is None and request.query_params.get('view') != 'slim':
+            return super().list(request, *args, **kwargs)
+        
+        available = set(TransactionListSerializer.VALUES) | set(TransactionListSerializer.DERIVED)
+        unknown = [field for field in fields or [] if field not in available]
+        if unknown:
+            return Response(
+                {'error': f"Unknown fields: {', '.join(unknown)}", 'available_fields': sorted(available)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        plain, aliased = TransactionListSerializer.projection(fields)
+        # Keyset cursors are built from these, whether requested or not
+        plain = sorted(set(plain) | set(KeysetPagination.keyset_fields))
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *plain, **{alias: F(lookup) for alias, lookup in aliased.items()}
+        )
+        
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+        data = TransactionListSerializer(rows, many=True, fields=fields).data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+    
     def perform_create(self, serializer):
         # Ensure user has at least one account
         if not self.request.user.accounts.exists():
@@ -387,15 +494,16 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 currency="USD"
             )
         
-        transaction = serializer.save(user=self.request.user)
+        # Categories given on creation were picked by the user
+        transaction = serializer.save(
+            user=self.request.user,
+            category_set_by_user=bool(serializer.validated_data.get('category'))
+        )
         
         # Update account balance
-        account = transaction.account
-        if transaction.transaction_type == 'expense':
-            account.balance -= transaction.amount
-        elif transaction.transaction_type == 'income':
-            account.balance += transaction.amount
-        account.save()
+        deltas = BalanceDeltas()
+        deltas.add(transaction.account_id, transaction.transaction_type, transaction.amount)
+        deltas.apply()
         
         # Auto-categorize if no category is provided
         if not transaction.category:
@@ -403,75 +511,213 @@ class TransactionViewSet(viewsets.ModelViewSet):
     
     def perform_update(self, serializer):
         old_transaction = self.get_object()
-        new_transaction = serializer.save()
         
-        # Update account balance (reverse old transaction and apply new one)
-        account = new_transaction.account
+        # A category picked by the user is ground truth for the category classifier
+        if 'category' in serializer.validated_data and \
+                serializer.validated_data['category'] != old_transaction.category:
+            new_transaction = serializer.save(
+                categorization_confidence=0.0,
+                category_set_by_user=bool(serializer.validated_data['category'])
+            )
+        else:
+            new_transaction = serializer.save()
         
-        # Reverse old transaction
-        if old_transaction.transaction_type == 'expense':
-            account.balance += old_transaction.amount
-        elif old_transaction.transaction_type == 'income':
-            account.balance -= old_transaction.amount
-            
-        # Apply new transaction
-        if new_transaction.transaction_type == 'expense':
-            account.balance -= new_transaction.amount
-        elif new_transaction.transaction_type == 'income':
-            account.balance += new_transaction.amount
-            
-        account.save()
+        # Update account balance (reverse old transaction and apply new one)
+        deltas = BalanceDeltas()
+        deltas.remove(old_transaction.account_id, old_transaction.transaction_type, old_transaction.amount)
+        deltas.add(new_transaction.account_id, new_transaction.transaction_type, new_transaction.amount)
+        deltas.apply()
     
     def perform_destroy(self, instance):
         # Update account balance
-        account = instance.account
-        if instance.transaction_type == 'expense':
-            account.balance += instance.amount
-        elif instance.transaction_type == 'income':
-            account.balance -= instance.amount
-        account.save()
+        deltas = BalanceDeltas()
+        deltas.remove(instance.account_id, instance.transaction_type, instance.amount)
+        deltas.apply()
         
         instance.delete()
     
     def auto_categorize_transaction(self, transaction):
-        """Auto-categorize transaction using simple ML logic."""
-        description = transaction.description.lower()
-        merchant = (transaction.merchant_name or '').lower()
-        text = f"{description} {merchant}"
-        
-        # Simple keyword-based categorization
-        category_keywords = {
-            'food': ['restaurant', 'food', 'pizza', 'burger', 'coffee', 'starbucks', 'mcdonalds'],
-            'transport': ['uber', 'lyft', 'gas', 'fuel', 'parking', 'metro', 'bus'],
-            'shopping': ['amazon', 'walmart', 'target', 'store', 'shop', 'market'],
-            'entertainment': ['netflix', 'spotify', 'movie', 'cinema', 'game'],
-            'utilities': ['electric', 'water', 'internet', 'phone', 'utility'],
-            'healthcare': ['pharmacy', 'doctor', 'hospital', 'medical', 'health'],
-            'groceries': ['grocery', 'supermarket', 'whole foods', 'kroger'],
-        }
+        """Auto-categorize transaction with the user's categorization engine."""
+        engine = get_categorization_engine(transaction.user_id)
+        category_id, confidence = engine.categorize_batch(
+            [(transaction.description, transaction.merchant_name)]
+        )[0]
+        
+        if category_id:
+            transaction.category_id = category_id
+            transaction.categorization_confidence = confidence
+            transaction.save(update_fields=['category', 'categorization_confidence', 'updated_at'])
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create, update and delete many transactions in one atomic request.
         
-        best_category = None
-        best_confidence = 0.0
+        Body: {"create": [...], "update": [{"id": 1, ...}], "delete": [ids]}.
+        Rows are written with bulk_create/bulk_update and account balances
+        get one set-based UPDATE for the net change of the whole batch.
+        """
+        user = request.user
+        create_items = request.data.get('create') or []
+        update_items = request.data.get('update') or []
+        delete_ids = request.data.get('delete') or []
         
-        for category_name, keywords in category_keywords.items():
-            confidence = sum(1 for keyword in keywords if keyword in text) / len(keywords)
-            if confidence > best_confidence:
-                best_confidence = confidence
-                best_category = category_name
+        if not all(isinstance(items, list) for items in (create_items, update_items, delete_ids)):
+            return Response(
+                {'error': 'create, update and delete must be lists'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            delete_ids = [int(transaction_id) for transaction_id in delete_ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'delete must be a list of ids'}, status=status.HTTP_400_BAD_REQUEST)
         
-        if best_category and best_confidence > 0.1:
-            try:
-                category = Category.objects.get(
-                    name__icontains=best_category,
-                    category_type='expense'
+        total = len(create_items) + len(update_items) + len(delete_ids)
+        if total > self.max_bulk_items:
+            return Response(
+                {'error': f'At most {self.max_bulk_items} items per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        create_serializer = TransactionBulkItemSerializer(data=create_items, many=True)
+        update_serializer = TransactionBulkItemSerializer(data=update_items, many=True, partial=True)
+        errors = {}
+        if not create_serializer.is_valid():
+            errors['create'] = create_serializer.errors
+        if not update_serializer.is_valid():
+            errors['update'] = update_serializer.errors
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        create_rows = create_serializer.validated_data
+        update_rows = update_serializer.validated_data
+        update_ids = [row.get('id') for row in update_rows]
+        if None in update_ids:
+            return Response({'error': 'Every update item needs an id'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(set(update_ids)) != len(update_ids) or set(update_ids) & set(delete_ids):
+            return Response(
+                {'error': 'A transaction may appear only once per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Ownership and existence checks, one query per referenced table
+        account_ids = {row['account_id'] for row in create_rows + update_rows if 'account_id' in row}
+        owned_accounts = set(
+            Account.objects.filter(user=user, id__in=account_ids).values_list('id', flat=True)
+        )
+        if account_ids - owned_accounts:
+            return Response(
+                {'error': f"Unknown accounts: {sorted(account_ids - owned_accounts)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        category_ids = {
+            row['category_id'] for row in create_rows + update_rows if row.get('category_id')
+        }
+        category_names = dict(
+            Category.objects.filter(id__in=category_ids).values_list('id', 'name')
+        )
+        if category_ids - set(category_names):
+            return Response(
+                {'error': f"Unknown categories: {sorted(category_ids - set(category_names))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        deltas = BalanceDeltas()
+        now = timezone.now()
+        
+        with db_transaction.atomic():
+            # Updates and deletes lock their rows so concurrent edits can't double-apply
+            existing = Transaction.objects.select_for_update().filter(
+                user=user, id__in=update_ids + delete_ids
+            ).in_bulk()
+            missing = [i for i in update_ids + delete_ids if i not in existing]
+            if missing:
+                return Response(
+                    {'error': f"Unknown transactions: {sorted(set(missing))}"},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
-                transaction.category = category
-                transaction.categorization_confidence = best_confidence
-                transaction.save()
-            except Category.DoesNotExist:
-                pass
+            
+            new_transactions = []
+            for row in create_rows:
+                row.pop('id', None)
+                if not row.get('description'):
+                    row['description'] = default_transaction_description(
+                        row, category_names.get(row.get('category_id'))
+                    )
+                transaction = Transaction(user=user, category_set_by_user=bool(row.get('category_id')), **row)
+                deltas.add(transaction.account_id, transaction.transaction_type, transaction.amount)
+                new_transactions.append(transaction)
+            
+            categorize_transactions(new_transactions, user.id)
+            Transaction.objects.bulk_create(new_transactions, batch_size=500)
+            
+            updated_transactions, update_fields = [], {'updated_at'}
+            for row in update_rows:
+                transaction = existing[row.pop('id')]
+                deltas.remove(transaction.account_id, transaction.transaction_type, transaction.amount)
+                if 'category_id' in row and row['category_id'] != transaction.category_id:
+                    transaction.categorization_confidence = 0.0
+                    transaction.category_set_by_user = bool(row['category_id'])
+                    update_fields.update(['categorization_confidence', 'category_set_by_user'])
+                for field, value in row.items():
+                    setattr(transaction, field, value)
+                    update_fields.add(field)
+                transaction.updated_at = now
+                deltas.add(transaction.account_id, transaction.transaction_type, transaction.amount)
+                updated_transactions.append(transaction)
+            
+            if updated_transactions:
+                Transaction.objects.bulk_update(updated_transactions, sorted(update_fields), batch_size=500)
+            
+            for transaction_id in delete_ids:
+                transaction = existing[transaction_id]
+                deltas.remove(transaction.account_id, transaction.transaction_type, transaction.amount)
+            deleted = 0
+            if delete_ids:
+                deleted, _ = Transaction.objects.filter(user=user, id__in=delete_ids).delete()
+            
+            affected_accounts = deltas.apply()
+            bump_data_version(user.id)
+        
+        return Response({
+            'created': [transaction.id for transaction in new_transactions],
+            'updated': len(updated_transactions),
+            'deleted': deleted,
+            'balances': {
+                account_id: str(balance) for account_id, balance in Account.objects.filter(
+                    id__in=affected_accounts
+                ).values_list('id', 'balance')
+            },
+        }, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Ranked transaction search (?q=term&limit=50)."""
+        term = request.query_params.get('q', '').strip()
+        if not term:
+            return Response({'error': 'q parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            limit = int(request.query_params.get('limit', self.search_result_limit))
+        except ValueError:
+            limit = self.search_result_limit
+        limit = max(1, min(limit, self.max_search_result_limit))
+        
+        # Apply the regular filters (type, category, account, dates) but rank by relevance
+        queryset = DjangoFilterBackend().filter_queryset(request, self.get_queryset(), self)
+        transactions = list(search_transactions(queryset, term)[:limit])
+        
+        results = TransactionSerializer(transactions, many=True).data
+        for result, transaction in zip(results, transactions):
+            result['rank'] = round(transaction.rank, 4)
+        
+        return Response({
+            'query': term,
+            'results': results,
+        })
     
     @action(detail=False, methods=['get'])
+    @conditional_user_response('transaction-analytics')
+    @cache_user_response('transaction-analytics')
     def analytics(self, request):
         """Get transaction analytics."""
         user = request.user
@@ -486,27 +732,37 @@ class TransactionViewSet(viewsets.ModelViewSet):
         if request.query_params.get('end_date'):
             end_date = datetime.strptime(request.query_params.get('end_date'), '%Y-%m-%d').date()
         
-        # Get transactions in date range
-        transactions = Transaction.objects.filter(
-            user=user,
-            transaction_date__range=[start_date, end_date]
+        granularity = request.query_params.get('granularity', 'month')
+        if granularity not in ANALYTICS_GRANULARITIES:
+            return Response(
+                {'error': f"granularity must be one of: {', '.join(ANALYTICS_GRANULARITIES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        trunc, trend_window = ANALYTICS_GRANULARITIES[granularity]
+        
+        user_transactions = Transaction.objects.filter(user=user)
+        transactions = user_transactions.filter(transaction_date__range=[start_date, end_date])
+        is_income = Q(transaction_type='income')
+        is_expense = Q(transaction_type='expense')
+        
+        # Totals and count in one pass
+        totals = transactions.aggregate(
+            income=Sum('amount', filter=is_income),
+            expenses=Sum('amount', filter=is_expense),
+            count=Count('id'),
         )
-        
-        # Calculate totals
-        income_total = transactions.filter(transaction_type='income').aggregate(
-            total=Sum('amount'))['total'] or Decimal('0')
-        expense_total = transactions.filter(transaction_type='expense').aggregate(
-            total=Sum('amount'))['total'] or Decimal('0')
+        income_total = totals['income'] or Decimal('0')
+        expense_total = totals['expenses'] or Decimal('0')
         
         # Category breakdown
-        category_breakdown = transactions.filter(
+        category_breakdown = list(transactions.filter(
             transaction_type='expense'
         ).values(
             'category__id', 'category__name', 'category__color'
         ).annotate(
             total_amount=Sum('amount'),
             transaction_count=Count('id')
-        ).order_by('-total_amount')
+        ).order_by('-total_amount'))
         
         # Calculate percentages
         for item in category_breakdown:
@@ -515,26 +771,37 @@ class TransactionViewSet(viewsets.ModelViewSet):
             else:
                 item['percentage'] = 0
         
-        # Monthly trends (last 6 months)
-        six_months_ago = end_date - timedelta(days=180)
-        monthly_data = transactions.filter(
-            transaction_date__gte=six_months_ago
+        # Trends cover the requested range and at least the default window
+        # (e.g. 6 months) ending at end_date, bucketed by granularity
+        trend_start = min(start_date, _trend_window_start(end_date, granularity, trend_window))
+        trends = list(user_transactions.filter(
+            transaction_date__range=[trend_start, end_date]
         ).annotate(
-            month=TruncMonth('transaction_date')
-        ).values('month', 'transaction_type').annotate(
-            total=Sum('amount')
-        ).order_by('month')
+            period=trunc('transaction_date')
+        ).values('period').annotate(
+            income=Sum('amount', filter=is_income),
+            expenses=Sum('amount', filter=is_expense),
+            transaction_count=Count('id')
+        ).order_by('period'))
+        
+        for item in trends:
+            item['income'] = item['income'] or Decimal('0')
+            item['expenses'] = item['expenses'] or Decimal('0')
+            item['net'] = item['income'] - item['expenses']
         
         # Recent transactions
-        recent_transactions = transactions.order_by('-transaction_date', '-created_at')[:10]
+        recent_transactions = transactions.select_related(
+            'category', 'account'
+        ).order_by('-transaction_date', '-created_at')[:10]
         
         analytics_data = {
             'total_income': income_total,
             'total_expenses': expense_total,
             'net_worth': income_total - expense_total,
-            'transaction_count': transactions.count(),
-            'category_breakdown': list(category_breakdown),
-            'monthly_trends': list(monthly_data),
+            'transaction_count': totals['count'],
+            'category_breakdown': category_breakdown,
+            'granularity': granularity,
+            'trends': trends,
             'recent_transactions': recent_transactions
         }
         
@@ -551,6 +818,10 @@ class BudgetViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Budget.objects.filter(user=self.request.user).select_related('category')
     
+    @cache_user_response('budget-list')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
@@ -569,6 +840,56 @@ class RecurringTransactionViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+    
+    @action(detail=False, methods=['get'])
+    def suggestions(self, request):
+        """Pending templates suggested from detected recurring payments."""
+        suggestions = RecurringSuggestion.objects.filter(
+            user=request.user, status='pending'
+        ).select_related('category', 'account')
+        return Response(RecurringSuggestionSerializer(suggestions, many=True).data)
+    
+    @action(detail=False, methods=['post'], url_path=r'suggestions/(?P<suggestion_id>\d+)/accept')
+    def accept_suggestion(self, request, suggestion_id=None):
+        """Create a recurring template from a suggestion.
+        
+        The payments keep arriving from the bank, so the template only tracks
+        them (creates_transactions=False) instead of recording them again.
+        """
+        with db_transaction.atomic():
+            suggestion = get_object_or_404(
+                RecurringSuggestion.objects.select_for_update(),
+                id=suggestion_id, user=request.user, status='pending'
+            )
+            template = RecurringTransaction.objects.create(
+                user=request.user,
+                account_id=suggestion.account_id,
+                category_id=suggestion.category_id,
+                amount=suggestion.amount,
+                transaction_type=suggestion.transaction_type,
+                description=suggestion.description,
+                frequency=suggestion.frequency,
+                start_date=suggestion.next_due_date,
+                next_due_date=suggestion.next_due_date,
+                creates_transactions=False,
+            )
+            suggestion.status = 'accepted'
+            suggestion.recurring_transaction = template
+            suggestion.save(update_fields=['status', 'recurring_transaction', 'updated_at'])
+        
+        return Response(self.get_serializer(template).data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'], url_path=r'suggestions/(?P<suggestion_id>\d+)/dismiss')
+    def dismiss_suggestion(self, request, suggestion_id=None):
+        """Dismiss a suggestion; the same series is not suggested again."""
+        updated = RecurringSuggestion.objects.filter(
+            id=suggestion_id, user=request.user, status='pending'
+        ).update(status='dismissed', updated_at=timezone.now())
+        if not updated:
+            return Response({'error': 'Suggestion not found'}, status=status.HTTP_404_NOT_FOUND)
+        # Pending suggestions are part of the cash-flow forecast
+        bump_data_version(request.user.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 # AI Insights and Notification Views
 class NotificationViewSet(viewsets.ModelViewSet):
@@ -580,7 +901,19 @@ class NotificationViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
     
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user)
+        queryset = Notification.objects.filter(user=self.request.user)
+        if self.action == 'list':
+            # Archived notifications only show up when asked for
+            archived = self.request.query_params.get('archived', '').lower() in ('1', 'true')
+            queryset = queryset.filter(archived_at__isnull=not archived)
+        return queryset
+    
+    def _bulk_selection(self, request):
+        """Notifications picked by a bulk action body, or a 400 response."""
+        serializer = NotificationBulkActionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return None, Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return serializer.filter_queryset(Notification.objects.filter(user=request.user)), None
     
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
@@ -592,15 +925,35 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
         """Mark all notifications as read."""
-        unread_notifications = self.get_queryset().filter(read_at__isnull=True)
-        count = unread_notifications.count()
-        
-        for notification in unread_notifications:
-            notification.mark_as_read()
-        
+        count = notification_bulk.mark_read(Notification.objects.filter(user=request.user))
         return Response({'marked_as_read': count})
     
+    @action(detail=False, methods=['post'])
+    def bulk_mark_read(self, request):
+        """Mark notifications selected by ids and/or filters as read in one UPDATE."""
+        queryset, error = self._bulk_selection(request)
+        if error:
+            return error
+        return Response({'marked_as_read': notification_bulk.mark_read(queryset)})
+    
+    @action(detail=False, methods=['post'])
+    def bulk_archive(self, request):
+        """Archive notifications selected by ids and/or filters in one UPDATE."""
+        queryset, error = self._bulk_selection(request)
+        if error:
+            return error
+        return Response({'archived': notification_bulk.archive(queryset)})
+    
+    @action(detail=False, methods=['post'])
+    def bulk_delete(self, request):
+        """Delete notifications selected by ids and/or filters, one DELETE per batch of ids."""
+        queryset, error = self._bulk_selection(request)
+        if error:
+            return error
+        return Response({'deleted': notification_bulk.delete(queryset)})
+    
     @action(detail=False, methods=['get'])
+    @conditional_user_response('unread-count', kind='notifications')
     def unread_count(self, request):
         """Get count of unread notifications."""
         count = self.get_queryset().filter(read_at__isnull=True).count()
@@ -748,9 +1101,9 @@ class ExpensePredictionView(APIView):
         
         category_name = request.query_params.get('category', None)
         
-        # Initialize and train model
+        # Use the saved model; train only when it is missing or stale
         model = ExpensePredictionModel()
-        success, result = model.train(request.user.id)
+        success, result = model.ensure_trained(request.user.id, category_name)
         
         if not success:
             return Response({'error': result}, status=400)
@@ -765,11 +1118,18 @@ class ExpensePredictionView(APIView):
         return Response(serializer.data)
     
     def post(self, request):
-        """Train prediction model with latest data."""
+        """Train prediction model with latest data (body: optional category, backend)."""
         from .ml_models import ExpensePredictionModel
         
-        model = ExpensePredictionModel()
-        success, result = model.train(request.user.id)
+        backend = request.data.get('backend') or None
+        if backend and backend not in ExpensePredictionModel.BACKENDS:
+            return Response(
+                {'error': f"backend must be one of {', '.join(ExpensePredictionModel.BACKENDS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        model = ExpensePredictionModel(backend)
+        success, result = model.train(request.user.id, request.data.get('category') or None)
         
         if success:
             return Response({
@@ -821,6 +1181,7 @@ class BudgetInsightsView(APIView):
     """API view for budget insights and recommendations."""
     permission_classes = [permissions.IsAuthenticated]
     
+    @cache_user_response('budget-insights')
     def get(self, request):
         """Get budget insights and recommendations."""
         from datetime import datetime, timedelta
@@ -891,56 +1252,16 @@ class WeeklySummaryView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        """Get weekly summary for the user."""
-        from datetime import datetime, timedelta
-        from django.db.models import Sum
-        
-        # Calculate date range
-        end_date = timezone.now().date()
-        start_date = end_date - timedelta(days=7)
-        
-        # Get week's transactions
-        transactions = Transaction.objects.filter(
-            user=request.user,
-            transaction_date__range=[start_date, end_date]
-        )
-        
-        # Calculate summary
-        total_income = transactions.filter(transaction_type='income').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
-        
-        total_expenses = transactions.filter(transaction_type='expense').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
-        
-        # Get category breakdown
-        category_breakdown = {}
-        for transaction in transactions.filter(transaction_type='expense'):
-            category = transaction.category.name if transaction.category else 'Uncategorized'
-            category_breakdown[category] = category_breakdown.get(category, Decimal('0.00')) + transaction.amount
-        
-        # Get previous week for comparison
-        prev_start = start_date - timedelta(days=7)
-        prev_end = start_date
-        
-        prev_transactions = Transaction.objects.filter(
-            user=request.user,
-            transaction_date__range=[prev_start, prev_end]
-        )
-        
-        prev_expenses = prev_transactions.filter(transaction_type='expense').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
+        """Get the current ISO week's summary for the user."""
+        summary = get_weekly_summary(request.user.id)
+        # A stored row once the previous week has settled (from Thursday)
+        previous = get_weekly_summary(request.user.id, summary['start_date'] - timedelta(days=7))
         
+        total_expenses = summary['total_expenses']
+        prev_expenses = previous['total_expenses']
         data = {
-            'start_date': start_date,
-            'end_date': end_date,
-            'total_income': total_income,
-            'total_expenses': total_expenses,
-            'net_cash_flow': total_income - total_expenses,
-            'top_categories': dict(sorted(category_breakdown.items(), key=lambda x: x[1], reverse=True)[:5]),
-            'transaction_count': transactions.count(),
+            **summary,
+            'top_categories': dict(summary['top_categories']),
             'comparison_previous_week': {
                 'expense_change': float(total_expenses - prev_expenses),
                 'expense_change_percentage': float((total_expenses / prev_expenses - 1) * 100) if prev_expenses > 0 else 0
@@ -962,6 +1283,28 @@ class WeeklySummaryView(APIView):
         })
 
 
+class CashFlowForecastView(APIView):
+    """Projected daily balances per account from recurring items and spending patterns."""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    @conditional_user_response('cash-flow-forecast')
+    def get(self, request):
+        """Get the balance forecast for the next ?days= days (default 90)."""
+        from .cash_flow import DEFAULT_HORIZON_DAYS, MAX_HORIZON_DAYS, get_forecast
+        
+        try:
+            horizon_days = int(request.query_params.get('days', DEFAULT_HORIZON_DAYS))
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= horizon_days <= MAX_HORIZON_DAYS:
+            return Response(
+                {'error': f'days must be between 1 and {MAX_HORIZON_DAYS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(get_forecast(request.user.id, horizon_days))
+
+
 class FinancialReportsView(APIView):
     """Generate and download financial reports in PDF or CSV format."""
     permission_classes = [permissions.IsAuthenticated]
@@ -1127,7 +1470,8 @@ class BankAccountManagementView(APIView):
                     'plaid_institution_name': getattr(account, 'plaid_institution_name', ''),
                     'last_plaid_sync': getattr(account, 'last_plaid_sync', None),
                     'auto_sync_enabled': getattr(account, 'auto_sync_enabled', True),
-                    'sync_frequency': getattr(account, 'sync_frequency', 'daily')
+                    'sync_frequency': getattr(account, 'sync_frequency', 'daily'),
+                    'next_sync_at': account.next_sync_at
                 })
             
             account_data.append(account_info)
@@ -1147,6 +1491,9 @@ class BankAccountManagementView(APIView):
             if 'sync_frequency' in request.data:
                 account.sync_frequency = request.data['sync_frequency']
             
+            # Re-slot the account for its (possibly new) frequency
+            from .sync_scheduler import schedule_account
+            schedule_account(account, save=False)
             account.save()
             
             return Response({
@@ -0,0 +1,313 @@
+"""
+Weekly spending summaries per (user, ISO week), shared by the dashboard
+view and the weekly summary notifications.
+
+A settled week (Monday to Sunday, closed for at least SETTLE_DAYS days so
+the bank-posted transactions of its last days have arrived) is computed
+once and kept as a WeeklySummary row; later reads never touch the
+transactions table. Changes dated inside a settled week after it was stored
+don't alter it (refresh=True rebuilds it). Newer weeks, the current one
+included, are rolled up from one GROUP BY (type, category) query and,
+unless response caching is off (see api.response_cache), cached under the
+user's data version, so they are recomputed only after the user's data
+changes. Days are the local date (settings.TIME_ZONE).
+
+The Monday job summarizes many users at once: totals from one GROUP BY user
+query and the top categories from one grouped query ranked with
+ROW_NUMBER() per user, then notifications with bulk_create.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, F, Q, Sum, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+
+from .email_queue import notification_email, queue_emails
+from .models import Transaction, WeeklySummary
+from .notification_bulk import notifications_changed
+from .notification_models import Notification, NotificationPreference
+from .response_cache import get_data_version, user_caching_enabled
+
+logger = logging.getLogger(__name__)
+
+TOP_CATEGORY_COUNT = 3  # in notifications
+STORED_CATEGORY_COUNT = 5  # kept per summary, shown on the dashboard
+USER_CHUNK_SIZE = 2000
+
+# Bank transactions post a few days late; a week is stored only this long after it ends
+SETTLE_DAYS = 3
+
+CURRENT_WEEK_KEY = 'weekly_summary:{user_id}:{week_start}:{version}'
+CURRENT_WEEK_TIMEOUT = 24 * 60 * 60
+
+
+def iso_week_start(day=None):
+    """Monday of the ISO week containing day (default today)."""
+    day = day or timezone.localdate()
+    return day - timedelta(days=day.weekday())
+
+
+def week_range(week_start):
+    return week_start, week_start + timedelta(days=6)
+
+
+def is_settled(week_start):
+    """Whether the week ended at least SETTLE_DAYS days ago and may be stored."""
+    return week_range(week_start)[1] + timedelta(days=SETTLE_DAYS) < timezone.localdate()
+
+
+def _summary(week_start, total_income, total_expenses, transaction_count, top_categories):
+    start_date, end_date = week_range(week_start)
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'total_income': total_income,
+        'total_expenses': total_expenses,
+        'net_cash_flow': total_income - total_expenses,
+        'transaction_count': transaction_count,
+        'top_categories': top_categories,
+    }
+
+
+def _empty_summary(week_start):
+    return _summary(week_start, Decimal('0.00'), Decimal('0.00'), 0, [])
+
+
+def _compute(user_id, week_start):
+    """Summary for one user and week from a single (type, category) rollup query."""
+    start_date, end_date = week_range(week_start)
+    rollups = (
+        Transaction.objects.filter(user_id=user_id, transaction_date__range=[start_date, end_date])
+        .order_by()
+        .values('transaction_type', 'category__name')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+
+    totals = defaultdict(Decimal)
+    spending = defaultdict(Decimal)
+    transaction_count = 0
+    for row in rollups:
+        totals[row['transaction_type']] += row['total']
+        transaction_count += row['count']
+        if row['transaction_type'] == 'expense':
+            spending[row['category__name'] or 'Uncategorized'] += row['total']
+
+    top_categories = sorted(spending.items(), key=lambda item: (-item[1], item[0]))[:STORED_CATEGORY_COUNT]
+    return _summary(
+        week_start,
+        totals['income'] or Decimal('0.00'),
+        totals['expense'] or Decimal('0.00'),
+        transaction_count,
+        top_categories,
+    )
+
+
+def _from_row(row):
+    return _summary(
+        row.week_start,
+        row.total_income,
+        row.total_expenses,
+        row.transaction_count,
+        [(category, Decimal(amount)) for category, amount in row.top_categories],
+    )
+
+
+def _to_row(user_id, week_start, summary):
+    return WeeklySummary(
+        user_id=user_id,
+        week_start=week_start,
+        total_income=summary['total_income'],
+        total_expenses=summary['total_expenses'],
+        transaction_count=summary['transaction_count'],
+        top_categories=[[category, f"{amount:.2f}"] for category, amount in summary['top_categories']],
+    )
+
+
+def get_weekly_summary(user_id, week_start=None, refresh=False):
+    """Summary of the user's ISO week starting week_start (default: the current week)."""
+    week_start = iso_week_start(week_start)
+
+    if is_settled(week_start):
+        row = None if refresh else WeeklySummary.objects.filter(user_id=user_id, week_start=week_start).first()
+        if row is not None:
+            return _from_row(row)
+        summary = _compute(user_id, week_start)
+        if refresh:
+            WeeklySummary.objects.filter(user_id=user_id, week_start=week_start).delete()
+        try:
+            with db_transaction.atomic():
+                _to_row(user_id, week_start, summary).save()
+        except IntegrityError:
+            # Stored concurrently by another request
+            pass
+        return summary
+
+    if not user_caching_enabled():
+        return _compute(user_id, week_start)
+    key = CURRENT_WEEK_KEY.format(user_id=user_id, week_start=week_start, version=get_data_version(user_id))
+    summary = None if refresh else cache.get(key)
+    if summary is None:
+        summary = _compute(user_id, week_start)
+        cache.set(key, summary, CURRENT_WEEK_TIMEOUT)
+    return summary
+
+
+def summarize_users(user_ids, week_start, top=STORED_CATEGORY_COUNT):
+    """{user_id: summary} of the week for users with transactions in it.
+
+    user_ids may be a list or a values_list queryset (used as a subquery).
+    """
+    start_date, end_date = week_range(week_start)
+    transactions = Transaction.objects.filter(
+        user_id__in=user_ids,
+        transaction_date__range=[start_date, end_date],
+    ).order_by()
+
+    summaries = {}
+    totals = transactions.values('user_id').annotate(
+        total_income=Coalesce(Sum('amount', filter=Q(transaction_type='income')), Value(Decimal('0.00'))),
+        total_expenses=Coalesce(Sum('amount', filter=Q(transaction_type='expense')), Value(Decimal('0.00'))),
+        transaction_count=Count('id'),
+    )
+    for row in totals:
+        summaries[row['user_id']] = _summary(
+            week_start, row['total_income'], row['total_expenses'], row['transaction_count'], []
+        )
+
+    ranked = (
+        transactions.filter(transaction_type='expense')
+        .values('user_id', 'category__name')
+        .annotate(total=Sum('amount'))
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('total').desc(), F('category__name').asc()],
+        ))
+        .filter(rank__lte=top)
+        .order_by('user_id', 'rank')
+    )
+    for row in ranked:
+        summaries[row['user_id']]['top_categories'].append(
+            (row['category__name'] or 'Uncategorized', row['total'])
+        )
+    return summaries
+
+
+def summary_notification(user, summary, emailed=False):
+    """Unsaved weekly summary Notification for user.
+
+    In-app only ones are sent as they are created; emailed ones stay pending
+    until the email queue delivers them.
+    """
+    start_date = summary['start_date']
+    end_date = summary['end_date']
+    total_income = summary['total_income']
+    total_expenses = summary['total_expenses']
+    net_cash_flow = summary['net_cash_flow']
+    top_categories = summary['top_categories'][:TOP_CATEGORY_COUNT]
+
+    title = f"Weekly Summary - {start_date.strftime('%b %d')} to {end_date.strftime('%b %d')}"
+
+    message = f"""
+        Here's your weekly financial summary:
+
+        💰 Total Income: ${total_income:.2f}
+        💸 Total Expenses: ${total_expenses:.2f}
+        📊 Net Cash Flow: ${net_cash_flow:.2f}
+
+        Top Spending Categories:
+        """
+
+    for i, (category, amount) in enumerate(top_categories, 1):
+        message += f"\n{i}. {category}: ${amount:.2f}"
+
+    if net_cash_flow < 0:
+        message += f"\n\n⚠️ You spent ${abs(net_cash_flow):.2f} more than you earned this week."
+    else:
+        message += f"\n\n✅ Great job! You saved ${net_cash_flow:.2f} this week."
+
+    return Notification(
+        user=user,
+        notification_type='weekly_summary',
+        title=title,
+        message=message,
+        status='pending' if emailed else 'sent',
+        sent_at=None if emailed else timezone.now(),
+        data={
+            'week_start': start_date.isoformat(),
+            'total_income': float(total_income),
+            'total_expenses': float(total_expenses),
+            'net_cash_flow': float(net_cash_flow),
+            'top_categories': {category: float(amount) for category, amount in top_categories},
+            'transaction_count': summary['transaction_count'],
+        },
+    )
+
+
+def _send_chunk(preferences, week_start):
+    user_ids = [pref.user_id for pref in preferences]
+    settled = is_settled(week_start)
+    stored = {
+        row.user_id: _from_row(row)
+        for row in WeeklySummary.objects.filter(user_id__in=user_ids, week_start=week_start)
+    } if settled else {}
+    missing = [user_id for user_id in user_ids if user_id not in stored]
+    computed = summarize_users(missing, week_start) if missing else {}
+
+    notifications, emailed = [], []
+    for pref in preferences:
+        summary = stored.get(pref.user_id) or computed.get(pref.user_id)
+        if summary is None or not summary['transaction_count']:
+            # No transactions this week
+            continue
+        email = pref.delivery_method in ['email', 'both']
+        notification = summary_notification(pref.user, summary, emailed=email)
+        notifications.append(notification)
+        if email:
+            emailed.append(notification)
+
+    with db_transaction.atomic():
+        if settled:
+            # Keep the settled week, empty ones included, so the dashboard never recomputes it
+            WeeklySummary.objects.bulk_create(
+                [_to_row(user_id, week_start, computed.get(user_id) or _empty_summary(week_start))
+                 for user_id in missing],
+                ignore_conflicts=True,
+            )
+        Notification.objects.bulk_create(notifications)
+        queue_emails([notification_email(notification) for notification in emailed])
+        notifications_changed([notification.user_id for notification in notifications])
+    return len(notifications)
+
+
+def send_weekly_summaries(week_start=None, user_ids=None, chunk_size=USER_CHUNK_SIZE):
+    """Send the week's summary to every user with weekly summaries enabled.
+
+    Defaults to the last closed week, computed live while it is not settled.
+    Returns the number of summaries sent.
+    """
+    week_start = iso_week_start(week_start or timezone.localdate() - timedelta(days=7))
+    preferences = NotificationPreference.objects.filter(
+        notification_type='weekly_summary',
+        is_enabled=True,
+    ).select_related('user').order_by('user_id')
+    if user_ids is not None:
+        preferences = preferences.filter(user_id__in=user_ids)
+
+    sent = 0
+    chunk = []
+    for pref in preferences.iterator(chunk_size=chunk_size):
+        chunk.append(pref)
+        if len(chunk) >= chunk_size:
+            sent += _send_chunk(chunk, week_start)
+            chunk = []
+    if chunk:
+        sent += _send_chunk(chunk, week_start)
+
+    logger.info(f"Sent {sent} weekly summaries for the week of {week_start}")
+    return sent
@@ -2,6 +2,9 @@
 ASGI config for finmate_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn finmate_backend.asgi:application``)
+for the notification event stream at /api/notifications/stream/, which holds
+one long-lived async response per connected client.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -3,6 +3,7 @@ Celery configuration for FinMate background tasks.
 """
 import os
 from celery import Celery
+from celery.schedules import crontab
 from django.conf import settings
 
 # Set the default Django settings module for the 'celery' program.
@@ -31,6 +32,47 @@ app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
 )
 
+# Periodic tasks (celery beat)
+app.conf.beat_schedule = {
+    # Frequent ticks keep per-account sync slots spread across the period
+    'auto-sync-plaid-accounts': {
+        'task': 'api.tasks.auto_sync_all_plaid_accounts',
+        'schedule': 10 * 60,  # every 10 minutes
+    },
+    'train-category-classifier': {
+        'task': 'api.tasks.train_category_classifier',
+        'schedule': crontab(hour=3, minute=30, day_of_week='sunday'),
+    },
+    # Summarizes the ISO week that just closed
+    'weekly-summary': {
+        'task': 'api.tasks.generate_weekly_summary',
+        'schedule': crontab(hour=6, minute=0, day_of_week='monday'),
+    },
+    # Backstop for queued emails whose scheduled flush was lost, and for retries
+    'flush-email-queue': {
+        'task': 'api.tasks.flush_email_queue',
+        'schedule': 60,
+    },
+    'purge-sent-emails': {
+        'task': 'api.tasks.purge_sent_emails',
+        'schedule': crontab(hour=4, minute=15),
+    },
+    # Also catches up every occurrence missed while the scheduler was down
+    'materialize-recurring-transactions': {
+        'task': 'api.tasks.materialize_recurring_transactions',
+        'schedule': crontab(hour=0, minute=15),
+    },
+    # New rows are also checked shortly after each sync or import
+    'detect-recurring-payments': {
+        'task': 'api.tasks.detect_recurring_payments',
+        'schedule': crontab(hour=2, minute=30, day_of_week='sunday'),
+    },
+    'purge-read-notifications': {
+        'task': 'api.tasks.purge_read_notifications',
+        'schedule': crontab(hour=4, minute=0),
+    },
+}
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
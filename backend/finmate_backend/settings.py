@@ -181,6 +181,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files (bank statements for import)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -239,6 +243,12 @@ SIMPLE_JWT = {
 PLAID_CLIENT_ID = env('PLAID_CLIENT_ID', default='')
 PLAID_SECRET = env('PLAID_SECRET', default='')
 PLAID_ENV = env('PLAID_ENV', default='sandbox')  # sandbox, development, production
+PLAID_WEBHOOK_DEBOUNCE_SECONDS = env.int('PLAID_WEBHOOK_DEBOUNCE_SECONDS', default=30)
+# Plaid-Verification JWTs are checked against keys fetched from Plaid, which
+# needs PLAID_CLIENT_ID and PLAID_SECRET. Webhooks without a valid JWT must
+# carry ?secret=<this>; left empty (and without Plaid credentials), they are
+# all rejected
+PLAID_WEBHOOK_SECRET = env('PLAID_WEBHOOK_SECRET', default='')
 
 # Logging configuration
 LOGGING = {
@@ -264,6 +274,63 @@ LOGGING = {
     },
 }
 
+# Cache: per-process local memory by default; set REDIS_CACHE_URL when running
+# several processes so cache invalidation is shared between them
+REDIS_CACHE_URL = env('REDIS_CACHE_URL', default='')
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'finmate-default',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Per-user response caching and conditional GET (api.response_cache)
+USER_RESPONSE_CACHE_ENABLED = env.bool('USER_RESPONSE_CACHE_ENABLED', default=True)
+# With the per-process LocMem cache, changes made by other processes (Celery
+# syncs and imports, other web workers) are seen after at most this many seconds
+USER_RESPONSE_LOCAL_STAMP_TIMEOUT = env.int('USER_RESPONSE_LOCAL_STAMP_TIMEOUT', default=30)
+# Seconds a cached dashboard response may be served (api.response_cache)
+USER_RESPONSE_CACHE_TIMEOUT = env.int('USER_RESPONSE_CACHE_TIMEOUT', default=300)
+
+# Notification SSE stream (api.notification_stream); set a Redis URL so events
+# published by Celery workers reach clients connected to web processes
+NOTIFICATION_STREAM_REDIS_URL = env('NOTIFICATION_STREAM_REDIS_URL', default='')
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = env.int('NOTIFICATION_STREAM_HEARTBEAT_SECONDS', default=15)
+NOTIFICATION_STREAM_RETRY_MS = 5000
+
+# Read notifications older than this are purged nightly (api.tasks.purge_read_notifications)
+NOTIFICATION_RETENTION_DAYS = env.int('NOTIFICATION_RETENTION_DAYS', default=90)
+
+# Notifications a job sends while the user's last digest is unread and younger
+# than this are merged into it (api.notification_digest)
+NOTIFICATION_DIGEST_WINDOW_MINUTES = env.int('NOTIFICATION_DIGEST_WINDOW_MINUTES', default=60)
+
+# Outbound email queue (api.email_queue). Domain rate limits are emails per
+# minute per recipient domain, e.g. {'gmail.com': 3000}. The per-minute counts
+# live in the default cache: with Redis they are shared by all Celery workers,
+# with the LocMem fallback every worker process enforces the limit on its own
+EMAIL_QUEUE_BATCH_SIZE = env.int('EMAIL_QUEUE_BATCH_SIZE', default=500)
+EMAIL_QUEUE_FLUSH_DELAY = 10  # seconds to wait for more emails before flushing
+EMAIL_QUEUE_DEFAULT_DOMAIN_RATE = env.int('EMAIL_QUEUE_DEFAULT_DOMAIN_RATE', default=30000)
+EMAIL_QUEUE_DOMAIN_RATE_LIMITS = {}
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_RETRY_BACKOFF = 60  # seconds, doubled after every failed attempt
+EMAIL_QUEUE_CLAIM_TIMEOUT = 10 * 60
+EMAIL_QUEUE_RETENTION_DAYS = 7
+
+# Daily expense model (api.ml_models.ExpensePredictionModel): 'gbm' for
+# gradient-boosted trees or 'linear' for ridge regression
+EXPENSE_MODEL_BACKEND = env('EXPENSE_MODEL_BACKEND', default='gbm')
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
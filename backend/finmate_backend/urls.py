@@ -5,23 +5,28 @@ from api.views import (
     SignupView, LoginView, LogoutView, VerifyEmailView, ActiveSessionsView, 
     LogoutDeviceView, PasswordResetView, PasswordResetRequestView,
     Setup2FAView, Verify2FAView, Disable2FAView, UserProfileView,
-    CategoryViewSet, AccountViewSet, TransactionViewSet, BudgetViewSet, RecurringTransactionViewSet,
+    CategoryViewSet, CategoryRuleViewSet, AccountViewSet, TransactionViewSet, BudgetViewSet, RecurringTransactionViewSet,
+    StatementImportViewSet,
     NotificationViewSet, NotificationPreferenceViewSet, AIInsightViewSet, 
     SavingsGoalViewSet, ExpensePredictionView, AnomalyDetectionView,
-    BudgetInsightsView, WeeklySummaryView, FinancialReportsView, EmailReportsView,
+    BudgetInsightsView, WeeklySummaryView, CashFlowForecastView, FinancialReportsView, EmailReportsView,
     PlaidAccountSyncView, BankAccountManagementView
 )
 from api.plaid_views import (
-    create_link_token, exchange_public_token, sync_transactions, disconnect_account
+    create_link_token, exchange_public_token, sync_transactions, disconnect_account,
+    plaid_webhook
 )
+from api.notification_stream import notification_stream
 
 # Create router for ViewSets
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet, basename='categories')
+router.register(r'category-rules', CategoryRuleViewSet, basename='category-rules')
 router.register(r'accounts', AccountViewSet, basename='accounts')
 router.register(r'transactions', TransactionViewSet, basename='transactions')
 router.register(r'budgets', BudgetViewSet, basename='budgets')
 router.register(r'recurring-transactions', RecurringTransactionViewSet, basename='recurring-transactions')
+router.register(r'statement-imports', StatementImportViewSet, basename='statement-imports')
 
 # AI and Notifications
 router.register(r'notifications', NotificationViewSet, basename='notifications')
@@ -51,6 +56,10 @@ urlpatterns = [
     path('api/plaid/exchange-public-token/', exchange_public_token, name='exchange_public_token'),
     path('api/plaid/sync-transactions/', sync_transactions, name='sync_transactions'),
     path('api/plaid/disconnect-account/<int:account_id>/', disconnect_account, name='disconnect_account'),
+    path('api/plaid/webhook/', plaid_webhook, name='plaid_webhook'),
+    
+    # Notification event stream (async; before the router so "stream" isn't read as a pk)
+    path('api/notifications/stream/', notification_stream, name='notification_stream'),
     
     # Transaction management endpoints
     path('api/', include(router.urls)),
@@ -60,6 +69,7 @@ urlpatterns = [
     path('api/anomaly-detection/', AnomalyDetectionView.as_view(), name='anomaly_detection'),
     path('api/budget-insights/', BudgetInsightsView.as_view(), name='budget_insights'),
     path('api/weekly-summary/', WeeklySummaryView.as_view(), name='weekly_summary'),
+    path('api/cash-flow-forecast/', CashFlowForecastView.as_view(), name='cash_flow_forecast'),
     
     # Financial Reports endpoints
     path('api/reports/', FinancialReportsView.as_view(), name='financial_reports'),